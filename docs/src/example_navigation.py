@@ -12,6 +12,7 @@ shape = Prism.default_robot_shape()
 PathPlanner.USE_PERSISTENCE = False
 path_planner = PathPlanner(shape)
 path_planner.obstacles['0'] = Obstacle(id='0', outline=[Point(x=3, y=0), Point(x=0, y=3), Point(x=3, y=3)])
+path_planner.OBSTACLES_CHANGED.emit(path_planner.obstacles)
 wheels = WheelsSimulation()
 robot = RobotSimulation([wheels])
 odometer = Odometer(wheels)
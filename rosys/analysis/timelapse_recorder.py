@@ -25,6 +25,7 @@ class RosysImage(Protocol):
     camera_id: str
     time: float
     data: Optional[bytes] = None
+    thumbnail: Optional[bytes] = None
 
 
 class TimelapseRecorder:
@@ -52,7 +53,8 @@ class TimelapseRecorder:
             return
         if rosys.time() - self.last_capture_time < 1 / self.capture_rate:
             return
-        images = self.camera.get_recent_images(timespan=2)
+        # NOTE: fall back to thumbnails if the full resolution images have been evicted due to the memory budget
+        images = [i for i in self.camera.images.since(rosys.time() - 2) if i.data or i.thumbnail]
         if self.avoid_broken_images:
             images = [i for i in images if not i.is_broken and i.time < rosys.time() - 0.1]
         if images:
@@ -115,8 +117,9 @@ class TimelapseRecorder:
 
 
 def _save_image(image: RosysImage, path: Path, size: tuple[int, int], notifications: list[str]) -> None:
-    assert image.data is not None
-    img = Image.open(io.BytesIO(image.data))
+    data = image.data or image.thumbnail
+    assert data is not None
+    img = Image.open(io.BytesIO(data))
     img = img.resize(size)
     draw = ImageDraw.Draw(img)
     x = y = 20
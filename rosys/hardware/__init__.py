@@ -3,7 +3,8 @@ from .bluetooth import BluetoothHardware
 from .bms import Bms, BmsHardware, BmsSimulation
 from .bumper import Bumper, BumperHardware, BumperSimulation
 from .can import CanHardware
-from .communication import Communication, SerialCommunication, WebCommunication
+from .communication import (Communication, RecordingCommunication, ReplayCommunication, SerialCommunication,
+                            WebCommunication)
 from .estop import EStop, EStopHardware, EStopSimulation
 from .expander import ExpanderHardware
 from .imu import ImuHardware
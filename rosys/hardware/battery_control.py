@@ -1,5 +1,7 @@
 from typing import Optional
 
+import numpy as np
+
 from .. import rosys
 from .expander import ExpanderHardware
 from .module import ModuleHardware
@@ -21,8 +23,8 @@ class BatteryControlHardware(ModuleHardware):
         core_message_fields = [f'{self.name}_status.level']
         super().__init__(robot_brain=robot_brain, lizard_code=lizard_code, core_message_fields=core_message_fields)
 
-    def handle_core_output(self, _: float, words: list[str]) -> None:
-        self.status = int(words.pop(0)) == 1
+    def handle_core_values(self, _: float, values: np.ndarray) -> None:
+        self.status = bool(values[0] == 1)
 
     async def release_battery_relay(self) -> None:
         self.log.info('releasing battery relay')
@@ -1,6 +1,8 @@
 import abc
 from typing import Optional
 
+import numpy as np
+
 from ..event import Event
 from .estop import EStop
 from .expander import ExpanderHardware
@@ -43,10 +45,10 @@ class BumperHardware(Bumper, ModuleHardware):
                          core_message_fields=core_message_fields,
                          estop=estop)
 
-    def handle_core_output(self, time: float, words: list[str]) -> None:
+    def handle_core_values(self, time: float, values: np.ndarray) -> None:
         if self.estop and self.estop.active:
             return
-        active_bumpers = [pin for pin in self.pins if int(words.pop(0)) == 1]
+        active_bumpers = [pin for pin, value in zip(self.pins, values) if value == 1]
         for pin in active_bumpers:
             if pin not in self.active_bumpers:
                 self.BUMPER_TRIGGERED.emit(pin)
@@ -1,3 +1,4 @@
 from .communication import Communication
 from .serial_communication import SerialCommunication
+from .telemetry import RecordingCommunication, ReplayCommunication
 from .web_communication import WebCommunication
@@ -2,6 +2,8 @@ import abc
 import logging
 from typing import Optional
 
+from ... import rosys
+
 
 class Communication(abc.ABC):
     """This abstract module defines an interface for communicating with a microcontroller.
@@ -28,9 +30,21 @@ class Communication(abc.ABC):
     async def send(self, msg: str) -> None:
         pass
 
+    async def send_batch(self, msgs: list[str]) -> None:
+        """Send multiple messages, which implementations can combine into a single write."""
+        for msg in msgs:
+            await self.send(msg)
+
     @abc.abstractmethod
     async def read(self) -> Optional[str]:
         pass
 
+    async def read_batch(self) -> list[tuple[float, str]]:
+        """Read all lines which have been received so far together with their time of arrival."""
+        lines: list[tuple[float, str]] = []
+        while (line := await self.read()) is not None:
+            lines.append((rosys.time(), line))
+        return lines
+
     def debug_ui(self) -> None:
         pass
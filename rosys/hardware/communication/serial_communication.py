@@ -1,3 +1,4 @@
+import asyncio
 import os
 from collections import deque
 from typing import Optional
@@ -15,8 +16,12 @@ class SerialCommunication(Communication):
     """This module implements a communication via a serial device with a given baud rate.
 
     It contains a list of search paths for finding the serial device.
+    Incoming data is drained by an event loop reader as soon as it arrives
+    and split into complete lines, which are stamped with their time of arrival.
     """
 
+    MAX_LINES = 10_000
+
     search_paths: list[str] = [
         '/dev/tty.SLAB_USBtoUART',
         '/dev/ttyTHS1',
@@ -30,7 +35,10 @@ class SerialCommunication(Communication):
             raise FileNotFoundError('No serial port found')
         self.log.debug(f'connecting serial on {self.device_path} with baud rate {baud_rate}')
         self.serial = serial.Serial(self.device_path, baud_rate)
-        self.buffer = ''
+        self.buffer = bytearray()
+        self.lines: deque[tuple[float, str]] = deque(maxlen=self.MAX_LINES)
+        self._reader_fd: Optional[int] = None
+        self._reader_loop: Optional[asyncio.AbstractEventLoop] = None
         self.log_io: bool = False
         self.undo_queue: deque[str] = deque(maxlen=100)
         self.redo_queue: deque[str] = deque(maxlen=100)
@@ -59,25 +67,73 @@ class SerialCommunication(Communication):
             self.log.debug(f'reconnected serial on {self.device_path}')
 
     def disconnect(self) -> None:
+        self._unwatch()
         if self.serial.isOpen():
             self.serial.close()
             self.log.debug(f'disconnected serial on {self.device_path}')
 
     async def read(self) -> Optional[str]:
-        if not self.serial.isOpen():
-            return None
-        s = self.serial.read_all()
+        self._receive_pending()
+        return self.lines.popleft()[1] if self.lines else None
+
+    async def read_batch(self) -> list[tuple[float, str]]:
+        self._receive_pending()
+        lines = list(self.lines)
+        self.lines.clear()
+        return lines
+
+    def _receive_pending(self) -> None:
+        """Make sure that incoming data is handled, either by the event loop reader or by polling."""
+        if self._reader_fd is not None or not self.serial.isOpen():
+            return
         try:
-            s = s.decode()
-            self.buffer += s
-            if '\n' in self.buffer:
-                line, self.buffer = self.buffer.split('\r\n', 1)
-                if self.log_io:
-                    self.log.debug(f'read: {line}')
-                return line
-        except Exception:
-            self.log.exception(f'Could not decode serial data: {s}')
-        return None
+            fd = self.serial.fileno()
+        except (AttributeError, NotImplementedError):  # NOTE: no file descriptor on non-POSIX systems
+            self._receive()
+            return
+        self._reader_loop = asyncio.get_running_loop()
+        self._reader_loop.add_reader(fd, self._handle_readable)
+        self._reader_fd = fd
+        self._receive()
+
+    def _unwatch(self) -> None:
+        if self._reader_loop is not None and self._reader_fd is not None:
+            self._reader_loop.remove_reader(self._reader_fd)
+        self._reader_fd = None
+        self._reader_loop = None
+
+    def _handle_readable(self) -> None:
+        if not self._receive() and self._reader_fd is not None:
+            # NOTE: a readable file descriptor without any data means that the device has hung up
+            self.log.warning(f'serial device {self.device_path} hung up')
+            self.disconnect()
+
+    def _receive(self) -> bool:
+        """Read all available data and return whether there was any."""
+        try:
+            data = self.serial.read(self.serial.in_waiting)
+        except (SerialException, OSError):
+            self.log.exception(f'could not read from serial on {self.device_path}')
+            self._unwatch()
+            return False
+        if not data:
+            return False
+        self.buffer += data
+        if b'\n' not in data:
+            return True
+        *complete, rest = self.buffer.split(b'\n')
+        self.buffer = bytearray(rest)
+        now = rosys.time()
+        for raw_line in complete:
+            try:
+                line = raw_line.rstrip(b'\r').decode()
+            except UnicodeDecodeError:
+                self.log.exception(f'Could not decode serial data: {raw_line!r}')
+                continue
+            if self.log_io:
+                self.log.debug(f'read: {line}')
+            self.lines.append((now, line))
+        return True
 
     async def send(self, msg: str) -> None:
         if not self.serial.isOpen():
@@ -86,6 +142,14 @@ class SerialCommunication(Communication):
         if self.log_io:
             self.log.debug(f'send: {msg}')
 
+    async def send_batch(self, msgs: list[str]) -> None:
+        if not self.serial.isOpen() or not msgs:
+            return
+        self.serial.write(''.join(f'{msg}\n' for msg in msgs).encode())
+        if self.log_io:
+            for msg in msgs:
+                self.log.debug(f'send: {msg}')
+
     def debug_ui(self) -> None:
         super().debug_ui()
 
@@ -0,0 +1,142 @@
+import gzip
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from ... import rosys
+from .communication import Communication
+
+RECEIVED = '<'
+SENT = '>'
+
+
+def _open(path: Path, mode: str) -> TextIO:
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't')  # type: ignore[return-value]
+    return path.open(mode)
+
+
+def read_telemetry(path: Path) -> Iterator[tuple[float, str, str]]:
+    """Iterate over the records of a telemetry file as tuples of time, direction ("<" or ">") and line."""
+    with _open(path, 'r') as f:
+        for record in f:
+            time, direction, line = record.rstrip('\n').split(' ', 2)
+            yield float(time), direction, line
+
+
+class RecordingCommunication(Communication):
+    """This module records the raw lines passing through another communication module.
+
+    Each received and sent line is appended to a telemetry file as "<time> <direction> <line>",
+    where the direction is "<" for received and ">" for sent lines.
+    Received lines are stored with their time of arrival and checksum, so they can be fed back by `ReplayCommunication`.
+    If the path ends with ".gz", the file is compressed.
+    """
+
+    def __init__(self, communication: Communication, path: Path) -> None:
+        super().__init__()
+        self.communication = communication
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: Optional[TextIO] = _open(self.path, 'a')
+
+    @classmethod
+    def is_possible(cls) -> bool:
+        return True
+
+    def connect(self) -> None:
+        self.communication.connect()
+
+    def disconnect(self) -> None:
+        self.communication.disconnect()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def send(self, msg: str) -> None:
+        self._write([(rosys.time(), msg)], SENT)
+        await self.communication.send(msg)
+
+    async def send_batch(self, msgs: list[str]) -> None:
+        now = rosys.time()
+        self._write([(now, msg) for msg in msgs], SENT)
+        await self.communication.send_batch(msgs)
+
+    async def read(self) -> Optional[str]:
+        line = await self.communication.read()
+        if line is not None:
+            self._write([(rosys.time(), line)], RECEIVED)
+        return line
+
+    async def read_batch(self) -> list[tuple[float, str]]:
+        lines = await self.communication.read_batch()
+        self._write(lines, RECEIVED)
+        return lines
+
+    def debug_ui(self) -> None:
+        self.communication.debug_ui()
+
+    def _write(self, lines: list[tuple[float, str]], direction: str) -> None:
+        if self._file is None or not lines:
+            return
+        self._file.write(''.join(f'{time:.6f} {direction} {line}\n' for time, line in lines))
+        self._file.flush()
+
+    def __repr__(self) -> str:
+        return f'<RecordingCommunication {self.communication} to {self.path}>'
+
+
+class ReplayCommunication(Communication):
+    """This module feeds the received lines of a telemetry file back to a robot brain.
+
+    The lines are released with their original timing, scaled by the given speed
+    (e.g. `speed=10` replays a recording ten times faster than real time).
+    Their arrival times are shifted to the start of the replay.
+    Note that the hardware time of a robot brain still follows the recorded core millis,
+    so modules like the odometer see the original time steps, even at a different speed.
+    Sent messages are not passed anywhere, but collected in `sent` for comparison with the recording.
+    """
+
+    def __init__(self, path: Path, *, speed: float = 1.0) -> None:
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.sent: list[tuple[float, str]] = []
+        """messages sent during the replay together with their time"""
+
+        self._records = ((time, line) for time, direction, line in read_telemetry(path) if direction == RECEIVED)
+        self._next: Optional[tuple[float, str]] = next(self._records, None)
+        self._recording_start = self._next[0] if self._next is not None else 0.0
+        self._replay_start: Optional[float] = None
+        self._lines: list[tuple[float, str]] = []
+
+    @classmethod
+    def is_possible(cls) -> bool:
+        return True
+
+    @property
+    def is_finished(self) -> bool:
+        """Whether all received lines of the recording have been replayed."""
+        return self._next is None and not self._lines
+
+    async def send(self, msg: str) -> None:
+        self.sent.append((rosys.time(), msg))
+
+    async def read(self) -> Optional[str]:
+        if not self._lines:
+            self._lines = await self.read_batch()
+        return self._lines.pop(0)[1] if self._lines else None
+
+    async def read_batch(self) -> list[tuple[float, str]]:
+        now = rosys.time()
+        if self._replay_start is None:
+            self._replay_start = now
+        lines, self._lines = self._lines, []
+        until = self._recording_start + (now - self._replay_start) * self.speed
+        while self._next is not None and self._next[0] <= until:
+            time, line = self._next
+            lines.append((self._replay_start + (time - self._recording_start) / self.speed, line))
+            self._next = next(self._records, None)
+        return lines
+
+    def __repr__(self) -> str:
+        return f'<ReplayCommunication {self.path}>'
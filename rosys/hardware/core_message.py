@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from .module import ModuleHardware
+
+if TYPE_CHECKING:
+    from .module import Module
+
+
+class CoreMessageLayout:
+    """Layout of the core message ("core <millis> <fields>") generated from the core message fields of all modules.
+
+    The fields of all modules implementing `handle_core_values` are converted to a NumPy array at once
+    and each of these modules is assigned the slice of this array containing its own fields.
+    Modules which only implement `handle_core_output` receive the corresponding slice of words instead,
+    so their fields do not need to be numeric.
+    The array can also be viewed as a structured record with one named field per numeric field.
+    """
+
+    def __init__(self, modules: list[Module]) -> None:
+        self.fields: list[str] = []
+        self.slices: list[tuple[ModuleHardware, slice, Optional[slice]]] = []
+        """module, slice of its words and slice of its values (None if the module handles words)"""
+        self.value_indices: list[int] = []
+        """indices of the words which are converted to values"""
+        for module in modules:
+            if not isinstance(module, ModuleHardware):
+                continue
+            start = len(self.fields)
+            self.fields.extend(module.core_message_fields)
+            values = None
+            if type(module).handle_core_values is not ModuleHardware.handle_core_values:
+                values = slice(len(self.value_indices), len(self.value_indices) + len(module.core_message_fields))
+                self.value_indices.extend(range(start, len(self.fields)))
+            self.slices.append((module, slice(start, len(self.fields)), values))
+        names = [self.fields[i].split(':')[0] for i in self.value_indices]
+        self.dtype = np.dtype([(name, float) for name in names]) if len(set(names)) == len(names) else None
+        """record type with one field per numeric field (None if the names are not unique)"""
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def parse(self, words: list[str]) -> np.ndarray:
+        """Convert the numeric fields among the words following "core <millis>" into an array of values.
+
+        :raises ValueError: if a numeric field is not a number
+        """
+        return np.array([words[i] for i in self.value_indices], dtype=float)
+
+    def to_record(self, values: np.ndarray) -> np.void:
+        """View the values as a structured record with one named field per numeric field."""
+        assert self.dtype is not None, 'core message field names are not unique'
+        return values.view(self.dtype)[0]
@@ -1,5 +1,7 @@
 import abc
 
+import numpy as np
+
 from ..event import Event
 from .module import Module, ModuleHardware, ModuleSimulation
 from .robot_brain import RobotBrain
@@ -47,9 +49,8 @@ class EStopHardware(EStop, ModuleHardware):
         await super().set_soft_estop(active)
         await self.robot_brain.send(f'en3.level({"false" if active else "true"})')
 
-    def handle_core_output(self, time: float, words: list[str]) -> None:
-        corelist = [int(words.pop(0)) == 0 for _ in self.pins]
-        active = any(corelist)
+    def handle_core_values(self, time: float, values: np.ndarray) -> None:
+        active = bool(np.any(values == 0))
         if active and not self.active:
             self.ESTOP_TRIGGERED.emit()
         self.active = active
@@ -2,6 +2,8 @@ import abc
 import logging
 from typing import Callable
 
+import numpy as np
+
 from .robot_brain import RobotBrain
 
 
@@ -25,6 +27,12 @@ class ModuleHardware(Module):
     def handle_core_output(self, time: float, words: list[str]) -> None:  # pylint: disable=unused-argument
         pass
 
+    def handle_core_values(self, time: float, values: np.ndarray) -> None:  # pylint: disable=unused-argument
+        """Handle the numeric values of this module's core message fields.
+
+        If a module implements this method, it is called instead of `handle_core_output`.
+        """
+
 
 class ModuleSimulation(Module):
 
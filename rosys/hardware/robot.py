@@ -1,9 +1,12 @@
 import abc
 import logging
-from typing import Optional, cast
+from typing import Callable, Optional, cast
+
+import numpy as np
 
 from .. import rosys
 from ..helpers import remove_indentation
+from .core_message import CoreMessageLayout
 from .expander import ExpanderHardware
 from .module import Module, ModuleHardware, ModuleSimulation
 from .robot_brain import RobotBrain
@@ -21,20 +24,31 @@ class RobotHardware(Robot):
     def __init__(self, modules: list[Module], robot_brain: RobotBrain) -> None:
         super().__init__(modules)
         self.robot_brain = robot_brain
+        self.core_message_layout = CoreMessageLayout([])
+        self.message_hooks: dict[str, list[Callable]] = {}
         self.robot_brain.lizard_code = self.generate_lizard_code()
         self.expander_prefixes = set(f'{module.name}:' for module in modules if isinstance(module, ExpanderHardware))
         rosys.on_repeat(self.update, 0.01)
 
     def generate_lizard_code(self) -> str:
+        """Generate the Lizard code of all modules and compile the dispatch of incoming lines.
+
+        The layout of the core message assigns each module the range of its fields
+        and the message hooks of all modules are merged into a single lookup by their prefix.
+        So hooks need to be registered before the robot is created.
+        """
+        self.core_message_layout = CoreMessageLayout(self.modules)
+        self.message_hooks = {}
+        for module in self.modules:
+            for prefix, hook in cast(ModuleHardware, module).message_hooks.items():
+                self.message_hooks.setdefault(prefix, []).append(hook)
         code = remove_indentation('''
             rdyp = Output(15)
             en3 = Output(12)
         ''')
         for module in self.modules:
             code += cast(ModuleHardware, module).lizard_code + '\n'
-        output_fields = []
-        for module in self.modules:
-            output_fields.extend(cast(ModuleHardware, module).core_message_fields)
+        output_fields = self.core_message_layout.fields
         code += remove_indentation(f'''
             core.output("core.millis {' '.join(output_fields)}")
             rdyp.on()
@@ -52,14 +66,30 @@ class RobotHardware(Robot):
             if not words:
                 continue
             if words[0] == 'core':
-                words.pop(0)
-                words.pop(0)
-                for module in self.modules:
-                    cast(ModuleHardware, module).handle_core_output(time, words)
+                words = words[2:]
+                if len(words) != len(self.core_message_layout):
+                    self.log.warning(f'expected {len(self.core_message_layout)} core message fields in "{line}"')
+                    continue
+                try:
+                    values: Optional[np.ndarray] = self.core_message_layout.parse(words)
+                except ValueError:
+                    values = None
+                for module, fields, value_fields in self.core_message_layout.slices:
+                    if value_fields is None:
+                        module.handle_core_output(time, words[fields])
+                    elif values is not None:
+                        module.handle_core_values(time, values[value_fields])
+                    else:
+                        # NOTE: only the modules with non-numeric fields miss this core message
+                        try:
+                            module_values = np.array(words[fields], dtype=float)
+                        except ValueError:
+                            self.log.warning(f'could not parse core message fields {words[fields]} of {module}')
+                            continue
+                        module.handle_core_values(time, module_values)
             else:
-                for module in self.modules:
-                    if words[0] in cast(ModuleHardware, module).message_hooks:
-                        cast(ModuleHardware, module).message_hooks[words[0]](line)
+                for hook in self.message_hooks.get(words[0], ()):
+                    hook(line)
 
 
 class RobotSimulation(Robot):
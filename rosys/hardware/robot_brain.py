@@ -1,8 +1,13 @@
+import asyncio
+import itertools
 import logging
+import re
 import sys
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Optional
+from typing import Hashable, Optional
 
+import numpy as np
 from nicegui import ui
 
 from .. import rosys
@@ -16,8 +21,12 @@ class RobotBrain:
 
     It expects a communication object, which is used for the actual read and write operations.
     Besides providing some basic methods like configuring or restarting the microcontroller, it augments and verifies checksums for each message.
+    Outgoing messages are queued and written in batches (see `send`).
     """
 
+    COALESCED_METHODS = {'speed'}
+    """methods of which only the latest queued call per target is sent"""
+
     def __init__(self, communication: Communication) -> None:
         self.LINE_RECEIVED = Event()
         """a line has been received from the microcontroller (argument: line as string)"""
@@ -32,6 +41,15 @@ class RobotBrain:
         self.clock_offset: Optional[float] = None
         self.hardware_time: Optional[float] = None
 
+        self.coalesced_count = 0
+        """number of queued messages which have been superseded by a newer message before being sent"""
+
+        self._outgoing: OrderedDict[Hashable, str] = OrderedDict()
+        self._last_keys: dict[str, Hashable] = {}
+        self._message_ids = itertools.count()
+        self._batch_start: Optional[float] = None
+        self._write_latencies: deque[float] = deque(maxlen=100)
+
         rosys.on_startup(self.enable_esp)
 
     def developer_ui(self) -> None:
@@ -97,10 +115,7 @@ class RobotBrain:
 
     async def configure(self) -> None:
         rosys.notify('Configuring Lizard...')
-        await self.send('!-')
-        for line in self.lizard_code.splitlines():
-            await self.send(f'!+{line}')
-        await self.send('!.')
+        await self.send_all(['!-', *(f'!+{line}' for line in self.lizard_code.splitlines()), '!.'])
         await self.restart()
         rosys.notify('Lizard configured successfully.', 'positive')
 
@@ -110,11 +125,11 @@ class RobotBrain:
     async def read_lines(self) -> list[tuple[float, str]]:
         lines: list[tuple[float, str]] = []
         millis = None
-        while True:
-            unchecked = await self.communication.read()
-            line = check(unchecked)
+        core_arrival_time = 0.0
+        batch = await self.communication.read_batch()
+        for (arrival_time, _), line in zip(batch, check_all([unchecked for _, unchecked in batch])):
             if not line:
-                break
+                continue
             words = line.split()
             if not words:
                 continue
@@ -123,6 +138,7 @@ class RobotBrain:
                 self.waiting_list[first] = line
             if first == 'core':
                 millis = float(words.pop(0))
+                core_arrival_time = arrival_time
                 if self.clock_offset is None:
                     continue
                 self.hardware_time = millis / 1000 + self.clock_offset
@@ -131,11 +147,59 @@ class RobotBrain:
                 continue
             lines.append((self.hardware_time, line))
         if millis is not None:
-            self.clock_offset = rosys.time() - millis / 1000
+            # NOTE: the arrival time is not delayed by polling, which reduces the jitter of the clock offset
+            self.clock_offset = core_arrival_time - millis / 1000
         return lines
 
+    @property
+    def queue_depth(self) -> int:
+        """Number of messages waiting to be sent."""
+        return len(self._outgoing)
+
+    @property
+    def write_latency(self) -> Optional[float]:
+        """Average time in seconds from queuing the first message of a recent batch until it has been written."""
+        if not self._write_latencies:
+            return None
+        return sum(self._write_latencies) / len(self._write_latencies)
+
     async def send(self, msg: str) -> None:
-        await self.communication.send(augment(msg))
+        """Queue a message and send all messages queued within the same iteration of the event loop in one batch.
+
+        A call of one of the `COALESCED_METHODS` (like `wheels.speed(...)`) replaces a queued call for the same target.
+        It takes the position of the queued call, unless another command to this target has been queued since.
+        In this case it moves to the end of the queue to keep the order of commands to the same target.
+        Only the caller starting a batch waits for it to be written, all others return immediately.
+        """
+        await self.send_all([msg])
+
+    async def send_all(self, msgs: list[str]) -> None:
+        """Queue multiple messages in the given order and send them like `send`."""
+        is_pending = self._batch_start is not None
+        for msg in msgs:
+            target, key = _parse_command(msg)
+            if key is None:
+                key = next(self._message_ids)
+            elif key in self._outgoing:
+                self.coalesced_count += 1
+                if self._last_keys.get(target) != key:  # NOTE: keep the order of commands to the same target
+                    del self._outgoing[key]
+            self._outgoing[key] = msg
+            if target is not None:
+                self._last_keys[target] = key
+        if is_pending:
+            return
+        self._batch_start = start = rosys.time()
+        try:
+            await asyncio.sleep(0)
+        finally:
+            # NOTE: the batch is also sent if this caller is cancelled, because other callers already returned
+            self._batch_start = None
+            batch = list(self._outgoing.values())
+            self._outgoing.clear()
+            self._last_keys.clear()
+            await self.communication.send_batch([augment(msg) for msg in batch])
+            self._write_latencies.append(rosys.time() - start)
 
     async def send_and_await(self, msg: str, ack: str, *, timeout: float = float('inf')) -> Optional[str]:
         self.waiting_list[ack] = None
@@ -158,6 +222,18 @@ class RobotBrain:
         return f'<RobotBrain {self.communication}>'
 
 
+_COMMAND = re.compile(r'([\w.]+)\.(\w+)\(')
+
+
+def _parse_command(msg: str) -> tuple[Optional[str], Optional[tuple[str, str]]]:
+    """Return the target of a command and, if its method is coalesced, the key for replacing queued calls."""
+    match = _COMMAND.match(msg)
+    if match is None:
+        return None, None
+    target, method = match.groups()
+    return target, (target, method) if method in RobotBrain.COALESCED_METHODS else None
+
+
 def augment(line: str) -> str:
     checksum = 0
     for c in line:
@@ -178,3 +254,41 @@ def check(line: Optional[str]) -> str:
     if checksum != check_:
         return ''
     return line
+
+
+def check_all(lines: list[str]) -> list[str]:
+    """Verify and strip the checksums of multiple lines at once (like `check`).
+
+    The checksums of all ASCII lines are computed with a single vectorized reduction.
+    """
+    result = [''] * len(lines)
+    indices: list[int] = []
+    bodies: list[str] = []
+    for i, line in enumerate(lines):
+        if line[-3:-2] != '@':
+            continue
+        if not line.isascii():
+            try:
+                result[i] = check(line)
+            except ValueError:
+                pass
+            continue
+        indices.append(i)
+        bodies.append(line[:-3])
+    if not bodies:
+        return result
+    data = np.frombuffer(''.join(bodies).encode(), dtype=np.uint8)
+    lengths = np.array([len(body) for body in bodies])
+    starts = np.cumsum(lengths) - lengths
+    nonempty = lengths > 0
+    checksums = np.zeros(len(bodies), dtype=np.uint8)
+    if data.size:
+        # NOTE: empty bodies have zero length, so each reduction ends at the start of the next non-empty body
+        checksums[nonempty] = np.bitwise_xor.reduceat(data, starts[nonempty])
+    for i, body, checksum in zip(indices, bodies, checksums.tolist()):
+        try:
+            if int(lines[i][-2:], 16) == checksum:
+                result[i] = body
+        except ValueError:
+            continue
+    return result
@@ -1,5 +1,7 @@
 import abc
 
+import numpy as np
+
 from .. import rosys
 from ..event import Event
 from ..geometry import Pose, PoseStep, Velocity
@@ -69,8 +71,8 @@ class WheelsHardware(Wheels, ModuleHardware):
         await super().drive(linear, angular)
         await self.robot_brain.send(f'{self.name}.speed({linear}, {angular})')
 
-    def handle_core_output(self, time: float, words: list[str]) -> None:
-        velocity = Velocity(linear=float(words.pop(0)), angular=float(words.pop(0)), time=time)
+    def handle_core_values(self, time: float, values: np.ndarray) -> None:
+        velocity = Velocity(linear=float(values[0]), angular=float(values[1]), time=time)
         self.VELOCITY_MEASURED.emit([velocity])
 
 
@@ -1,25 +1,30 @@
-import itertools
+import hashlib
 import logging
 from dataclasses import dataclass
-from functools import lru_cache
+from itertools import pairwise, product
+from pathlib import Path
 from typing import Optional
 
-import networkx as nx
 import numpy as np
 from scipy import ndimage, spatial
 
 from ..driving import PathSegment
 from ..geometry import Point, Pose, PoseStep, Spline
-from ..helpers import angle
+from ..helpers import angle, eliminate_2pi
 from .area import Area
 from .delaunay_pose_group import DelaunayPoseGroup
 from .fast_spline import FastSpline
 from .grid import Grid
 from .obstacle import Obstacle
 from .obstacle_map import ObstacleMap
+from .planner_cache import PlannerCache
+from .roadmap import Roadmap
 
 GRID_RESOLUTION = 1.0
 MIN_MARGIN = 1.0
+PIXEL_SIZE = 0.1
+NUM_LAYERS = 36
+PADDING = 1.0
 
 TRY_SINGLE_PATH = True
 """Try to find a collision-free simple path between start and goal.
@@ -27,13 +32,51 @@ TRY_SINGLE_PATH = True
 See https://trello.com/c/FtP4yHqA/777#comment-62d0323e97ba19392bcbceb8 for more information.
 """
 
+MAX_BATCH_SIZE = 1_000_000
+"""Maximum number of spline samples to test against the obstacle map at once."""
+
 TRY_SINGLE_SHUNTING = True
 """Try to find collision-free path with minimal switching (single shunting)."""
 
+INCREMENTAL_UPDATES = True
+"""Update only the affected region of the obstacle map and graph when obstacles are added, removed or moved."""
+
+CACHE_VERSION = 1
+"""Version of the persistent planner cache, needs to be increased whenever the cached arrays change."""
+
+
+CACHED_ARRAYS = (
+    *ObstacleMap.ARRAY_NAMES,
+    'tri_points',
+    'node_offsets',
+    'neighbor_indices',
+    'roadmap_indptr',
+    'roadmap_indices',
+    'roadmap_weights',
+    'roadmap_backward',
+    'edge_codes',
+    'edge_lengths',
+    'edge_bboxes',
+)
+"""Names of the arrays of a planner cache entry, which is ignored if any of them is missing."""
+
+
+@dataclass(slots=True, kw_only=True)
+class EdgeCache:
+    node_ids: dict[tuple[float, float, float], int]
+    num_nodes: int
+    codes: np.ndarray
+    """sorted edge codes ``source * num_nodes + target``"""
+    lengths: np.ndarray
+    """spline length for each edge (NaN if the spline collides with an obstacle)"""
+    bboxes: np.ndarray
+    """bounding box ``(min_x, min_y, max_x, max_y)`` of the spline samples for each edge"""
+
 
 class DelaunayPlanner:
 
-    def __init__(self, robot_outline: list[tuple[float, float]]) -> None:
+    def __init__(self, robot_outline: list[tuple[float, float]], *,
+                 cache_path: Optional[Path] = None, shared_cache: bool = False) -> None:
         self.robot_outline = robot_outline
         self.areas: list[Area] = []
         self.obstacles: list[Obstacle] = []
@@ -41,24 +84,39 @@ class DelaunayPlanner:
         self.tri_points: Optional[np.ndarray] = None
         self.tri_mesh: Optional[spatial.Delaunay] = None
         self.pose_groups: Optional[list[DelaunayPoseGroup]] = None
-        self.graph: Optional[nx.DiGraph] = None
+        self.node_offsets: Optional[np.ndarray] = None
+        self.neighbor_indices: Optional[np.ndarray] = None
+        self.roadmap: Optional[Roadmap] = None
+        self.edge_cache: Optional[EdgeCache] = None
+        self.cache = PlannerCache(cache_path) if cache_path else None
+        self.shared_cache = shared_cache
+        """wait for cache entries to be written, so that other processes can load them right away"""
         self.log = logging.getLogger('rosys.delaunay_planner')
 
     def update_map(self, areas: list[Area], obstacles: list[Obstacle], additional_points: list[Point],
                    deadline: float) -> None:
         if self.obstacle_map and \
                 self.areas == areas and \
-                self.obstacles == obstacles and \
-                all(self.obstacle_map.grid.contains(point, padding=1.0) for point in additional_points):
-            return
+                all(self.obstacle_map.grid.contains(point, padding=PADDING) for point in additional_points):
+            if self.obstacles == obstacles:
+                return
+            if INCREMENTAL_UPDATES:
+                outlines = _changed_outlines(self.obstacles, obstacles)
+                if outlines is not None and \
+                        all(self.obstacle_map.grid.contains(p, padding=PADDING) for o in outlines for p in o):
+                    self.obstacles = obstacles
+                    dirty_region = self.obstacle_map.update(self.areas, self.obstacles, outlines, deadline)
+                    if dirty_region is not None:
+                        # NOTE: incremental updates are not persisted, since every save copies and rewrites all arrays
+                        self._create_graph(dirty_region)
+                    return
         self.areas = areas
         self.obstacles = obstacles
-        self._create_obstacle_map(additional_points, deadline)
-        self._create_graph()
+        self._create_obstacle_map_and_graph(additional_points, deadline)
 
     def grow_map(self, points: list[Point], deadline: float) -> None:
         if self.obstacle_map is not None and \
-                all(self.obstacle_map.grid.contains(point, padding=1.0) for point in points):
+                all(self.obstacle_map.grid.contains(point, padding=PADDING) for point in points):
             return
         if self.obstacle_map is not None:
             bbox = self.obstacle_map.grid.bbox
@@ -66,17 +124,95 @@ class DelaunayPlanner:
             points.append(Point(x=bbox[0]+bbox[2], y=bbox[1]))
             points.append(Point(x=bbox[0],         y=bbox[1]+bbox[3]))
             points.append(Point(x=bbox[0]+bbox[2], y=bbox[1]+bbox[3]))
-        self._create_obstacle_map(points, deadline)
-        self._create_graph()
+        self._create_obstacle_map_and_graph(points, deadline)
 
-    def _create_obstacle_map(self, additional_points: list[Point], deadline: float) -> None:
+    def _create_obstacle_map_and_graph(self, additional_points: list[Point], deadline: float) -> None:
         points = [p for obstacle in self.obstacles for p in obstacle.outline]
         points += [p for area in self.areas for p in area.outline]
         points += additional_points
-        grid = Grid.from_points(points, pixel_size=0.1, num_layers=36, padding=1.0)
+        if self._load_from_cache(additional_points):
+            self.log.info('loaded obstacle map and graph from cache')
+            return
+        grid = Grid.from_points(points, pixel_size=PIXEL_SIZE, num_layers=NUM_LAYERS, padding=PADDING)
         self.obstacle_map = ObstacleMap.from_world(self.robot_outline, self.areas, self.obstacles, grid, deadline)
-
-    def _create_graph(self) -> None:
+        self._create_graph()
+        self._save_to_cache()
+
+    def _cache_key(self) -> str:
+        """Hash of the world and all parameters the obstacle map and graph depend on (except the grid extent)."""
+        data = (
+            CACHE_VERSION,
+            GRID_RESOLUTION,
+            MIN_MARGIN,
+            PIXEL_SIZE,
+            NUM_LAYERS,
+            PADDING,
+            [tuple(float(v) for v in point) for point in self.robot_outline],
+            [[(float(p.x), float(p.y)) for p in area.outline] for area in self.areas],
+            [[(float(p.x), float(p.y)) for p in obstacle.outline] for obstacle in self.obstacles],
+        )
+        return hashlib.sha256(repr(data).encode()).hexdigest()
+
+    def _load_from_cache(self, additional_points: list[Point]) -> bool:
+        arrays = self.cache.load(self._cache_key(), CACHED_ARRAYS) if self.cache else None
+        if arrays is None:
+            return False
+        obstacle_map = ObstacleMap.from_arrays(arrays)
+        if not all(obstacle_map.grid.contains(point, padding=PADDING) for point in additional_points):
+            return False
+        self.obstacle_map = obstacle_map
+        self.tri_points = np.array(arrays['tri_points'])
+        self.tri_mesh = spatial.Delaunay(self.tri_points)
+        x, y, yaw = self._create_nodes(np.array(arrays['node_offsets']), np.array(arrays['neighbor_indices']))
+        self.roadmap = Roadmap(
+            x=x,
+            y=y,
+            indptr=arrays['roadmap_indptr'],
+            indices=arrays['roadmap_indices'],
+            weights=arrays['roadmap_weights'],
+            backward=arrays['roadmap_backward'],
+        )
+        self.edge_cache = EdgeCache(
+            node_ids=dict(zip(zip(x.tolist(), y.tolist(), yaw.tolist()), range(len(x)))),
+            num_nodes=len(x),
+            codes=arrays['edge_codes'],
+            lengths=arrays['edge_lengths'],
+            bboxes=arrays['edge_bboxes'],
+        )
+        return True
+
+    def _save_to_cache(self) -> None:
+        if self.cache is None:
+            return
+        assert self.obstacle_map is not None
+        assert self.tri_points is not None
+        assert self.node_offsets is not None
+        assert self.neighbor_indices is not None
+        assert self.roadmap is not None
+        assert self.edge_cache is not None
+        self.cache.save(self._cache_key(), {
+            **self.obstacle_map.to_arrays(),
+            'tri_points': self.tri_points,
+            'node_offsets': self.node_offsets,
+            'neighbor_indices': self.neighbor_indices,
+            'roadmap_indptr': self.roadmap.indptr,
+            'roadmap_indices': self.roadmap.indices,
+            'roadmap_weights': self.roadmap.weights,
+            'roadmap_backward': self.roadmap.backward,
+            'edge_codes': self.edge_cache.codes,
+            'edge_lengths': self.edge_cache.lengths,
+            'edge_bboxes': self.edge_cache.bboxes,
+        })
+        if self.shared_cache:
+            self.cache.join()
+
+    def _create_graph(self, dirty_region: Optional[tuple[float, float, float, float]] = None) -> None:
+        """Create the graph of collision-free splines between Delaunay vertices.
+
+        All candidate splines are sampled and tested against the obstacle map in large batches.
+        If a dirty region is given, only edges touching this region are tested again.
+        Results for all other edges are taken from the edge cache of the previous graph.
+        """
         assert self.obstacle_map is not None
         min_x, min_y, size_x, size_y = self.obstacle_map.grid.bbox
         X, Y = np.meshgrid(np.arange(min_x, min_x + size_x - GRID_RESOLUTION / 2, GRID_RESOLUTION),
@@ -95,8 +231,8 @@ class DelaunayPlanner:
         X[close] += dD_dX[close] / dD[close] * (MIN_MARGIN - D[close])
         Y[close] += dD_dY[close] / dD[close] * (MIN_MARGIN - D[close])
 
-        keep = np.reshape([not all(self.obstacle_map.stack[int(np.round(row)), int(np.round(col)), :])
-                           for row, col in zip(rows, cols)], X.shape)
+        blocked = self.obstacle_map.stack[np.round(rows).astype(int), np.round(cols).astype(int), :].all(axis=1)
+        keep = ~blocked.reshape(X.shape)
         keep[1::2, :] = np.logical_and(keep[1::2, :], D[1::2, :] < 2)
         keep[::4, 1::2] = np.logical_and(keep[::4, 1::2], D[::4, 1::2] < 2)
         keep[2::4, ::2] = np.logical_and(keep[2::4, ::2], D[2::4, ::2] < 2)
@@ -104,38 +240,95 @@ class DelaunayPlanner:
         assert self.tri_points is not None  # NOTE: mypy doesn't seem to understand np.stack
 
         self.tri_mesh = spatial.Delaunay(self.tri_points)
+        indptr, indices = self.tri_mesh.vertex_neighbor_vertices
+        x, y, yaw = self._create_nodes(indptr, indices)
+
+        # NOTE: each node is connected to all nodes of the vertex it is pointing to
+        num_targets = np.diff(indptr)[indices]
+        sources = np.repeat(np.arange(len(indices)), num_targets)
+        targets = np.repeat(indptr[indices], num_targets) + \
+            np.arange(len(sources)) - np.repeat(np.cumsum(num_targets) - num_targets, num_targets)
+        no_turn = np.abs(eliminate_2pi(yaw[targets] + np.pi - yaw[sources])) >= 0.01  # NOTE: avoid 180-degree turns
+        sources = sources[no_turn]
+        targets = targets[no_turn]
+
+        lengths = self._test_edges(x, y, yaw, sources, targets, dirty_region)
+        free = ~np.isnan(lengths)
+        sources, targets, lengths = sources[free], targets[free], lengths[free]
+        reverse = ~np.isin(targets * len(x) + sources, sources * len(x) + targets)
+        self.roadmap = Roadmap.from_edges(
+            x,
+            y,
+            np.concatenate((sources, targets[reverse])),
+            np.concatenate((targets, sources[reverse])),
+            np.concatenate((lengths, 1.2 * lengths[reverse])),
+            np.concatenate((np.zeros(len(sources), dtype=bool), np.ones(np.count_nonzero(reverse), dtype=bool))),
+        )
+
+    def _create_nodes(self, indptr: np.ndarray, indices: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Create pose groups from the CSR neighbor lists of the Delaunay vertices and return all node poses.
+
+        There is one node for each vertex and each of its neighbors, i.e. for each entry of the neighbor list.
+        """
+        assert self.tri_points is not None
+        groups = np.repeat(np.arange(len(self.tri_points)), np.diff(indptr))
+        x = self.tri_points[groups, 0]
+        y = self.tri_points[groups, 1]
+        yaw = np.arctan2(self.tri_points[indices, 1] - y, self.tri_points[indices, 0] - x)
+        self.node_offsets = indptr
+        self.neighbor_indices = indices
         self.pose_groups = [
             DelaunayPoseGroup(
                 index=i,
                 point=Point(x=self.tri_points[i, 0], y=self.tri_points[i, 1]),
-                neighbor_indices=_tri_neighbors(self.tri_mesh, i).tolist(),
-                poses=[
-                    Pose(x=point[0], y=point[1], yaw=np.arctan2(neighbor[1] - point[1], neighbor[0] - point[0]))
-                    for neighbor in self.tri_points[_tri_neighbors(self.tri_mesh, i)]
-                ],
+                neighbor_indices=indices[indptr[i]:indptr[i + 1]].tolist(),
+                poses=[Pose(x=x[n], y=y[n], yaw=yaw[n]) for n in range(indptr[i], indptr[i + 1])],
             )
-            for i, point in enumerate(self.tri_points)
+            for i in range(len(self.tri_points))
         ]
+        return x, y, yaw
 
-        self.graph = nx.DiGraph()
-        for g, group in enumerate(self.pose_groups):
-            for p in range(len(group.poses)):
-                self.graph.add_node((g, p))
-        for g, group in enumerate(self.pose_groups):
-            for p, (pose, g_) in enumerate(zip(group.poses, group.neighbor_indices)):
-                for p_, pose_ in enumerate(self.pose_groups[g_].poses):
-                    if abs(angle(pose.yaw, pose_.yaw + np.pi)) < 0.01:
-                        continue  # NOTE: avoid 180-degree turns
-                    x, y, yaw = _generate_poses(self.obstacle_map.grid, pose, pose_)
-                    if not self.obstacle_map.test(x, y, yaw).any():
-                        length = np.sum(np.sqrt(np.diff(x)**2 + np.diff(y)**2))
-                        self.graph.add_edge((g, p), (g_, p_), backward=False, weight=length)
-                        if ((g_, p_), (g, p)) not in self.graph.edges:
-                            self.graph.add_edge((g_, p_), (g, p), backward=True, weight=1.2*length)
+    def _test_edges(self, x: np.ndarray, y: np.ndarray, yaw: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                    dirty_region: Optional[tuple[float, float, float, float]]) -> np.ndarray:
+        """Return the lengths of the splines between the given nodes (NaN if the spline collides with an obstacle)."""
+        assert self.obstacle_map is not None
+        keys = list(zip(x.tolist(), y.tolist(), yaw.tolist()))
+        lengths = np.full(len(sources), np.nan)
+        bboxes = np.zeros((len(sources), 4))
+        untested = np.ones(len(sources), dtype=bool)
+        if self.edge_cache is not None and len(self.edge_cache.codes) and dirty_region is not None:
+            cache = self.edge_cache
+            old_ids = np.array([cache.node_ids.get(key, -1) for key in keys], dtype=np.int64)
+            old_sources = old_ids[sources]
+            old_targets = old_ids[targets]
+            codes = old_sources * cache.num_nodes + old_targets
+            i = np.searchsorted(cache.codes, codes).clip(max=len(cache.codes) - 1)
+            min_x, min_y, max_x, max_y = dirty_region
+            bbox = cache.bboxes[i]
+            untested = (old_sources < 0) | (old_targets < 0) | (cache.codes[i] != codes) | \
+                ((bbox[:, 0] <= max_x) & (bbox[:, 2] >= min_x) & (bbox[:, 1] <= max_y) & (bbox[:, 3] >= min_y))
+            lengths[~untested] = cache.lengths[i[~untested]]
+            bboxes[~untested] = bbox[~untested]
+        lengths[untested], bboxes[untested] = _test_splines(
+            self.obstacle_map,
+            x[sources[untested]], y[sources[untested]], yaw[sources[untested]],
+            x[targets[untested]], y[targets[untested]], yaw[targets[untested]],
+        )
+        codes = sources * len(x) + targets
+        order = np.argsort(codes)
+        self.edge_cache = EdgeCache(
+            node_ids=dict(zip(keys, range(len(keys)))),
+            num_nodes=len(x),
+            codes=codes[order],
+            lengths=lengths[order],
+            bboxes=bboxes[order],
+        )
+        return lengths
 
     def search(self, start: Pose, goal: Pose) -> list[PathSegment]:
         assert self.obstacle_map is not None
-        assert self.graph is not None
+        assert self.roadmap is not None
+        assert self.node_offsets is not None
         assert self.pose_groups is not None
         paths: list[list[PathSegment]] = []
 
@@ -176,21 +369,19 @@ class DelaunayPlanner:
         if not grid_exits:
             raise RuntimeError('could not find exit segment')
 
-        for enter, exit_ in itertools.product(grid_entries, grid_exits):
-            p, g = enter.coordinate
-            p_, g_ = exit_.coordinate
-            path: list[PathSegment] = [enter.segment]
-            last_g, last_p = g, p
-            try:
-                for next_g, next_p in nx.shortest_path(self.graph, (g, p), (g_, p_), weight='weight')[1:]:
-                    last_pose = self.pose_groups[last_g].poses[last_p]
-                    next_pose = self.pose_groups[next_g].poses[next_p]
-                    backward = self.graph.edges[((last_g, last_p), (next_g, next_p))]['backward']
-                    spline = Spline.from_poses(last_pose, next_pose, backward=backward)
-                    path.append(PathSegment(spline=spline, backward=backward))
-                    last_g, last_p = next_g, next_p
-            except nx.exception.NetworkXNoPath:
+        poses = [pose for group in self.pose_groups for pose in group.poses]
+        entry_nodes = [int(self.node_offsets[g]) + p for p, g in (passage.coordinate for passage in grid_entries)]
+        exit_nodes = [int(self.node_offsets[g]) + p for p, g in (passage.coordinate for passage in grid_exits)]
+        node_paths = self.roadmap.shortest_paths(entry_nodes, exit_nodes)
+        for (enter, entry_node), (exit_, exit_node) in \
+                product(zip(grid_entries, entry_nodes), zip(grid_exits, exit_nodes)):
+            if (entry_node, exit_node) not in node_paths:
                 continue
+            path: list[PathSegment] = [enter.segment]
+            for last_node, next_node in pairwise(node_paths[(entry_node, exit_node)]):
+                backward = bool(self.roadmap.backward[self.roadmap.find_edge(last_node, next_node)])
+                spline = Spline.from_poses(poses[last_node], poses[next_node], backward=backward)
+                path.append(PathSegment(spline=spline, backward=backward))
             path.append(exit_.segment)
 
             while True:
@@ -236,31 +427,64 @@ class DelaunayPlanner:
         return min(paths, key=len)
 
 
-def _tri_neighbors(tri_mesh: spatial.Delaunay, vertex_index: int) -> np.ndarray:
-    return tri_mesh.vertex_neighbor_vertices[1][tri_mesh.vertex_neighbor_vertices[0][vertex_index]:
-                                                tri_mesh.vertex_neighbor_vertices[0][vertex_index + 1]]
-
-
-@lru_cache(maxsize=1000)
-def _t_array(n: int) -> np.ndarray:
-    return np.linspace(0, 1, n)
-
-
-@lru_cache(maxsize=10000)
-def _generate_pose_offsets(grid: Grid, dx: float, dy: float, yaw: float, yaw_: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
-    spline = FastSpline(0, 0, yaw, dx, dy, yaw_, False)
-    row0, col0, layer0 = grid.to_3d_grid(0, 0, yaw)
-    row1, col1, layer1 = grid.to_3d_grid(dx, dy, yaw_)
-    num_rows = int(abs(row1 - row0))
-    num_cols = int(abs(col1 - col0))
-    num_layers = int(abs(layer1 - layer0))
-    t = _t_array(max(num_rows, num_cols, num_layers))
-    return (spline.x(t), spline.y(t), spline.yaw(t) + [0, np.pi][spline.backward])
-
-
-def _generate_poses(grid: Grid, pose: Pose, pose_: Pose) -> tuple:
-    dx, dy, yaw = _generate_pose_offsets(grid, pose_.x - pose.x, pose_.y - pose.y, pose.yaw, pose_.yaw)
-    return pose.x + dx, pose.y + dy, yaw
+def _test_splines(obstacle_map: ObstacleMap,
+                  x0: np.ndarray, y0: np.ndarray, yaw0: np.ndarray,
+                  x1: np.ndarray, y1: np.ndarray, yaw1: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sample the splines between the given poses with one sample per grid cell and test them against the obstacle map.
+
+    The samples of many splines are concatenated and looked up at once in batches of at most ``MAX_BATCH_SIZE``.
+    Returns the lengths of the splines (NaN if the spline collides with an obstacle) and their bounding boxes.
+    """
+    row0, col0, layer0 = obstacle_map.grid.to_3d_grid(np.zeros_like(x0), np.zeros_like(y0), yaw0)
+    row1, col1, layer1 = obstacle_map.grid.to_3d_grid(x1 - x0, y1 - y0, yaw1)
+    num_samples = np.max([np.abs(row1 - row0), np.abs(col1 - col0), np.abs(layer1 - layer0)], axis=0).astype(int)
+    lengths = np.zeros(len(x0))
+    bboxes = np.stack((np.minimum(x0, x1), np.minimum(y0, y1), np.maximum(x0, x1), np.maximum(y0, y1)), axis=1)
+    ends = np.cumsum(num_samples)
+    start = 0
+    while start < len(x0):
+        limit = ends[start] - num_samples[start] + MAX_BATCH_SIZE
+        end = max(int(np.searchsorted(ends, limit, side='right')), start + 1)
+        n = num_samples[start:end]
+        first = np.cumsum(n) - n
+        index = np.repeat(np.arange(end - start), n)
+        if len(index):
+            t = (np.arange(len(index)) - first[index]) / np.maximum(n[index] - 1, 1)
+            i = start + index
+            spline = FastSpline(x0[i], y0[i], yaw0[i], x1[i], y1[i], yaw1[i], False)
+            x, y, yaw = spline.x(t), spline.y(t), spline.yaw(t)
+            collisions = np.bincount(index, weights=obstacle_map.test(x, y, yaw)[0], minlength=end - start) > 0
+            same = index[1:] == index[:-1]
+            steps = np.sqrt(np.diff(x)**2 + np.diff(y)**2)
+            lengths[start:end] = np.bincount(index[1:][same], weights=steps[same], minlength=end - start)
+            lengths[start:end][collisions] = np.nan
+            sampled = n > 0
+            bboxes[start:end][sampled] = np.stack((
+                np.minimum.reduceat(x, first[sampled]),
+                np.minimum.reduceat(y, first[sampled]),
+                np.maximum.reduceat(x, first[sampled]),
+                np.maximum.reduceat(y, first[sampled]),
+            ), axis=1)
+        start = end
+    return lengths, bboxes
+
+
+def _changed_outlines(old_obstacles: list[Obstacle], new_obstacles: list[Obstacle]) -> Optional[list[list[Point]]]:
+    """Return old and new outlines of all obstacles that have been added, removed or moved.
+
+    Returns ``None`` if obstacles cannot be matched by their IDs.
+    """
+    old_outlines = {obstacle.id: obstacle.outline for obstacle in old_obstacles}
+    new_outlines = {obstacle.id: obstacle.outline for obstacle in new_obstacles}
+    if len(old_outlines) != len(old_obstacles) or len(new_outlines) != len(new_obstacles):
+        return None
+    outlines: list[list[Point]] = []
+    for id_ in old_outlines.keys() | new_outlines.keys():
+        old_outline = old_outlines.get(id_)
+        new_outline = new_outlines.get(id_)
+        if old_outline != new_outline:
+            outlines += [outline for outline in (old_outline, new_outline) if outline]
+    return outlines
 
 
 def _is_healthy(spline: Spline, curvature_limit: float = 10.0) -> bool:
@@ -3,12 +3,19 @@ from typing import Optional
 
 import numpy as np
 import scipy.interpolate
+import scipy.sparse
+import scipy.sparse.csgraph
 
 from ..geometry import Point
 from .obstacle_map import ObstacleMap
 
 
 class DistanceMap:
+    """Map of 8-connected path lengths from every grid cell to a target point.
+
+    The wavefront is propagated with a single Dijkstra search over the grid graph.
+    Obstacles as well as cells at the border of the grid, which are never updated, keep an "infinite" distance.
+    """
 
     def __init__(self, obstacle_map: ObstacleMap, target: Point, deadline: Optional[float] = None):
         self.grid = obstacle_map.grid
@@ -31,31 +38,9 @@ class DistanceMap:
             for c in [np.floor(col), np.ceil(col)]:
                 d[int(r), int(c)] = np.sqrt((row - r)**2 + (col - c)**2)
 
-        old_sum = d.sum()
-        while True:
-            d_dx = d + self.DX
-            d_dy = d + self.DY
-            d_dd = d + self.DD
-            d[1:-1, 1:-1] = np.minimum(
-                d[1:-1, 1:-1],
-                np.minimum(
-                    np.minimum(
-                        np.minimum(d_dy[:-2, 1:-1], d_dy[+2:, 1:-1]),
-                        np.minimum(d_dx[1:-1, :-2], d_dx[1:-1, +2:])
-                    ),
-                    np.minimum(
-                        np.minimum(d_dd[+2:, +2:], d_dd[+2:, :-2]),
-                        np.minimum(d_dd[:-2, +2:], d_dd[:-2, :-2])
-                    )
-                )
-            )
-            d[scaled_obstacle_map] = scaled_inf
-            new_sum = d.sum()
-            if new_sum == old_sum:
-                break
-            old_sum = new_sum
-            if deadline and time.time() > deadline:
-                raise TimeoutError('distance map creation took too long')
+        d = self._propagate(d, scaled_obstacle_map, scaled_inf)
+        if deadline and time.time() > deadline:
+            raise TimeoutError('distance map creation took too long')
 
         self.map = d.astype(float) / self.F
         gy, gx = np.gradient(self.map)
@@ -63,20 +48,78 @@ class DistanceMap:
         rows = np.arange(self.grid.size[0])
         cols = np.arange(self.grid.size[1])
         xx, yy = self.grid.from_grid(rows, cols)
-        self._interp = scipy.interpolate.interp2d(xx, yy, self.map, kind='linear')
-        self._grad_x = scipy.interpolate.interp2d(xx, yy, gx, kind='linear')
-        self._grad_y = scipy.interpolate.interp2d(xx, yy, gy, kind='linear')
+        self._interp = self._create_interpolator(xx, yy, self.map)
+        self._grad_x = self._create_interpolator(xx, yy, gx)
+        self._grad_y = self._create_interpolator(xx, yy, gy)
 
         self.map[self.map >= self.INF] = np.inf
 
+    def _propagate(self, d: np.ndarray, obstacles: np.ndarray, scaled_inf: int) -> np.ndarray:
+        """Compute the fixed point of relaxing all interior free cells from their 8 neighbors.
+
+        The seeds are connected to an additional source node with edge weights of the seed values plus one,
+        so that no edge has a weight of zero.
+        """
+        num_rows, num_cols = d.shape
+        updatable = np.zeros(d.shape, dtype=bool)
+        updatable[1:-1, 1:-1] = ~obstacles[1:-1, 1:-1]
+        seeds = np.flatnonzero(d < scaled_inf)
+        sources = updatable.copy()
+        sources.flat[seeds] = True
+
+        ids = np.arange(d.size).reshape(d.shape)
+        edge_sources: list[np.ndarray] = []
+        edge_targets: list[np.ndarray] = []
+        edge_weights: list[np.ndarray] = []
+        for dr, dc, weight in [(-1, 0, self.DY), (1, 0, self.DY), (0, -1, self.DX), (0, 1, self.DX),
+                               (-1, -1, self.DD), (-1, 1, self.DD), (1, -1, self.DD), (1, 1, self.DD)]:
+            target_slice = (slice(1, -1), slice(1, -1))
+            source_slice = (slice(1 + dr, num_rows - 1 + dr), slice(1 + dc, num_cols - 1 + dc))
+            mask = updatable[target_slice] & sources[source_slice]
+            edge_sources.append(ids[source_slice][mask])
+            edge_targets.append(ids[target_slice][mask])
+            edge_weights.append(np.full(np.count_nonzero(mask), weight, dtype=float))
+        edge_sources.append(np.full(len(seeds), d.size))
+        edge_targets.append(seeds)
+        edge_weights.append(d.flat[seeds] + 1.0)
+
+        graph = scipy.sparse.csr_matrix(
+            (np.concatenate(edge_weights), (np.concatenate(edge_sources), np.concatenate(edge_targets))),
+            shape=(d.size + 1, d.size + 1),
+        )
+        distances = scipy.sparse.csgraph.dijkstra(graph, indices=d.size)[:-1].reshape(d.shape) - 1.0
+        result = d.copy()
+        reached = updatable & np.isfinite(distances)
+        result[reached] = np.minimum(d[reached], distances[reached].astype(int))
+        result[obstacles] = scaled_inf
+        return result
+
+    @staticmethod
+    def _create_interpolator(xx: np.ndarray, yy: np.ndarray, values: np.ndarray) \
+            -> scipy.interpolate.RegularGridInterpolator:
+        return scipy.interpolate.RegularGridInterpolator((yy, xx), values.copy(), method='linear')
+
+    @staticmethod
+    def _evaluate(interpolator: scipy.interpolate.RegularGridInterpolator, x, y) -> np.ndarray:
+        """Evaluate on the grid spanned by the sorted coordinates, like the former ``scipy.interpolate.interp2d``.
+
+        Coordinates outside the grid are clamped to its border (nearest-neighbor extrapolation).
+        """
+        yy, xx = interpolator.grid
+        x = np.clip(np.sort(np.atleast_1d(x)), xx[0], xx[-1])
+        y = np.clip(np.sort(np.atleast_1d(y)), yy[0], yy[-1])
+        Y, X = np.meshgrid(y, x, indexing='ij')
+        result = interpolator((Y, X))
+        return result[0] if len(result) == 1 else result
+
     def interpolate(self, x, y):
-        result = self._interp(x, y)
+        result = self._evaluate(self._interp, x, y)
         result[result >= self.INF / self.F] = np.inf
         return result
 
     def gradient(self, x, y):
-        result_x = self._grad_x(x, y)
-        result_y = self._grad_y(x, y)
+        result_x = self._evaluate(self._grad_x, x, y)
+        result_y = self._evaluate(self._grad_y, x, y)
         result_x[result_x <= -self.INF / self.F] = -np.inf
         result_y[result_y <= -self.INF / self.F] = -np.inf
         result_x[result_x >= self.INF / self.F] = np.inf
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Compare the Dijkstra-based DistanceMap with the former iterative relaxation on the recorded demo maps.
+
+Usage: python3 distance_map_benchmark.py [demos/<name>.py ...]
+"""
+import importlib
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rosys.pathplanning.delaunay_planner import DelaunayPlanner
+from rosys.pathplanning.distance_map import DistanceMap
+
+
+def relax(distance_map: DistanceMap, obstacles: np.ndarray, target_row: float, target_col: float) -> np.ndarray:
+    """Former implementation: repeated full-array 8-neighbor relaxations until the sum stops changing."""
+    scaled_inf = distance_map.F * distance_map.INF
+    d = np.zeros(obstacles.shape, dtype=int)
+    d.fill(scaled_inf)
+    for r in [np.floor(target_row), np.ceil(target_row)]:
+        for c in [np.floor(target_col), np.ceil(target_col)]:
+            d[int(r), int(c)] = np.sqrt((target_row - r)**2 + (target_col - c)**2)
+    old_sum = d.sum()
+    while True:
+        d_dx = d + distance_map.DX
+        d_dy = d + distance_map.DY
+        d_dd = d + distance_map.DD
+        d[1:-1, 1:-1] = np.minimum.reduce([
+            d[1:-1, 1:-1],
+            d_dy[:-2, 1:-1], d_dy[+2:, 1:-1], d_dx[1:-1, :-2], d_dx[1:-1, +2:],
+            d_dd[+2:, +2:], d_dd[+2:, :-2], d_dd[:-2, +2:], d_dd[:-2, :-2],
+        ])
+        d[obstacles] = scaled_inf
+        new_sum = d.sum()
+        if new_sum == old_sum:
+            return d
+        old_sum = new_sum
+
+
+demos = sys.argv[1:] or sorted(str(p.relative_to(Path.cwd())) for p in (Path(__file__).parent / 'demos').glob('*.py'))
+print(f'{"demo":<30} {"grid":>10} {"relaxation":>12} {"dijkstra":>12} {"speedup":>8}  equal')
+for demo in demos:
+    module = importlib.import_module(demo.removesuffix('.py').replace('/', '.'))
+    planner = DelaunayPlanner(module.robot_outline)
+    cmd = module.cmd
+    planner.update_map(cmd.areas, cmd.obstacles, [cmd.start.point, cmd.goal.point], deadline=time.time() + 60.0)
+    obstacle_map = planner.obstacle_map
+    assert obstacle_map is not None
+
+    t = time.perf_counter()
+    distance_map = DistanceMap(obstacle_map, cmd.goal.point)
+    dt_new = time.perf_counter() - t
+
+    t = time.perf_counter()
+    row, col = obstacle_map.grid.to_grid(cmd.goal.x, cmd.goal.y)
+    d = relax(distance_map, obstacle_map.map, row, col)
+    dt_old = time.perf_counter() - t
+
+    equal = np.array_equal(np.where(d >= distance_map.F * distance_map.INF, np.inf, d / distance_map.F),
+                           distance_map.map)
+    size = 'x'.join(str(s) for s in obstacle_map.map.shape)
+    print(f'{Path(demo).stem:<30} {size:>10} {dt_old*1000:10.1f}ms {dt_new*1000:10.1f}ms',
+          f'{dt_old/dt_new:7.1f}x  {equal}')
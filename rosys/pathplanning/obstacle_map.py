@@ -1,39 +1,69 @@
 from __future__ import annotations
 
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, overload
 
 import cv2
 import numpy as np
 from scipy import ndimage
 
+from ..geometry import Point
 from .area import Area
 from .binary_renderer import BinaryRenderer
 from .grid import Grid
 from .obstacle import Obstacle
 from .robot_renderer import RobotRenderer
 
+MAX_THREADS = os.cpu_count() or 1
+
 
 class ObstacleMap:
+    ARRAY_NAMES = ('grid_size', 'grid_bbox', 'map', 'kernels', 'stack', 'dist_stack', 'max_distances', 'has_obstacles')
+    """names of the arrays created by ``to_arrays()``"""
 
     def __init__(self, grid, map_, robot_renderer, deadline=None) -> None:
         self.grid = grid
         self.map = map_
+        self.kernels: list[np.ndarray] = [
+            robot_renderer.render_kernel(grid.pixel_size, grid.from_3d_grid(0, 0, layer)[2])
+            for layer in range(grid.size[2])
+        ]
         self.stack = np.zeros(grid.size, dtype=bool)
         self.dist_stack = np.zeros(self.stack.shape)
-        for layer in range(grid.size[2]):
-            _, _, yaw = grid.from_3d_grid(0, 0, layer)
-            kernel = robot_renderer.render(grid.pixel_size, yaw).astype(np.uint8)
-            self.stack[:, :, layer] = cv2.dilate(self.map.astype(np.uint8), kernel)
-            self.dist_stack[:, :, layer] = \
-                ndimage.distance_transform_edt(~self.stack[:, :, layer]) * grid.pixel_size
+        map_uint8 = self.map.astype(np.uint8)
+
+        def compute_layer(kernel: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
             if deadline and time.time() > deadline:
                 raise TimeoutError('obstacle map creation took too long')
+            layer = cv2.dilate(map_uint8, kernel).astype(bool)
+            return layer, ndimage.distance_transform_edt(~layer) * grid.pixel_size
+
+        # NOTE: layers with identical kernels (e.g. yaw and yaw + pi for symmetric robots) are only computed once
+        groups = self._group_layers(self.kernels)
+        with ThreadPoolExecutor(max_workers=min(MAX_THREADS, len(groups))) as pool:
+            results = pool.map(compute_layer, [self.kernels[group[0]] for group in groups])
+            for group, (layer, distances) in zip(groups, results):
+                self.stack[:, :, group] = layer[:, :, None]
+                self.dist_stack[:, :, group] = distances[:, :, None]
+
+        # NOTE: upper bounds of the distances in each layer (in pixels), used to limit incremental updates
+        self.max_distances = np.ceil(self.dist_stack.max(axis=(0, 1)) / grid.pixel_size).astype(int)
+        self.has_obstacles = self.stack.any(axis=(0, 1))
 
         # NOTE: when yaw wraps around, map_coordinates should wrap around on axis 2
         self.stack = np.dstack((self.stack, self.stack[:, :, :1]))
         self.dist_stack = np.dstack((self.dist_stack, self.dist_stack[:, :, :1]))
 
+    @staticmethod
+    def _group_layers(kernels: list[np.ndarray]) -> list[list[int]]:
+        """Group the indices of identical kernels."""
+        groups: dict[tuple[tuple[int, ...], bytes], list[int]] = {}
+        for layer, kernel in enumerate(kernels):
+            groups.setdefault((kernel.shape, kernel.tobytes()), []).append(layer)
+        return list(groups.values())
+
     @staticmethod
     def from_list(grid, obstacles, robot_renderer) -> ObstacleMap:
         map_ = np.zeros(grid.size[:2], dtype=bool)
@@ -63,6 +93,123 @@ class ObstacleMap:
                 raise TimeoutError('obstacle map creation took too long')
         return ObstacleMap(grid, binary_renderer.map, robot_renderer, deadline)
 
+    @staticmethod
+    def from_arrays(arrays: dict[str, np.ndarray]) -> ObstacleMap:
+        """Restore an obstacle map from arrays created with ``to_arrays()`` without recomputing any layer."""
+        obstacle_map = ObstacleMap.__new__(ObstacleMap)
+        obstacle_map.grid = Grid(tuple(arrays['grid_size'].tolist()), tuple(arrays['grid_bbox'].tolist()))
+        obstacle_map.map = arrays['map']
+        obstacle_map.kernels = list(arrays['kernels'])
+        obstacle_map.stack = arrays['stack']
+        obstacle_map.dist_stack = arrays['dist_stack']
+        obstacle_map.max_distances = np.array(arrays['max_distances'])
+        obstacle_map.has_obstacles = np.array(arrays['has_obstacles'])
+        return obstacle_map
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        return {
+            'grid_size': np.array(self.grid.size),
+            'grid_bbox': np.array(self.grid.bbox),
+            'map': self.map,
+            'kernels': np.stack(self.kernels),
+            'stack': self.stack,
+            'dist_stack': self.dist_stack,
+            'max_distances': self.max_distances,
+            'has_obstacles': self.has_obstacles,
+        }
+
+    def update(self,
+               areas: list[Area],
+               obstacles: list[Obstacle],
+               outlines: list[list[Point]],
+               deadline: Optional[float] = None) -> Optional[tuple[float, float, float, float]]:
+        """Re-render the region covered by the given outlines and update the affected parts of all layers.
+
+        The outlines should contain the old and new outlines of all obstacles that have been added, removed or moved.
+        Returns the bounding box ``(min_x, min_y, max_x, max_y)`` of the region where the stack has changed or
+        ``None`` if nothing needed to be updated.
+        """
+        points = [p for outline in outlines for p in outline]
+        if not points:
+            return None
+        rows, cols = self.grid.to_grid(np.array([p.x for p in points]), np.array([p.y for p in points]))
+        height, width = self.map.shape
+        r0, r1 = max(int(np.floor(rows.min())) - 1, 0), min(int(rows.max()) + 3, height)
+        c0, c1 = max(int(np.floor(cols.min())) - 1, 0), min(int(cols.max()) + 3, width)
+        if r0 >= r1 or c0 >= c1:
+            return None
+
+        # NOTE: the renderer never touches its last row and column, so we render one more and copy only the region
+        has_areas = any(len(a.outline) > 2 for a in areas)
+        binary_renderer = BinaryRenderer((min(r1 + 1, height) - r0, min(c1 + 1, width) - c0), fill_value=has_areas)
+        for area in areas:
+            binary_renderer.polygon(np.array([self.grid.to_grid(p.x, p.y)[::-1] for p in area.outline]) - [c0, r0],
+                                    False)
+        for obstacle in obstacles:
+            binary_renderer.polygon(np.array([self.grid.to_grid(p.x, p.y)[::-1] for p in obstacle.outline]) - [c0, r0])
+        self.map[r0:r1, c0:c1] = binary_renderer.map[:r1 - r0, :c1 - c0]
+
+        radius = max(kernel.shape[0] for kernel in self.kernels) // 2
+        out_r0, out_r1 = max(r0 - radius, 0), min(r1 + radius, height)
+        out_c0, out_c1 = max(c0 - radius, 0), min(c1 + radius, width)
+        in_r0, in_r1 = max(r0 - 2 * radius, 0), min(r1 + 2 * radius, height)
+        in_c0, in_c1 = max(c0 - 2 * radius, 0), min(c1 + 2 * radius, width)
+        for group in self._group_layers(self.kernels):
+            layer = group[0]
+            dilated = cv2.dilate(self.map[in_r0:in_r1, in_c0:in_c1].astype(np.uint8), self.kernels[layer])
+            self.stack[out_r0:out_r1, out_c0:out_c1, layer] = \
+                dilated[out_r0 - in_r0:out_r1 - in_r0, out_c0 - in_c0:out_c1 - in_c0]
+            self._update_distances(layer, out_r0, out_r1, out_c0, out_c1)
+            for duplicate in group[1:]:
+                self.stack[:, :, duplicate] = self.stack[:, :, layer]
+                self.dist_stack[:, :, duplicate] = self.dist_stack[:, :, layer]
+                self.max_distances[duplicate] = self.max_distances[layer]
+                self.has_obstacles[duplicate] = self.has_obstacles[layer]
+            if deadline and time.time() > deadline:
+                raise TimeoutError('obstacle map update took too long')
+        self.stack[:, :, -1] = self.stack[:, :, 0]
+        self.dist_stack[:, :, -1] = self.dist_stack[:, :, 0]
+
+        min_x, min_y = self.grid.from_grid(out_r0 - 0.5, out_c0 - 0.5)
+        max_x, max_y = self.grid.from_grid(out_r1 - 0.5, out_c1 - 0.5)
+        return min_x, min_y, max_x, max_y
+
+    def _update_distances(self, layer: int, r0: int, r1: int, c0: int, c1: int) -> None:
+        """Update the distance layer after the stack has changed within the given region.
+
+        Pixels further away from the changed region than their previous distance cannot be affected.
+        Within that window the distance transform is computed on an even larger window
+        and only accepted if no obstacle outside of it could be closer.
+        """
+        height, width = self.map.shape
+        margin = self.max_distances[layer] + 1
+        w_r0, w_r1 = max(r0 - margin, 0), min(r1 + margin, height)
+        w_c0, w_c1 = max(c0 - margin, 0), min(c1 + margin, width)
+        e_r0, e_r1 = max(w_r0 - margin, 0), min(w_r1 + margin, height)
+        e_c0, e_c1 = max(w_c0 - margin, 0), min(w_c1 + margin, width)
+        free = ~self.stack[e_r0:e_r1, e_c0:e_c1, layer]
+        if self.has_obstacles[layer] and not free.all() and (e_r0, e_r1, e_c0, e_c1) != (0, height, 0, width):
+            distances = ndimage.distance_transform_edt(free)[w_r0 - e_r0:w_r1 - e_r0, w_c0 - e_c0:w_c1 - e_c0]
+            rows = np.arange(w_r0, w_r1)[:, None]
+            cols = np.arange(w_c0, w_c1)[None, :]
+            border = np.full(distances.shape, np.inf)
+            if e_r0 > 0:
+                border = np.minimum(border, rows - e_r0 + 1)
+            if e_r1 < height:
+                border = np.minimum(border, e_r1 - rows)
+            if e_c0 > 0:
+                border = np.minimum(border, cols - e_c0 + 1)
+            if e_c1 < width:
+                border = np.minimum(border, e_c1 - cols)
+            if (distances <= border).all():
+                self.dist_stack[w_r0:w_r1, w_c0:w_c1, layer] = distances * self.grid.pixel_size
+                self.max_distances[layer] = max(self.max_distances[layer], int(np.ceil(distances.max())))
+                return
+        distances = ndimage.distance_transform_edt(~self.stack[:, :, layer])
+        self.dist_stack[:, :, layer] = distances * self.grid.pixel_size
+        self.max_distances[layer] = int(np.ceil(distances.max()))
+        self.has_obstacles[layer] = self.stack[:, :, layer].any()
+
     def test(self, x, y, yaw):
         row, col, layer = self.grid.to_3d_grid(x, y, yaw)
         return ndimage.map_coordinates(self.stack, [[row], [col], [layer]], order=0)
@@ -95,9 +242,29 @@ class ObstacleMap:
     def test_spline(self, spline, backward=False) -> bool:
         return self.test(*self._create_poses(spline, backward)).any()
 
+    def test_splines(self, splines, backward=False) -> np.ndarray:
+        """Test multiple splines with a single lookup and return a boolean array with one entry per spline."""
+        if not splines:
+            return np.zeros(0, dtype=bool)
+        poses = [self._create_poses(spline, backward) for spline in splines]
+        sizes = np.array([len(x) for x, _, _ in poses])
+        x, y, yaw = (np.concatenate(values) for values in zip(*poses))
+        row, col, layer = self.grid.to_3d_grid(x, y, yaw)
+        collisions = ndimage.map_coordinates(self.stack, [row, col, layer], order=0).astype(bool)
+        result = np.zeros(len(splines), dtype=bool)
+        nonempty = sizes > 0  # NOTE: splines within a single cell have no poses and never collide, like in test_spline
+        if nonempty.any():
+            result[nonempty] = np.logical_or.reduceat(collisions, (np.cumsum(sizes) - sizes)[nonempty])
+        return result
+
     def get_distance(self, x, y, yaw) -> np.ndarray:
         row, col, layer = self.grid.to_3d_grid(x, y, yaw)
         return ndimage.map_coordinates(self.dist_stack, [[row], [col], [layer]], order=0)
 
+    def get_distances(self, x: np.ndarray, y: np.ndarray, yaw: np.ndarray) -> np.ndarray:
+        """Look up the obstacle distances of multiple poses and return them as a one-dimensional array."""
+        row, col, layer = self.grid.to_3d_grid(x, y, yaw)
+        return ndimage.map_coordinates(self.dist_stack, [row, col, layer], order=0)
+
     def get_minimum_spline_distance(self, spline, backward=False) -> float:
         return self.get_distance(*self._create_poses(spline, backward)).min()
@@ -1,9 +1,19 @@
 import asyncio
 import logging
+import math
+import pickle
+import shutil
+import tempfile
 import time
-from copy import copy
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy, deepcopy
+from dataclasses import dataclass, field, fields
 from multiprocessing import Pipe
-from typing import Any
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
 
 from .. import persistence, rosys, run
 from ..driving import PathSegment
@@ -11,8 +21,22 @@ from ..event import Event
 from ..geometry import Point, Pose, Prism, Spline
 from .area import Area
 from .obstacle import Obstacle
-from .planner_process import (PlannerCommand, PlannerGrowMapCommand, PlannerObstacleDistanceCommand, PlannerProcess,
-                              PlannerResponse, PlannerSearchCommand, PlannerTestCommand)
+from .planner_process import (WORLD_COMMANDS, PlannerCommand, PlannerGrowMapCommand, PlannerObstacleDistanceCommand,
+                              PlannerObstacleDistancesCommand, PlannerProcess, PlannerResponse, PlannerSearchCommand,
+                              PlannerTestCommand, PlannerTestSplinesCommand, PlannerWorldUpdateCommand, WorldCommand)
+
+CACHE_PATH = Path('~/.rosys/path_planner').expanduser()
+COALESCING_TOLERANCE = 0.5
+"""Maximum time in seconds a pending identical request may end before the deadline of a new one to still be reused."""
+
+
+@dataclass(slots=True, kw_only=True)
+class PlannerWorker:
+    process: PlannerProcess
+    connection: Connection
+    sender: ThreadPoolExecutor = field(default_factory=lambda: ThreadPoolExecutor(1, 'path planner sender'))
+    pending: set[str] = field(default_factory=set)
+    watched: bool = False
 
 
 class PathPlanner(persistence.PersistentModule):
@@ -20,28 +44,58 @@ class PathPlanner(persistence.PersistentModule):
 
     If given, the algorithm respects the given robot shape as well as a dictionary of accessible areas and a dictionary of obstacles, both of which a backed up and restored automatically.
     The path planner can search paths, check if a spline interferes with obstacles and get the distance of a pose to any obstacle.
+    Obstacle maps and roadmaps are cached on disk (in "~/.rosys/path_planner" by default), so that they do not need to be recomputed after a restart.
+
+    With `num_workers` > 1 several planner processes serve requests concurrently.
+    Each request is dispatched to the worker with the fewest pending requests and identical concurrent requests are only computed once.
+    Obstacle maps and roadmaps are only built by the first worker,
+    which receives all requests for a world it has not built yet.
+    It writes them to the cache (a temporary directory if no cache path is given),
+    from which the other workers memory-map the arrays instead of building them again.
+    Incremental updates after small obstacle changes are not written to the cache and are applied by each worker.
+
+    Areas and obstacles are synchronized with the workers incrementally on AREAS_CHANGED and OBSTACLES_CHANGED,
+    so that requests only need to carry the version of the world they refer to.
+    Therefore these events must be emitted after modifying `areas` or `obstacles`.
+    Commands are written to the workers in the background, so that large updates do not block the event loop.
     """
 
-    def __init__(self, robot_shape: Prism) -> None:
+    def __init__(self, robot_shape: Prism, *, num_workers: int = 1, cache_path: Optional[Path] = CACHE_PATH) -> None:
         super().__init__()
 
         self.log = logging.getLogger('rosys.path_planner')
 
-        self.connection, process_connection = Pipe()
-        self.process = PlannerProcess(process_connection, robot_shape.outline)
-        self.responses: dict[str, Any] = {}
+        if rosys.is_test:
+            cache_path = None
+        self._tmp_cache_path: Optional[Path] = None
+        if num_workers > 1 and cache_path is None:
+            cache_path = self._tmp_cache_path = Path(tempfile.mkdtemp(prefix='rosys_path_planner_'))
+        self.workers: list[PlannerWorker] = []
+        for _ in range(num_workers):
+            connection, process_connection = Pipe()
+            process = PlannerProcess(process_connection, robot_shape.outline,
+                                     cache_path=cache_path, shared_cache=num_workers > 1)
+            self.workers.append(PlannerWorker(process=process, connection=connection))
+        self.futures: dict[str, asyncio.Future] = {}
+        self.coalescable_calls: dict[tuple[Optional[int], bytes], tuple[PlannerCommand, asyncio.Future]] = {}
 
         self.obstacles: dict[str, Obstacle] = {}
         self.areas: dict[str, Area] = {}
+        self.world_version = 0
+        self._built_version: Optional[int] = None
+        self._synced_obstacles: dict[str, Obstacle] = {}
+        self._synced_areas: dict[str, Area] = {}
 
         self.OBSTACLES_CHANGED = Event()
         """the obstacles have changed (argument: dictionary of obstacles)"""
         self.AREAS_CHANGED = Event()
         """the areas have changed (argument: list of areas that have changed, can be None for all areas)"""
 
+        self.OBSTACLES_CHANGED.register(self._handle_obstacles_change)
+        self.AREAS_CHANGED.register(self._handle_areas_change)
+
         rosys.on_startup(self.startup)
         rosys.on_shutdown(self.shutdown)
-        rosys.on_repeat(self.step, 0.1)
 
     def backup(self) -> dict:
         finished_areas = {area_id: copy(area).close() for area_id, area in self.areas.items() if len(area.outline) >= 3}
@@ -57,43 +111,39 @@ class PathPlanner(persistence.PersistentModule):
         self.OBSTACLES_CHANGED.emit(self.obstacles)
 
     def startup(self) -> None:
-        self.process.start()
+        for worker in self.workers:
+            worker.process.start()
 
     async def shutdown(self) -> None:
-        self.log.info('stopping planner process...')
-        self.connection.close()
-        self.process.connection.close()
-        self.process.join(5)
-        if self.process.is_alive():
-            self.process.terminate()
-        else:
-            if self.process.exitcode:
-                self.log.info(f'bad exitcode for process: {self.process.exitcode}')
-        self.log.info(f'teardown of {self.process} completed')
-
-    async def step(self) -> None:
-        try:
-            if self.connection.poll():
-                response = self.connection.recv()
-                assert isinstance(response, PlannerResponse)
-                if time.time() < response.deadline:
-                    self.responses[response.id] = response.content
-        except OSError as e:
-            if 'handle is closed' in str(e):
-                self.log.info('path planner process connection closed')
+        self.log.info('stopping planner processes...')
+        for worker in self.workers:
+            self._unwatch(worker)
+            worker.sender.shutdown(wait=False, cancel_futures=True)
+            worker.connection.close()
+            worker.process.connection.close()
+        for worker in self.workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
             else:
-                raise
+                if worker.process.exitcode:
+                    self.log.info(f'bad exitcode for process: {worker.process.exitcode}')
+            self.log.info(f'teardown of {worker.process} completed')
+        if self._tmp_cache_path is not None:
+            shutil.rmtree(self._tmp_cache_path, ignore_errors=True)
 
     async def grow_map(self, points: list[Point], timeout: float = 3.0) -> None:
-        return await self._call(PlannerGrowMapCommand(
-            points=points,
-            deadline=time.time()+timeout,
+        deadline = time.time() + timeout
+        # NOTE: the other workers load the grown maps from the cache instead of growing them as well
+        await self._call(PlannerGrowMapCommand(points=points, deadline=deadline), worker=self.workers[0])
+        await asyncio.gather(*(
+            self._call(PlannerGrowMapCommand(points=points, deadline=deadline), worker=worker)
+            for worker in self.workers[1:]
         ))
 
     async def search(self, *, start: Pose, goal: Pose, timeout: float = 3.0) -> list[PathSegment]:
         return await self._call(PlannerSearchCommand(
-            areas=list(self.areas.values()),
-            obstacles=list(self.obstacles.values()),
+            world_version=await self._current_world_version(),
             start=start,
             goal=goal,
             deadline=time.time()+timeout,
@@ -101,30 +151,170 @@ class PathPlanner(persistence.PersistentModule):
 
     async def test_spline(self, spline: Spline, timeout: float = 3.0) -> bool:
         return await self._call(PlannerTestCommand(
-            areas=list(self.areas.values()),
-            obstacles=list(self.obstacles.values()),
+            world_version=await self._current_world_version(),
             spline=spline,
             deadline=time.time()+timeout,
         ))
 
+    async def test_splines(self, splines: list[Spline], timeout: float = 3.0) -> np.ndarray:
+        """Test multiple splines at once and return a boolean array indicating which of them collide."""
+        return await self._call(PlannerTestSplinesCommand(
+            world_version=await self._current_world_version(),
+            splines=splines,
+            deadline=time.time()+timeout,
+        ))
+
     async def get_obstacle_distance(self, pose: Pose, timeout: float = 3.0) -> float:
         return await self._call(PlannerObstacleDistanceCommand(
-            areas=list(self.areas.values()),
-            obstacles=list(self.obstacles.values()),
+            world_version=await self._current_world_version(),
             pose=pose,
             deadline=time.time()+timeout,
         ))
 
-    async def _call(self, command: PlannerCommand, check_interval: float = 0.1) -> Any:
+    async def get_obstacle_distances(self, poses: list[Pose], timeout: float = 3.0) -> np.ndarray:
+        """Get the obstacle distances of multiple poses at once."""
+        return await self._call(PlannerObstacleDistancesCommand(
+            world_version=await self._current_world_version(),
+            poses=poses,
+            deadline=time.time()+timeout,
+        ))
+
+    async def _current_world_version(self) -> int:
+        # NOTE: event handlers run in background tasks, so handlers of changes emitted right before need to run first
+        await asyncio.sleep(0)
+        return self.world_version
+
+    def _handle_obstacles_change(self, _: Any) -> None:
+        obstacles = [obstacle for obstacle_id, obstacle in self.obstacles.items()
+                     if self._synced_obstacles.get(obstacle_id) != obstacle]
+        removed_obstacle_ids = [obstacle_id for obstacle_id in self._synced_obstacles
+                                if obstacle_id not in self.obstacles]
+        self._update_world(obstacles=obstacles, removed_obstacle_ids=removed_obstacle_ids)
+
+    def _handle_areas_change(self, changed_areas: Optional[list[Area]]) -> None:
+        if changed_areas is None:
+            areas = [area for area_id, area in self.areas.items() if self._synced_areas.get(area_id) != area]
+            removed_area_ids = [area_id for area_id in self._synced_areas if area_id not in self.areas]
+        else:
+            areas = [area for area in changed_areas if area.id in self.areas]
+            removed_area_ids = [area.id for area in changed_areas
+                                if area.id not in self.areas and area.id in self._synced_areas]
+        self._update_world(areas=areas, removed_area_ids=removed_area_ids)
+
+    def _update_world(self, *,
+                      areas: Optional[list[Area]] = None,
+                      obstacles: Optional[list[Obstacle]] = None,
+                      removed_area_ids: Optional[list[str]] = None,
+                      removed_obstacle_ids: Optional[list[str]] = None) -> None:
+        """Send changed areas and obstacles to all workers and increment the world version.
+
+        Copies of the sent objects are kept to detect which of them have been modified in place.
+        """
+        areas = areas or []
+        obstacles = obstacles or []
+        removed_area_ids = removed_area_ids or []
+        removed_obstacle_ids = removed_obstacle_ids or []
+        if not areas and not obstacles and not removed_area_ids and not removed_obstacle_ids:
+            return
+        self.world_version += 1
+        for area_id in removed_area_ids:
+            del self._synced_areas[area_id]
+        for obstacle_id in removed_obstacle_ids:
+            del self._synced_obstacles[obstacle_id]
+        self._synced_areas.update({area.id: deepcopy(area) for area in areas})
+        self._synced_obstacles.update({obstacle.id: deepcopy(obstacle) for obstacle in obstacles})
+        command = PlannerWorldUpdateCommand(
+            version=self.world_version,
+            areas=[self._synced_areas[area.id] for area in areas],
+            obstacles=[self._synced_obstacles[obstacle.id] for obstacle in obstacles],
+            removed_area_ids=removed_area_ids,
+            removed_obstacle_ids=removed_obstacle_ids,
+            deadline=math.inf,
+        )
+        for worker in self.workers:
+            self._write(worker, command)
+
+    async def _call(self, command: PlannerCommand, *, worker: Optional[PlannerWorker] = None) -> Any:
+        key = (None if worker is None else self.workers.index(worker), _payload(command))
+        pending_call = self.coalescable_calls.get(key)
+        # NOTE: a pending call may time out up to COALESCING_TOLERANCE seconds before the deadline of the new command
+        if pending_call is not None and not pending_call[1].done() and \
+                pending_call[0].deadline >= command.deadline - COALESCING_TOLERANCE:
+            future = pending_call[1]
+        else:
+            target = worker or self._select_worker(command)
+            future = self._send(command, target)
+            self.coalescable_calls[key] = (command, future)
+            future.add_done_callback(lambda _: self._release(key, future))
+            if target is self.workers[0] and isinstance(command, WORLD_COMMANDS):
+                future.add_done_callback(lambda _: self._mark_built(command, future))
         with run.cpu():
-            self.connection.send(command)
-            while command.id not in self.responses:
-                if time.time() > command.deadline:
-                    raise TimeoutError(f'process call {command.id} did not respond in time')
-                if rosys.is_test:
-                    await self.step()  # NOTE: otherwise step() is not called while awaiting response
-                await asyncio.sleep(check_interval)
-            result = self.responses.pop(command.id)
+            try:
+                # NOTE: shield the future, because it might be shared with coalesced calls
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=command.deadline - time.time())
+            except asyncio.TimeoutError:
+                raise TimeoutError(f'process call {command.id} did not respond in time') from None
             if isinstance(result, Exception):
                 raise result
             return result
+
+    def _select_worker(self, command: PlannerCommand) -> PlannerWorker:
+        """Select the first worker if the maps for the world of a command are not built yet, else the least busy one."""
+        if isinstance(command, WORLD_COMMANDS) and command.world_version != self._built_version:
+            return self.workers[0]
+        return min(self.workers, key=lambda w: len(w.pending))
+
+    def _mark_built(self, command: WorldCommand, future: asyncio.Future) -> None:
+        if future.cancelled() or isinstance(future.result(), TimeoutError):
+            return
+        if self._built_version is None or command.world_version > self._built_version:
+            self._built_version = command.world_version
+
+    def _send(self, command: PlannerCommand, worker: PlannerWorker) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if not worker.watched:
+            loop.add_reader(worker.connection.fileno(), self._receive, worker)
+            worker.watched = True
+        future = loop.create_future()
+        self.futures[command.id] = future
+        worker.pending.add(command.id)
+        self._write(worker, command)
+        return future
+
+    def _write(self, worker: PlannerWorker, command: PlannerCommand) -> None:
+        # NOTE: a single sender thread per worker keeps the order of world updates and requests
+        worker.sender.submit(worker.connection.send, command)
+
+    def _receive(self, worker: PlannerWorker) -> None:
+        """Resolve the futures of all responses that are available on the worker's connection."""
+        try:
+            while worker.connection.poll():
+                response = worker.connection.recv()
+                assert isinstance(response, PlannerResponse)
+                worker.pending.discard(response.id)
+                future = self.futures.pop(response.id, None)
+                if future is None or future.done():
+                    continue
+                if time.time() < response.deadline:
+                    future.set_result(response.content)
+                else:
+                    future.set_result(TimeoutError(f'process call {response.id} did not respond in time'))
+        except (EOFError, OSError):
+            self.log.info('path planner process connection closed')
+            self._unwatch(worker)
+
+    def _unwatch(self, worker: PlannerWorker) -> None:
+        if worker.watched and not worker.connection.closed:
+            asyncio.get_running_loop().remove_reader(worker.connection.fileno())
+        worker.watched = False
+
+    def _release(self, key: tuple[Optional[int], bytes], future: asyncio.Future) -> None:
+        pending_call = self.coalescable_calls.get(key)
+        if pending_call is not None and pending_call[1] is future:
+            del self.coalescable_calls[key]
+
+
+def _payload(command: PlannerCommand) -> bytes:
+    """Serialize everything but ID and deadline of a command to detect identical requests."""
+    return pickle.dumps((type(command).__name__, [getattr(command, f.name) for f in fields(command)
+                                                  if f.name not in {'id', 'deadline'}]))
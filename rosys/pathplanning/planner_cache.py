@@ -0,0 +1,86 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Collection, Optional
+
+import numpy as np
+
+
+class PlannerCache:
+    """Persistent cache for arrays computed by the path planner.
+
+    Each entry is a directory named after its key containing one `.npy` file per array.
+    Entries are written in a background thread and loaded as copy-on-write memory maps,
+    so large arrays are only read from disk when they are actually accessed.
+    Only the most recently written entries are kept.
+    Each entry is written to a temporary directory of its own and moved into place when complete,
+    so several processes can write the same entry concurrently.
+    """
+
+    def __init__(self, path: Path, *, max_entries: int = 3) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.log = logging.getLogger('rosys.pathplanning.PlannerCache')
+        self._thread: Optional[threading.Thread] = None
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, '_thread': None}
+
+    def load(self, key: str, names: Collection[str]) -> Optional[dict[str, np.ndarray]]:
+        """Load the arrays of an entry or return None if the entry does not exist or is incomplete."""
+        directory = self.path / key
+        if not directory.is_dir():
+            return None
+        try:
+            arrays = {name: np.load(directory / f'{name}.npy', mmap_mode='c') for name in names}
+        except FileNotFoundError:
+            self.log.warning(f'ignoring incomplete planner cache "{directory}"')
+            return None
+        except (OSError, ValueError):
+            self.log.exception(f'failed to load planner cache "{directory}"')
+            return None
+        os.utime(directory)
+        return arrays
+
+    def save(self, key: str, arrays: dict[str, np.ndarray]) -> None:
+        """Copy the arrays and write them to disk in a background thread, replacing any existing entry."""
+        snapshot = {name: np.array(array) for name, array in arrays.items()}
+        self.join()
+        self._thread = threading.Thread(target=self._write, args=(key, snapshot), daemon=True)
+        self._thread.start()
+
+    def join(self) -> None:
+        """Wait for the current write operation to finish."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _write(self, key: str, arrays: dict[str, np.ndarray]) -> None:
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_directory = Path(tempfile.mkdtemp(prefix=f'.{key}.', dir=self.path))
+        except OSError:
+            self.log.exception(f'failed to write planner cache "{key}"')
+            return
+        try:
+            for name, array in arrays.items():
+                np.save(tmp_directory / f'{name}.npy', array)
+            shutil.rmtree(self.path / key, ignore_errors=True)
+            try:
+                os.replace(tmp_directory, self.path / key)
+            except OSError:
+                if not (self.path / key).is_dir():
+                    raise
+                # NOTE: another process has written the same entry in the meantime
+                shutil.rmtree(tmp_directory, ignore_errors=True)
+        except OSError:
+            self.log.exception(f'failed to write planner cache "{key}"')
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            return
+        entries = sorted((d for d in self.path.iterdir() if d.is_dir() and not d.name.startswith('.')),
+                         key=lambda d: d.stat().st_mtime, reverse=True)
+        for directory in entries[self.max_entries:]:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -1,10 +1,15 @@
 import abc
 import logging
+import time
 import uuid
+from copy import copy
 from dataclasses import dataclass, field
 from multiprocessing import Process
 from multiprocessing.connection import Connection
-from typing import Any
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
 
 from ..geometry import Point, Pose, Spline
 from .area import Area
@@ -22,11 +27,22 @@ class PlannerCommand(abc.ABC):
 
 
 @dataclass
-class PlannerSearchCommand(PlannerCommand):
+class PlannerWorldUpdateCommand(PlannerCommand):
+    version: int
     areas: list[Area]
     obstacles: list[Obstacle]
+    removed_area_ids: list[str]
+    removed_obstacle_ids: list[str]
+
+
+@dataclass
+class PlannerSearchCommand(PlannerCommand):
     start: Pose
     goal: Pose
+    areas: list[Area] = field(default_factory=list)
+    obstacles: list[Obstacle] = field(default_factory=list)
+    world_version: Optional[int] = None
+    """if given, areas and obstacles are taken from the world synchronized via PlannerWorldUpdateCommand"""
 
 
 @dataclass
@@ -36,18 +52,44 @@ class PlannerGrowMapCommand(PlannerCommand):
 
 @dataclass
 class PlannerTestCommand(PlannerCommand):
-    areas: list[Area]
-    obstacles: list[Obstacle]
     spline: Spline
     backward: bool = False
+    areas: list[Area] = field(default_factory=list)
+    obstacles: list[Obstacle] = field(default_factory=list)
+    world_version: Optional[int] = None
 
 
 @dataclass
 class PlannerObstacleDistanceCommand(PlannerCommand):
-    areas: list[Area]
-    obstacles: list[Obstacle]
     pose: Pose
     backward: bool = False
+    areas: list[Area] = field(default_factory=list)
+    obstacles: list[Obstacle] = field(default_factory=list)
+    world_version: Optional[int] = None
+
+
+@dataclass
+class PlannerTestSplinesCommand(PlannerCommand):
+    splines: list[Spline]
+    backward: bool = False
+    areas: list[Area] = field(default_factory=list)
+    obstacles: list[Obstacle] = field(default_factory=list)
+    world_version: Optional[int] = None
+
+
+@dataclass
+class PlannerObstacleDistancesCommand(PlannerCommand):
+    poses: list[Pose]
+    backward: bool = False
+    areas: list[Area] = field(default_factory=list)
+    obstacles: list[Obstacle] = field(default_factory=list)
+    world_version: Optional[int] = None
+
+
+WORLD_COMMANDS = (PlannerSearchCommand, PlannerTestCommand, PlannerObstacleDistanceCommand,
+                  PlannerTestSplinesCommand, PlannerObstacleDistancesCommand)
+WorldCommand = Union[PlannerSearchCommand, PlannerTestCommand, PlannerObstacleDistanceCommand,
+                     PlannerTestSplinesCommand, PlannerObstacleDistancesCommand]
 
 
 @dataclass
@@ -59,11 +101,15 @@ class PlannerResponse:
 
 class PlannerProcess(Process):
 
-    def __init__(self, connection: Connection, robot_outline: list[tuple[float, float]]) -> None:
+    def __init__(self, connection: Connection, robot_outline: list[tuple[float, float]], *,
+                 cache_path: Optional[Path] = None, shared_cache: bool = False) -> None:
         super().__init__()
         self.log = logging.getLogger('rosys.pathplanning.PlannerProcess')
         self.connection = connection
-        self.planner = DelaunayPlanner(robot_outline)
+        self.planner = DelaunayPlanner(robot_outline, cache_path=cache_path, shared_cache=shared_cache)
+        self.areas: dict[str, Area] = {}
+        self.obstacles: dict[str, Obstacle] = {}
+        self.world_version = 0
 
     def run(self) -> None:
         while True:
@@ -72,7 +118,15 @@ class PlannerProcess(Process):
             except (EOFError, KeyboardInterrupt):
                 self.log.info('PlannerProcess stopped')
                 return
+            if isinstance(cmd, PlannerWorldUpdateCommand):
+                self.update_world(cmd)
+                continue
+            if time.time() > cmd.deadline:
+                self.respond(cmd, TimeoutError(f'command {cmd.id} expired before it could be computed'))
+                continue
             try:
+                if isinstance(cmd, WORLD_COMMANDS):
+                    cmd = self.resolve_world(cmd)
                 if isinstance(cmd, PlannerSearchCommand):
                     self.log.info(cmd)
                     additional_points = [cmd.start.point, cmd.goal.point]
@@ -89,9 +143,40 @@ class PlannerProcess(Process):
                     self.planner.update_map(cmd.areas, cmd.obstacles, [cmd.pose.point], cmd.deadline)
                     assert self.planner.obstacle_map is not None
                     self.respond(cmd, self.planner.obstacle_map.get_distance(cmd.pose.x, cmd.pose.y, cmd.pose.yaw))
+                if isinstance(cmd, PlannerTestSplinesCommand):
+                    points = [point for spline in cmd.splines for point in (spline.start, spline.end)]
+                    self.planner.update_map(cmd.areas, cmd.obstacles, points, cmd.deadline)
+                    assert self.planner.obstacle_map is not None
+                    self.respond(cmd, self.planner.obstacle_map.test_splines(cmd.splines, cmd.backward))
+                if isinstance(cmd, PlannerObstacleDistancesCommand):
+                    self.planner.update_map(cmd.areas, cmd.obstacles, [pose.point for pose in cmd.poses], cmd.deadline)
+                    assert self.planner.obstacle_map is not None
+                    x, y, yaw = np.array([(pose.x, pose.y, pose.yaw) for pose in cmd.poses]).reshape(-1, 3).T
+                    self.respond(cmd, self.planner.obstacle_map.get_distances(x, y, yaw))
             except Exception as e:
                 self.log.exception(f'failed to compute cmd "{cmd}"')
                 self.respond(cmd, e)
 
+    def update_world(self, cmd: PlannerWorldUpdateCommand) -> None:
+        for area_id in cmd.removed_area_ids:
+            self.areas.pop(area_id, None)
+        for obstacle_id in cmd.removed_obstacle_ids:
+            self.obstacles.pop(obstacle_id, None)
+        self.areas.update({area.id: area for area in cmd.areas})
+        self.obstacles.update({obstacle.id: obstacle for obstacle in cmd.obstacles})
+        self.world_version = cmd.version
+
+    def resolve_world(self, cmd: WorldCommand) -> WorldCommand:
+        """Fill in the synchronized areas and obstacles if the command refers to a world version."""
+        if cmd.world_version is None:
+            return cmd
+        if cmd.world_version != self.world_version:
+            raise RuntimeError(f'world version {cmd.world_version} does not match {self.world_version}')
+        resolved = copy(cmd)
+        resolved.areas = list(self.areas.values())
+        resolved.obstacles = list(self.obstacles.values())
+        resolved.world_version = None
+        return resolved
+
     def respond(self, cmd: PlannerCommand, content: Any) -> None:
         self.connection.send(PlannerResponse(cmd.id, cmd.deadline, content))
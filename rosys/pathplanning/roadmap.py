@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(slots=True, kw_only=True)
+class Roadmap:
+    """Directed graph with integer node IDs stored in compressed sparse row (CSR) format.
+
+    The outgoing edges of node ``u`` are stored at ``indptr[u]:indptr[u+1]`` in ``indices``, ``weights`` and ``backward``.
+    Node positions ``x`` and ``y`` are used for the A* heuristic.
+    """
+    x: np.ndarray
+    y: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    backward: np.ndarray
+
+    @staticmethod
+    def from_edges(x: np.ndarray,
+                   y: np.ndarray,
+                   sources: np.ndarray,
+                   targets: np.ndarray,
+                   weights: np.ndarray,
+                   backward: np.ndarray) -> Roadmap:
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(len(x) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(x)), out=indptr[1:])
+        return Roadmap(
+            x=np.asarray(x, dtype=float),
+            y=np.asarray(y, dtype=float),
+            indptr=indptr,
+            indices=np.asarray(targets, dtype=np.int64)[order],
+            weights=np.asarray(weights, dtype=float)[order],
+            backward=np.asarray(backward, dtype=bool)[order],
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def sources(self) -> np.ndarray:
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    def find_edge(self, source: int, target: int) -> int:
+        """Return the index of the edge from source to target or -1 if there is no such edge."""
+        start, end = self.indptr[source], self.indptr[source + 1]
+        i = start + np.searchsorted(self.indices[start:end], target)
+        return int(i) if i < end and self.indices[i] == target else -1
+
+    def shortest_paths(self, sources: list[int], targets: list[int]) -> dict[tuple[int, int], list[int]]:
+        """Find the shortest paths from all sources to all targets.
+
+        For each source an A* search with an Euclidean heuristic towards the closest target runs until all targets are
+        reached, so all source-target combinations are solved with one search per source.
+        Returns the node sequence for each pair of source and target that is connected.
+        """
+        if not sources or not targets:
+            return {}
+        target_x = self.x[targets]
+        target_y = self.y[targets]
+        heuristic = np.min(np.hypot(self.x[:, None] - target_x, self.y[:, None] - target_y), axis=1).tolist()
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        weights = self.weights.tolist()
+        paths: dict[tuple[int, int], list[int]] = {}
+        for source in dict.fromkeys(sources):
+            distances = {source: 0.0}
+            parents = {source: source}
+            closed: set[int] = set()
+            remaining = set(targets)
+            queue = [(heuristic[source], 0.0, source)]
+            while queue and remaining:
+                _, distance, node = heapq.heappop(queue)
+                if node in closed:
+                    continue
+                closed.add(node)
+                remaining.discard(node)
+                for i in range(indptr[node], indptr[node + 1]):
+                    neighbor = indices[i]
+                    new_distance = distance + weights[i]
+                    if neighbor not in closed and new_distance < distances.get(neighbor, np.inf):
+                        distances[neighbor] = new_distance
+                        parents[neighbor] = node
+                        heapq.heappush(queue, (new_distance + heuristic[neighbor], new_distance, neighbor))
+            for target in targets:
+                if target in closed:
+                    path = [target]
+                    while path[-1] != source:
+                        path.append(parents[path[-1]])
+                    paths[(source, target)] = path[::-1]
+        return paths
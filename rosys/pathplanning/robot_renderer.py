@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import functools
+
 import numpy as np
 
 from .binary_renderer import BinaryRenderer
@@ -31,3 +33,14 @@ class RobotRenderer:
         renderer.map.fill(False)
         renderer.polygon(self.rendered_outline)
         return renderer.map
+
+    def render_kernel(self, pixel_size, yaw=0) -> np.ndarray:
+        """Render the robot as a read-only uint8 kernel for dilation, cached by outline, pixel size and yaw."""
+        return _render_kernel(tuple(tuple(float(v) for v in point) for point in self.outline), pixel_size, yaw)
+
+
+@functools.lru_cache(maxsize=1000)
+def _render_kernel(outline: tuple[tuple[float, ...], ...], pixel_size: float, yaw: float) -> np.ndarray:
+    kernel = RobotRenderer(outline).render(pixel_size, yaw).astype(np.uint8)
+    kernel.setflags(write=False)
+    return kernel
@@ -4,11 +4,13 @@ from .camera import CalibratableCamera, Camera, ConfigurableCamera, Transformabl
 from .camera_objects_ import CameraObjects as camera_objects
 from .camera_projector import CameraProjector
 from .camera_provider import CameraProvider
-from .detections import BoxDetection, Detection, Detections, PointDetection
+from .detections import BoxDetection, Detection, DetectionArray, Detections, PointDetection
 from .detector import Autoupload, Detector
 from .detector_hardware import DetectorHardware
 from .detector_simulation import DetectorSimulation, SimulatedObject
 from .image import Image, ImageSize
+from .image_archive import ImageArchive
+from .image_store import ImageMemoryBudget, ImageStore, image_memory_budget
 from .mjpeg_camera import MjpegCamera, MjpegCameraProvider
 from .multi_camera_provider import MultiCameraProvider
 from .rtsp_camera import RtspCamera, RtspCameraProvider
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import logging
 from dataclasses import dataclass, field
 from typing import Optional, overload
@@ -36,8 +37,26 @@ class Extrinsics:
     translation: list[float] = field(default_factory=lambda: [0.0, 0.0, 1.0])
 
 
+@dataclass(slots=True, kw_only=True)
+class Projection:
+    """Arrays derived from a calibration, which are needed for projecting points."""
+    R: np.ndarray
+    rvec: np.ndarray
+    """Rodrigues vector of the world-to-camera rotation"""
+    t: np.ndarray
+    """world-to-camera translation"""
+    translation: np.ndarray
+    K: np.ndarray
+    D: np.ndarray
+
+
 @dataclass(slots=True, kw_only=True)
 class Calibration:
+    """Camera calibration consisting of intrinsics and extrinsics.
+
+    The arrays needed for projection are computed lazily and cached by the calibration values,
+    so they are recomputed automatically whenever the intrinsics or extrinsics change (even in place).
+    """
     intrinsics: Intrinsics
     extrinsics: Extrinsics = field(default_factory=Extrinsics)
 
@@ -47,7 +66,26 @@ class Calibration:
 
     @property
     def rotation_array(self) -> np.ndarray:
-        return np.dot(self.extrinsics.rotation.R, self.intrinsics.rotation.R)
+        return self.projection.R
+
+    @property
+    def projection(self) -> Projection:
+        return _compute_projection(_freeze(self.extrinsics.rotation.R),
+                                   _freeze(self.intrinsics.rotation.R),
+                                   tuple(self.extrinsics.translation),
+                                   _freeze(self.intrinsics.matrix),
+                                   tuple(self.intrinsics.distortion))
+
+    @property
+    def undistortion_maps(self) -> tuple[np.ndarray, np.ndarray]:
+        """Maps for undistorting images of this camera with `cv2.remap`."""
+        return _compute_undistortion_maps(_freeze(self.intrinsics.matrix),
+                                          tuple(self.intrinsics.distortion),
+                                          self.intrinsics.size.tuple)
+
+    def undistort_image(self, image: np.ndarray) -> np.ndarray:
+        map1, map2 = self.undistortion_maps
+        return cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
 
     @overload
     def project_to_image(self, world_coordinates: Point3d) -> Optional[Point]: ...
@@ -63,13 +101,9 @@ class Calibration:
                 return None
             return Point(x=image_array[0, 0], y=image_array[0, 1])  # pylint: disable=unsubscriptable-object
 
-        R = self.rotation_array
-        Rod = cv2.Rodrigues(R.T)[0]
-        t = -R.T @ self.extrinsics.translation
-        K = np.array(self.intrinsics.matrix)
-        D = np.array(self.intrinsics.distortion, dtype=float)
-        image_array, _ = cv2.projectPoints(world_coordinates, Rod, t, K, D)
-        local_coordinates = (world_coordinates - np.array(self.extrinsics.translation)) @ R
+        projection = self.projection
+        image_array, _ = cv2.projectPoints(world_coordinates, projection.rvec, projection.t, projection.K, projection.D)
+        local_coordinates = (world_coordinates - projection.translation) @ projection.R
         image_array[local_coordinates[:, 2] < 0, :] = np.nan
         return image_array.reshape(-1, 2)
 
@@ -87,14 +121,12 @@ class Calibration:
                 return None
             return Point3d(x=world_points[0, 0], y=world_points[0, 1], z=world_points[0, 2])  # pylint: disable=unsubscriptable-object
 
-        K = np.array(self.intrinsics.matrix)
-        D = np.array(self.intrinsics.distortion)
-        image_coordinates_ = cv2.undistortPoints(image_coordinates.astype(np.float32), K, D).reshape(-1, 2)
-        image_coordinates__ = cv2.convertPointsToHomogeneous(image_coordinates_).reshape(-1, 3)
-        objPoints = image_coordinates__ @ self.rotation_array.T
-        Z = self.extrinsics.translation[-1]
-        t = np.array(self.extrinsics.translation)
-        world_points = t.T - objPoints * (Z - target_height) / objPoints[:, 2:]
+        projection = self.projection
+        image_coordinates_ = cv2.undistortPoints(image_coordinates.astype(np.float32), projection.K, projection.D)
+        image_coordinates__ = cv2.convertPointsToHomogeneous(image_coordinates_.reshape(-1, 2)).reshape(-1, 3)
+        objPoints = image_coordinates__ @ projection.R.T
+        Z = projection.translation[-1]
+        world_points = projection.translation - objPoints * (Z - target_height) / objPoints[:, 2:]
 
         reprojection = self.project_to_image(world_points)
         sign = objPoints[:, -1] * np.sign(Z)
@@ -120,3 +152,36 @@ class Calibration:
         extrinsics = Extrinsics(rotation=rotation, translation=translation)
 
         return Calibration(intrinsics=intrinsics, extrinsics=extrinsics)
+
+
+def _freeze(matrix: list[list[float]]) -> tuple[tuple[float, ...], ...]:
+    return tuple(tuple(row) for row in matrix)
+
+
+@functools.lru_cache(maxsize=100)
+def _compute_projection(extrinsic_rotation: tuple[tuple[float, ...], ...],
+                        intrinsic_rotation: tuple[tuple[float, ...], ...],
+                        translation: tuple[float, ...],
+                        matrix: tuple[tuple[float, ...], ...],
+                        distortion: tuple[float, ...]) -> Projection:
+    R = np.dot(extrinsic_rotation, intrinsic_rotation)
+    translation_array = np.array(translation, dtype=float)
+    projection = Projection(
+        R=R,
+        rvec=cv2.Rodrigues(R.T)[0],
+        t=-R.T @ translation_array,
+        translation=translation_array,
+        K=np.array(matrix, dtype=float),
+        D=np.array(distortion, dtype=float),
+    )
+    for array in (projection.R, projection.rvec, projection.t, projection.translation, projection.K, projection.D):
+        array.setflags(write=False)  # NOTE: the arrays are shared between all calibrations with the same values
+    return projection
+
+
+@functools.lru_cache(maxsize=10)
+def _compute_undistortion_maps(matrix: tuple[tuple[float, ...], ...],
+                               distortion: tuple[float, ...],
+                               size: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    K = np.array(matrix, dtype=float)
+    return cv2.initUndistortRectifyMap(K, np.array(distortion, dtype=float), None, K, size, cv2.CV_16SC2)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare the projection throughput of Calibration with the former implementation recomputing all arrays per call.
+
+Usage: python3 calibration_benchmark.py [number_of_points]
+
+Points are projected in one batch as well as one by one (like DetectorSimulation does per object).
+"""
+import sys
+import time
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+
+from rosys.geometry import Point, Point3d
+from rosys.vision.calibration import Calibration, Intrinsics
+
+NUM_POINTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+NUM_SINGLE_POINTS = min(NUM_POINTS, 10_000)
+
+
+def legacy_project_to_image(calibration: Calibration, world_coordinates: np.ndarray) -> np.ndarray:
+    """Former implementation of Calibration.project_to_image for arrays."""
+    R = np.dot(calibration.extrinsics.rotation.R, calibration.intrinsics.rotation.R)
+    Rod = cv2.Rodrigues(R.T)[0]
+    t = -R.T @ calibration.extrinsics.translation
+    K = np.array(calibration.intrinsics.matrix)
+    D = np.array(calibration.intrinsics.distortion, dtype=float)
+    image_array, _ = cv2.projectPoints(world_coordinates, Rod, t, K, D)
+    local_coordinates = (world_coordinates - np.array(calibration.extrinsics.translation)) @ R
+    image_array[local_coordinates[:, 2] < 0, :] = np.nan
+    return image_array.reshape(-1, 2)
+
+
+def legacy_project_from_image(calibration: Calibration, image_coordinates: np.ndarray) -> np.ndarray:
+    """Former implementation of Calibration.project_from_image for arrays and a target height of zero."""
+    K = np.array(calibration.intrinsics.matrix)
+    D = np.array(calibration.intrinsics.distortion)
+    image_coordinates_ = cv2.undistortPoints(image_coordinates.astype(np.float32), K, D).reshape(-1, 2)
+    image_coordinates__ = cv2.convertPointsToHomogeneous(image_coordinates_).reshape(-1, 3)
+    objPoints = image_coordinates__ @ np.dot(calibration.extrinsics.rotation.R, calibration.intrinsics.rotation.R).T
+    Z = calibration.extrinsics.translation[-1]
+    t = np.array(calibration.extrinsics.translation)
+    world_points = t.T - objPoints * Z / objPoints[:, 2:]
+    reprojection = legacy_project_to_image(calibration, world_points)
+    sign = objPoints[:, -1] * np.sign(Z)
+    distance = np.linalg.norm(reprojection - image_coordinates, axis=1)
+    world_points[np.logical_not(np.logical_and(sign < 0, distance < 2)), :] = np.nan
+    return world_points
+
+
+def measure(name: str, count: int, function: Callable[[], Any]) -> Any:
+    t = time.perf_counter()
+    result = function()
+    dt = time.perf_counter() - t
+    print(f'  {name:<12} {dt * 1000:8.1f} ms, {count / dt:12,.0f} points/s')
+    return result
+
+
+calibration = Calibration(intrinsics=Intrinsics.create_default(1920, 1080, focal_length=1000))
+calibration.intrinsics.distortion = [0.1, -0.05, 0.001, 0.001, 0.01]
+calibration.extrinsics.translation = [0.1, 0.2, 3.0]
+
+rng = np.random.default_rng(0)
+world_points = np.column_stack((rng.uniform(-2, 2, NUM_POINTS), rng.uniform(-2, 2, NUM_POINTS), np.zeros(NUM_POINTS)))
+image_points = calibration.project_to_image(world_points)
+single_world_points = [Point3d(x=x, y=y, z=z) for x, y, z in world_points[:NUM_SINGLE_POINTS]]
+single_image_points = [Point(x=x, y=y) for x, y in image_points[:NUM_SINGLE_POINTS]]
+
+print(f'project_to_image ({NUM_POINTS} points in one batch)')
+legacy = measure('legacy', NUM_POINTS, lambda: legacy_project_to_image(calibration, world_points))
+cached = measure('cached', NUM_POINTS, lambda: calibration.project_to_image(world_points))
+assert np.allclose(legacy, cached, equal_nan=True)
+
+print(f'project_from_image ({NUM_POINTS} points in one batch)')
+legacy = measure('legacy', NUM_POINTS, lambda: legacy_project_from_image(calibration, image_points))
+cached = measure('cached', NUM_POINTS, lambda: calibration.project_from_image(image_points))
+assert np.allclose(legacy, cached, equal_nan=True)
+
+print(f'project_to_image ({NUM_SINGLE_POINTS} points one by one)')
+measure('legacy', NUM_SINGLE_POINTS,
+        lambda: [legacy_project_to_image(calibration, np.array([p.tuple])) for p in single_world_points])
+measure('cached', NUM_SINGLE_POINTS, lambda: [calibration.project_to_image(p) for p in single_world_points])
+
+print(f'project_from_image ({NUM_SINGLE_POINTS} points one by one)')
+measure('legacy', NUM_SINGLE_POINTS,
+        lambda: [legacy_project_from_image(calibration, np.array([p.tuple])) for p in single_image_points])
+measure('cached', NUM_SINGLE_POINTS, lambda: [calibration.project_from_image(p) for p in single_image_points])
@@ -2,14 +2,15 @@ from __future__ import annotations
 
 import abc
 import asyncio
-from collections import deque
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Optional
 
 from ... import rosys
 from ...event import Event
 from ..image import Image
+from ..image_archive import ImageArchive
 from ..image_route import create_image_route
+from ..image_store import ImageStore
 
 
 class Camera(abc.ABC):
@@ -23,12 +24,13 @@ class Camera(abc.ABC):
                  streaming: bool = True,
                  image_grab_interval: float = 0.1,
                  base_path_overwrite: Optional[str] = None,
+                 image_archive: Optional[ImageArchive] = None,
                  **kwargs) -> None:
         super().__init__(**kwargs)
         self.id: str = id
         self.name = name or self.id
         self.connect_after_init = connect_after_init
-        self.images: deque[Image] = deque(maxlen=self.MAX_IMAGES)
+        self.images: ImageStore = ImageStore(maxlen=self.MAX_IMAGES, camera_id=id, archive=image_archive)
         self.streaming: bool = streaming
         self.base_path: str = f'images/{base_path_overwrite or id}'
 
@@ -95,11 +97,11 @@ class Camera(abc.ABC):
 
     @property
     def latest_captured_image(self) -> Optional[Image]:
-        return next((i for i in reversed(self.captured_images) if i.data), None)
+        return self.images.latest_captured
 
     @property
     def latest_detected_image(self) -> Optional[Image]:
-        return next((i for i in reversed(self.captured_images) if i.detections), None)
+        return self.images.latest_detected
 
     def get_recent_images(self, *, current_time: Optional[float] = None, timespan: float = 10.0) -> list[Image]:
         """Returns all images that were captured. Latest images are at the end of the list.
@@ -109,7 +111,15 @@ class Camera(abc.ABC):
         """
         if current_time is None:
             current_time = rosys.time()
-        return [i for i in self.captured_images if i.time > current_time - timespan]
+        images = [i for i in self.images.since(current_time - timespan) if i.data]
+        if self.images.archive is not None:
+            # NOTE: images which left the ring buffer or have been evicted are read back from the archive
+            archived = self.images.archive.get_images(self.id, current_time - timespan)
+            if archived:
+                by_time = {i.time: i for i in archived}
+                by_time.update({i.time: i for i in images})
+                images = [by_time[t] for t in sorted(by_time)]
+        return images
 
     def _add_image(self, image: Image) -> None:
         self.images.append(image)
@@ -1,4 +1,5 @@
 import abc
+import heapq
 from typing import Generic, Optional, TypeVar
 
 from .. import rosys
@@ -48,7 +49,7 @@ class CameraProvider(Generic[T], rosys.persistence.PersistentModule, metaclass=a
 
     @property
     def images(self) -> list[Image]:
-        return sorted((i for c in self.cameras.values() for i in c.images), key=lambda i: i.time)
+        return list(heapq.merge(*(c.images for c in self.cameras.values()), key=lambda i: i.time))
 
     def add_camera(self, camera: T) -> None:
         self._cameras[camera.id] = camera
@@ -70,5 +71,4 @@ class CameraProvider(Generic[T], rosys.persistence.PersistentModule, metaclass=a
             if max_age_seconds is None:
                 camera.images.clear()
             else:
-                while camera.images and camera.images[0].time < rosys.time() - max_age_seconds:
-                    del camera.images[0]
+                camera.images.prune(rosys.time() - max_age_seconds)
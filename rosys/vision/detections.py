@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Optional, Sequence
 
 import numpy as np
 
 from ..geometry import Point
 
+if TYPE_CHECKING:
+    from .calibration import Calibration
+
 
 @dataclass(slots=True, kw_only=True)
 class Detection:
@@ -141,3 +145,115 @@ class Detections:
 
     def to_dict(self) -> dict:
         return asdict(self)
+
+    @property
+    def box_array(self) -> DetectionArray:
+        """Columnar view of the box detections."""
+        return DetectionArray.from_detections(self.boxes)
+
+    @property
+    def point_array(self) -> DetectionArray:
+        """Columnar view of the point detections."""
+        return DetectionArray.from_detections(self.points)
+
+
+@dataclass(slots=True, kw_only=True)
+class DetectionArray:
+    """Columnar representation of box or point detections for vectorized processing.
+
+    Points have a width and height of zero.
+    The category of each detection is stored as an index into the list of category names.
+    """
+    x: np.ndarray
+    y: np.ndarray
+    width: np.ndarray
+    height: np.ndarray
+    confidence: np.ndarray
+    category_ids: np.ndarray
+    categories: list[str]
+    detections: list[Detection]
+    """the original detection objects"""
+
+    @staticmethod
+    def from_detections(detections: Sequence[Detection]) -> DetectionArray:
+        categories = sorted({d.category_name for d in detections})
+        category_indices = {name: i for i, name in enumerate(categories)}
+        return DetectionArray(
+            x=np.array([d.x for d in detections], dtype=float),
+            y=np.array([d.y for d in detections], dtype=float),
+            width=np.array([getattr(d, 'width', 0) for d in detections], dtype=float),
+            height=np.array([getattr(d, 'height', 0) for d in detections], dtype=float),
+            confidence=np.array([d.confidence for d in detections], dtype=float),
+            category_ids=np.array([category_indices[d.category_name] for d in detections], dtype=int),
+            categories=categories,
+            detections=list(detections),
+        )
+
+    def __len__(self) -> int:
+        return len(self.detections)
+
+    def __getitem__(self, index: np.ndarray | slice) -> DetectionArray:
+        """Select detections by a boolean mask, an index array or a slice."""
+        indices = np.arange(len(self))[index]
+        return DetectionArray(
+            x=self.x[indices],
+            y=self.y[indices],
+            width=self.width[indices],
+            height=self.height[indices],
+            confidence=self.confidence[indices],
+            category_ids=self.category_ids[indices],
+            categories=self.categories,
+            detections=[self.detections[i] for i in indices],
+        )
+
+    @property
+    def centers(self) -> np.ndarray:
+        """Nx2 array of the detection centers."""
+        return np.column_stack((self.x + self.width / 2, self.y + self.height / 2))
+
+    @property
+    def areas(self) -> np.ndarray:
+        return self.width * self.height
+
+    def filter(self, *, min_confidence: float = 0.0, categories: Optional[Sequence[str]] = None) -> DetectionArray:
+        """Select detections with a minimum confidence and optionally one of the given categories."""
+        mask = self.confidence >= min_confidence
+        if categories is not None:
+            ids = [i for i, name in enumerate(self.categories) if name in categories]
+            mask &= np.isin(self.category_ids, ids)
+        return self[mask]
+
+    def intersection_over_union(self, other: Optional[DetectionArray] = None) -> np.ndarray:
+        """NxM matrix of the intersection over union of all boxes with all other boxes (or with themselves)."""
+        if other is None:
+            other = self
+        x_a = np.maximum(self.x[:, None], other.x[None, :])
+        y_a = np.maximum(self.y[:, None], other.y[None, :])
+        x_b = np.minimum((self.x + self.width)[:, None], (other.x + other.width)[None, :])
+        y_b = np.minimum((self.y + self.height)[:, None], (other.y + other.height)[None, :])
+        intersection = np.maximum(x_b - x_a, 0) * np.maximum(y_b - y_a, 0)
+        union = self.areas[:, None] + other.areas[None, :] - intersection
+        return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+    def non_maximum_suppression(self, iou_threshold: float = 0.5, *, per_category: bool = True) -> DetectionArray:
+        """Remove boxes overlapping a box with higher confidence by more than the given intersection over union."""
+        order = np.argsort(-self.confidence, kind='stable')
+        overlapping = self.intersection_over_union() > iou_threshold
+        if per_category:
+            overlapping &= self.category_ids[:, None] == self.category_ids[None, :]
+        suppressed = np.zeros(len(self), dtype=bool)
+        for i in order:
+            if not suppressed[i]:
+                suppressed |= overlapping[i]
+                suppressed[i] = False
+        keep = order[~suppressed[order]]
+        return self[np.sort(keep)]
+
+    def project(self, calibration: Calibration, target_height: float = 0) -> np.ndarray:
+        """Nx3 array of the detection centers projected to the given height in world coordinates.
+
+        Centers which can not be projected are NaN.
+        """
+        if not len(self):
+            return np.zeros((0, 3))
+        return calibration.project_from_image(self.centers, target_height=target_height)
@@ -1,30 +1,61 @@
 import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 import socketio
 import socketio.exceptions
 
-from .. import persistence, rosys
-from .detections import BoxDetection, Detections, PointDetection, SegmentationDetection
+from .. import rosys
+from ..geometry import Point, Rectangle
+from .detections import BoxDetection, Detections, PointDetection, SegmentationDetection, Shape
 from .detector import Autoupload, Detector
-from .image import Image
+from .image import Image, ImageSize
+from .image_processing import shrink_jpeg_image
+
+SUBMISSION_QUALITY = 90
+
+
+@dataclass(slots=True, kw_only=True)
+class DetectionRequest:
+    image: Image
+    autoupload: Autoupload
+    tags: list[str]
+    roi: Optional[Rectangle] = None
+    shrink: int = 1
+    done: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
 
 
 class DetectorHardware(Detector):
     """This detector communicates with a [YOLO detector](https://hub.docker.com/r/zauberzeug/yolov5-detector) via Socket.IO.
 
     It automatically connects and reconnects, submits and receives detections and sends images that should be uploaded to the [Zauberzeug Learning Loop](https://zauberzeug.com/products/learning-loop).
+
+    Up to `max_in_flight` images are sent to the detector at the same time.
+    Each camera has a queue holding only its latest image and the queues are served round-robin.
+    Images can be cropped to a region of interest and shrunk before submission;
+    the resulting detections are scaled back to the coordinates of the original image.
     """
 
-    def __init__(self, *, port: int = 8004, name: Optional[str] = None) -> None:
+    def __init__(self, *, port: int = 8004, name: Optional[str] = None, max_in_flight: int = 1) -> None:
         super().__init__(name=name)
 
         self.sio = socketio.AsyncClient()
-        self.is_detecting: bool = False
-        self.next_image: Optional[Image] = None
         self.port = port
         self.timeout_count = 0
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+
+        self.detection_count = 0
+        """number of completed detections"""
+
+        self.dropped_count = 0
+        """number of images which have been replaced by a newer image of the same camera before being detected"""
+
+        self._queues: OrderedDict[str, DetectionRequest] = OrderedDict()
+        self._latencies: deque[float] = deque(maxlen=100)
+        self._completion_times: deque[float] = deque(maxlen=100)
 
         @self.sio.on('disconnect')
         def on_sio_disconnect() -> None:
@@ -40,6 +71,24 @@ class DetectorHardware(Detector):
     def is_connected(self) -> bool:
         return self.sio.connected
 
+    @property
+    def is_detecting(self) -> bool:
+        return self.in_flight > 0
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Average round-trip time of the recent detections in seconds."""
+        if not self._latencies:
+            return None
+        return sum(self._latencies) / len(self._latencies)
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Number of recent detections per second."""
+        if len(self._completion_times) < 2 or self._completion_times[-1] == self._completion_times[0]:
+            return None
+        return (len(self._completion_times) - 1) / (self._completion_times[-1] - self._completion_times[0])
+
     async def step(self) -> None:
         if not self.is_connected:
             self.log.info(f'trying reconnect {self.name}')
@@ -101,53 +150,80 @@ class DetectorHardware(Detector):
         except Exception:
             self.log.exception(f'could not upload {image.id}')
 
-    async def detect(self, image: Image, autoupload: Autoupload = Autoupload.FILTERED, tags: list[str] = []) -> None:
-        if not self.is_connected:
-            return
+    async def detect(self, image: Image, autoupload: Autoupload = Autoupload.FILTERED, tags: list[str] = [], *,
+                     roi: Optional[Rectangle] = None, shrink: int = 1) -> None:
+        """Queue the image for detection and wait until it has been detected or replaced by a newer image.
 
-        self.next_image = image
-        if self.is_detecting:
+        :param roi: optional region of interest to which the image is cropped before submission
+        :param shrink: optional factor by which the (cropped) image is downscaled before submission
+        """
+        if not self.is_connected or image.is_broken:
             return
 
-        while self.next_image is not None and not rosys.is_stopping():
-            current_image = self.next_image
-            self.next_image = None
-            if current_image.is_broken:
+        request = DetectionRequest(image=image, autoupload=autoupload, tags=tags, roi=roi, shrink=shrink)
+        previous = self._queues.get(image.camera_id)
+        if previous is not None:
+            previous.done.set_result(None)
+            self.dropped_count += 1
+        self._queues[image.camera_id] = request  # NOTE: a replaced request keeps the position of its camera
+        self._dispatch()
+        await asyncio.shield(request.done)
+
+    def _dispatch(self) -> None:
+        if not self.is_connected:
+            for request in self._queues.values():
+                request.done.set_result(None)
+            self._queues.clear()
+            return
+        while self._queues and self.in_flight < self.max_in_flight and not rosys.is_stopping():
+            _, request = self._queues.popitem(last=False)
+            if request.image.is_broken or request.image.data is None:
+                request.done.set_result(None)
                 continue
-            try:
-                self.is_detecting = True
-                result: dict = await self.sio.call('detect', {
-                    'image': current_image.data,
-                    'mac': current_image.camera_id,
-                    'autoupload': autoupload.value,
-                    'tags': tags,
-                }, timeout=3)
-                if current_image.is_broken:  # NOTE: image can be marked broken while detection is underway
-                    continue
-                detections = Detections(
-                    boxes=[persistence.from_dict(BoxDetection, d) for d in result.get('box_detections', [])],
-                    points=[persistence.from_dict(PointDetection, d) for d in result.get('point_detections', [])],
-                    segmentations=[
-                        persistence.from_dict(SegmentationDetection, d)
-                        for d in result.get('segmentation_detections', [])
-                    ],
-                )
-                current_image.set_detections(self.name, detections)
-            except socketio.exceptions.TimeoutError:
-                self.log.debug(f'detection for {current_image.id} on {self.port} took too long')
-                self.timeout_count += 1
-            except asyncio.exceptions.CancelledError:
-                self.log.debug('task has been cancelled')
-            except Exception:
-                self.log.exception(f'could not detect {current_image.id}')
-            else:
-                self.timeout_count = 0
-                if not current_image.is_broken:
-                    self.NEW_DETECTIONS.emit(current_image)
-            finally:
-                self.is_detecting = False
-                if self.timeout_count > 5:
-                    await self.disconnect()
+            self.in_flight += 1
+            rosys.background_tasks.create(self._detect(request), name='detect')
+
+    async def _detect(self, request: DetectionRequest) -> None:
+        image = request.image
+        try:
+            data = image.data
+            if data is None:  # NOTE: the image data may have been evicted to stay within the memory budget
+                return
+            if request.roi is not None or request.shrink != 1:
+                data = await rosys.run.cpu_bound(_prepare_submission, data, request.shrink, request.roi)
+                if data is None:  # NOTE: cpu_bound returns None instead of a result while shutting down
+                    return
+            start = rosys.time()
+            result: dict = await self.sio.call('detect', {
+                'image': data,
+                'mac': image.camera_id,
+                'autoupload': request.autoupload.value,
+                'tags': request.tags,
+            }, timeout=3)
+            self._latencies.append(rosys.time() - start)
+            if image.is_broken:  # NOTE: image can be marked broken while detection is underway
+                return
+            detections = parse_detections(result, _submission_transform(image.size, request.roi, request.shrink))
+            image.set_detections(self.name, detections)
+        except socketio.exceptions.TimeoutError:
+            self.log.debug(f'detection for {image.id} on {self.port} took too long')
+            self.timeout_count += 1
+        except asyncio.exceptions.CancelledError:
+            self.log.debug('task has been cancelled')
+        except Exception:
+            self.log.exception(f'could not detect {image.id}')
+        else:
+            self.timeout_count = 0
+            self.detection_count += 1
+            self._completion_times.append(rosys.time())
+            self.NEW_DETECTIONS.emit(image)
+        finally:
+            self.in_flight -= 1
+            if not request.done.done():
+                request.done.set_result(None)
+            if self.timeout_count > 5:
+                await self.disconnect()
+            self._dispatch()
 
     def __str__(self) -> str:
         return f'{type(self).__name__} ({"connected" if self.is_connected else "disconnected"})'
@@ -160,3 +236,54 @@ def _box_detections_to_int(detections: list[dict]) -> list[dict]:
         detection['width'] = int(detection['width'])
         detection['height'] = int(detection['height'])
     return detections
+
+
+def parse_detections(result: dict, transform: tuple[float, float, float, float] = (1, 1, 0, 0)) -> Detections:
+    """Create detections from a detector result without reflection-based deserialization.
+
+    The detections of each type can be given as a list of dicts or as a dict of columns.
+    The coordinates are mapped with the transform `(scale_x, scale_y, offset_x, offset_y)`.
+    """
+    sx, sy, ox, oy = transform
+    return Detections(
+        boxes=[
+            BoxDetection(category_name=d['category_name'], model_name=d['model_name'],
+                         confidence=float(d['confidence']),
+                         x=float(d['x']) * sx + ox, y=float(d['y']) * sy + oy,
+                         width=float(d['width']) * sx, height=float(d['height']) * sy,
+                         uuid=d.get('uuid', ''))
+            for d in _rows(result.get('box_detections', []))
+        ],
+        points=[
+            PointDetection(category_name=d['category_name'], model_name=d['model_name'],
+                           confidence=float(d['confidence']),
+                           x=float(d['x']) * sx + ox, y=float(d['y']) * sy + oy,
+                           uuid=d.get('uuid', ''))
+            for d in _rows(result.get('point_detections', []))
+        ],
+        segmentations=[
+            SegmentationDetection(category_name=d['category_name'], model_name=d['model_name'],
+                                  confidence=float(d['confidence']),
+                                  shape=Shape(points=[Point(x=float(p['x']) * sx + ox, y=float(p['y']) * sy + oy)
+                                                      for p in d['shape']['points']]))
+            for d in _rows(result.get('segmentation_detections', []))
+        ],
+    )
+
+
+def _rows(detections: list[dict] | dict[str, list]) -> Iterable[dict]:
+    if isinstance(detections, dict):
+        return (dict(zip(detections, row)) for row in zip(*detections.values()))
+    return detections
+
+
+def _prepare_submission(data: bytes, shrink: int, roi: Optional[Rectangle]) -> bytes:
+    return shrink_jpeg_image(data, shrink, quality=SUBMISSION_QUALITY, crop=roi)
+
+
+def _submission_transform(size: ImageSize, roi: Optional[Rectangle], shrink: int) -> tuple[float, float, float, float]:
+    """Transform from the coordinates of the submitted image to the coordinates of the original image."""
+    if roi is None:
+        roi = Rectangle(x=0, y=0, width=size.width, height=size.height)
+    width, height = int(roi.width), int(roi.height)
+    return (width / -(-width // shrink), height / -(-height // shrink), int(roi.x), int(roi.y))
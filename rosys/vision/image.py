@@ -27,6 +27,7 @@ class Image:
     size: ImageSize
     time: float  # time of recording
     data: Optional[bytes] = None
+    thumbnail: Optional[bytes] = None  # downscaled JPEG kept after the data has been evicted
     _detections: dict[str, Detections] = field(default_factory=dict)
     is_broken: Optional[bool] = None
     tags: set[str] = field(default_factory=set)
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import mmap
+import queue
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, TextIO
+
+from .. import persistence
+from .detections import Detections
+from .image import Image, ImageSize
+
+ARCHIVE_PATH = Path('~/.rosys/images').expanduser()
+
+
+@dataclass(slots=True, kw_only=True)
+class ArchiveEntry:
+    camera_id: str
+    time: float
+    offset: int
+    size: int
+    width: int
+    height: int
+    detections: dict[str, dict[str, Any]] = field(default_factory=dict)
+    is_broken: Optional[bool] = None
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True, kw_only=True)
+class _Segment:
+    name: str
+    entries: list[ArchiveEntry] = field(default_factory=list)
+    nbytes: int = 0
+    map: Optional[mmap.mmap] = None
+
+
+class ImageArchive:
+    """Rolling archive of camera images on disk.
+
+    The JPEG payloads are appended to segment files (``<time>.jpgs``) next to an index file (``<time>.idx``)
+    with one JSON line per image containing its time, camera ID, offset, size and detections.
+    Payloads are read back via memory maps, so only the requested images are loaded into memory.
+    When the archive exceeds its size limit, the oldest segments are deleted.
+    Images are written by a background thread, so appending does not block the event loop.
+    Until then, they are served from memory.
+    """
+
+    def __init__(self, path: Path = ARCHIVE_PATH, *,
+                 segment_size: int = 64 * 1024**2,
+                 max_bytes: int = 1024**3) -> None:
+        self.path = path
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.log = logging.getLogger('rosys.image_archive')
+
+        self._segments: list[_Segment] = []
+        self._index: dict[tuple[str, str], tuple[_Segment, ArchiveEntry]] = {}
+        self._camera_times: dict[str, list[float]] = {}
+        self._camera_entries: dict[str, list[tuple[_Segment, ArchiveEntry]]] = {}
+        """entries of each camera sorted by time (parallel to `_camera_times`)"""
+        self._data_file: Optional[BinaryIO] = None
+        self._index_file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[Optional[tuple[ArchiveEntry, bytes]]] = queue.Queue()
+        self._pending: dict[tuple[str, str], tuple[ArchiveEntry, bytes]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        for filepath in sorted(self.path.glob('*.idx'), key=lambda p: float(p.stem)):
+            self._load_segment(filepath.stem)
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes of all archived images."""
+        return sum(segment.nbytes for segment in self._segments)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index) + len(self._pending)
+
+    def append(self, image: Image) -> None:
+        """Queue an image to be written to the current segment, starting a new segment if necessary."""
+        key = (image.camera_id, str(image.time))
+        if image.data is None or key in self._pending or key in self._index:
+            return
+        # NOTE: the entry and payload are captured now, because the image may be evicted before it is written
+        entry = ArchiveEntry(
+            camera_id=image.camera_id,
+            time=image.time,
+            offset=-1,
+            size=len(image.data),
+            width=image.size.width,
+            height=image.size.height,
+            detections={detector_id: persistence.to_dict(detections)
+                        for detector_id, detections in image._detections.items()},  # pylint: disable=protected-access
+            is_broken=image.is_broken,
+            tags=sorted(image.tags),
+        )
+        with self._lock:
+            self._pending[key] = (entry, image.data)
+        self._queue.put((entry, image.data))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='image archive', daemon=True)
+            self._thread.start()
+
+    def flush(self) -> None:
+        """Wait until all queued images have been written."""
+        self._queue.join()
+
+    def get(self, camera_id: str, key: str) -> Optional[Image]:
+        """Get the image of the given camera with the given timestamp key (``str(image.time)``)."""
+        with self._lock:
+            pending = self._pending.get((camera_id, key))
+            if pending is not None:
+                return _create_image(*pending)
+            item = self._index.get((camera_id, key))
+            if item is None:
+                return None
+            return self._read(*item)
+
+    def get_images(self, camera_id: str, min_time: float, max_time: float = float('inf')) -> list[Image]:
+        """Get all images of the given camera which were recorded after `min_time` and until `max_time`."""
+        with self._lock:
+            times = self._camera_times.get(camera_id, [])
+            start = bisect.bisect_right(times, min_time)
+            end = bisect.bisect_right(times, max_time)
+            images = [self._read(*item) for item in self._camera_entries[camera_id][start:end]] if start < end else []
+            images += [_create_image(entry, data) for entry, data in self._pending.values()
+                       if entry.camera_id == camera_id and min_time < entry.time <= max_time]
+        return sorted(images, key=lambda image: image.time)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._close_files()
+            for segment in self._segments:
+                if segment.map is not None:
+                    segment.map.close()
+                    segment.map = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                entry, data = item
+                try:
+                    self._write(entry, data)
+                except OSError:
+                    self.log.exception(f'could not archive image {entry.camera_id}/{entry.time}')
+                finally:
+                    with self._lock:
+                        self._pending.pop((entry.camera_id, str(entry.time)), None)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, entry: ArchiveEntry, data: bytes) -> None:
+        with self._lock:
+            if not self._segments or self._data_file is None or self._segments[-1].nbytes >= self.segment_size:
+                self._start_segment(entry.time)
+            assert self._data_file is not None and self._index_file is not None
+            segment = self._segments[-1]
+            data_file, index_file = self._data_file, self._index_file
+        entry.offset = segment.nbytes
+        # NOTE: the payload is written first, so the index never refers to missing data
+        data_file.write(data)
+        data_file.flush()
+        index_file.write(json.dumps(persistence.to_dict(entry)) + '\n')
+        index_file.flush()
+        with self._lock:
+            segment.entries.append(entry)
+            segment.nbytes += entry.size
+            self._add_to_index(segment, entry)
+
+    def _start_segment(self, time: float) -> None:
+        self._close_files()
+        segment = _Segment(name=f'{time:.3f}')
+        while any(s.name == segment.name for s in self._segments):
+            segment.name = f'{float(segment.name) + 0.001:.3f}'
+        self._data_file = (self.path / f'{segment.name}.jpgs').open('ab')
+        self._index_file = (self.path / f'{segment.name}.idx').open('a')
+        self._segments.append(segment)
+        while len(self._segments) > 1 and self.nbytes + self.segment_size > self.max_bytes:
+            self._delete_segment(self._segments[0])
+
+    def _load_segment(self, name: str) -> None:
+        segment = _Segment(name=name)
+        data_size = (self.path / f'{name}.jpgs').stat().st_size if (self.path / f'{name}.jpgs').exists() else 0
+        with (self.path / f'{name}.idx').open() as f:
+            for line in f:
+                try:
+                    entry: ArchiveEntry = persistence.from_dict(ArchiveEntry, json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    self.log.warning(f'skipping broken index line in image archive segment "{name}"')
+                    continue
+                if entry.offset + entry.size > data_size:
+                    continue
+                segment.entries.append(entry)
+                segment.nbytes = max(segment.nbytes, entry.offset + entry.size)
+                self._add_to_index(segment, entry)
+        self._segments.append(segment)
+
+    def _add_to_index(self, segment: _Segment, entry: ArchiveEntry) -> None:
+        self._index[(entry.camera_id, str(entry.time))] = (segment, entry)
+        times = self._camera_times.setdefault(entry.camera_id, [])
+        entries = self._camera_entries.setdefault(entry.camera_id, [])
+        i = bisect.bisect_right(times, entry.time)
+        times.insert(i, entry.time)
+        entries.insert(i, (segment, entry))
+
+    def _delete_segment(self, segment: _Segment) -> None:
+        self._segments.remove(segment)
+        for entry in segment.entries:
+            self._index.pop((entry.camera_id, str(entry.time)), None)
+        for camera_id in {entry.camera_id for entry in segment.entries}:
+            entries = [item for item in self._camera_entries[camera_id] if item[0] is not segment]
+            self._camera_entries[camera_id] = entries
+            self._camera_times[camera_id] = [entry.time for _, entry in entries]
+        if segment.map is not None:
+            segment.map.close()
+        (self.path / f'{segment.name}.jpgs').unlink(missing_ok=True)
+        (self.path / f'{segment.name}.idx').unlink(missing_ok=True)
+
+    def _close_files(self) -> None:
+        if self._data_file is not None:
+            self._data_file.close()
+            self._data_file = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    def _read(self, segment: _Segment, entry: ArchiveEntry) -> Image:
+        end = entry.offset + entry.size
+        if segment.map is None or len(segment.map) < end:
+            # NOTE: the current segment is still growing, so its memory map is renewed when it does not cover the entry
+            if segment.map is not None:
+                segment.map.close()
+            with (self.path / f'{segment.name}.jpgs').open('rb') as f:
+                segment.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return _create_image(entry, segment.map[entry.offset:end])
+
+
+def _create_image(entry: ArchiveEntry, data: bytes) -> Image:
+    return Image(
+        camera_id=entry.camera_id,
+        size=ImageSize(width=entry.width, height=entry.height),
+        time=entry.time,
+        data=data,
+        _detections={detector_id: persistence.from_dict(Detections, detections)
+                     for detector_id, detections in entry.detections.items()},
+        is_broken=entry.is_broken,
+        tags=set(entry.tags),
+    )
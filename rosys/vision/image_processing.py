@@ -40,17 +40,52 @@ def process_jpeg_image(data: bytes, rotation: ImageRotation, crop: Optional[Rect
     return img_byte_arr.getvalue()
 
 
-def process_ndarray_image(image: np.ndarray, rotation: ImageRotation, crop: Optional[Rectangle] = None) -> bytes:
-    """Rotate and crop a NumPy image."""
+def shrink_jpeg_image(data: bytes, factor: int, *, quality: int = 60, crop: Optional[Rectangle] = None) -> bytes:
+    """Crop and downscale a JPEG image by the given factor.
+
+    The draft mode lets libjpeg decode the image at a reduced scale in the DCT domain,
+    so the full resolution image is never decoded for factors of 2, 4 and 8.
+    The resulting size is the (cropped) size divided by the factor and rounded up.
+    """
+    image = PIL.Image.open(io.BytesIO(data))
+    width, height = image.size
+    image.draft('RGB', (-(-width // factor), -(-height // factor)))
+    if crop is not None:
+        scale = image.width / width
+        image = image.crop((int(crop.x * scale), int(crop.y * scale),
+                            int((crop.x + crop.width) * scale), int((crop.y + crop.height) * scale)))
+        width, height = int(crop.width), int(crop.height)
+    size = (-(-width // factor), -(-height // factor))
+    if image.size != size:
+        image = image.resize(size, PIL.Image.Resampling.NEAREST)
+    img_byte_arr = io.BytesIO()
+    image.convert('RGB').save(img_byte_arr, format='JPEG', quality=quality)
+    return img_byte_arr.getvalue()
+
+
+def process_ndarray_image(image: np.ndarray, rotation: ImageRotation, crop: Optional[Rectangle] = None, *,
+                          counterclockwise: bool = False) -> bytes:
+    """Rotate and crop a NumPy image and encode it as JPEG (see `transform_ndarray_image`)."""
+    return cv2.imencode('.jpg', transform_ndarray_image(image, rotation, crop,
+                                                       counterclockwise=counterclockwise))[1].tobytes()
+
+
+def transform_ndarray_image(image: np.ndarray, rotation: ImageRotation, crop: Optional[Rectangle] = None, *,
+                            counterclockwise: bool = False) -> np.ndarray:
+    """Rotate and crop a NumPy image.
+
+    :param counterclockwise: rotate counter-clockwise by the rotation angle like `process_jpeg_image`
+        instead of clockwise
+    """
     if crop is not None:
         image = image[int(crop.y):int(crop.y+crop.height), int(crop.x):int(crop.x+crop.width)]
-    if rotation == ImageRotation.LEFT:
+    if rotation == (ImageRotation.RIGHT if counterclockwise else ImageRotation.LEFT):
         image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-    elif rotation == ImageRotation.RIGHT:
+    elif rotation == (ImageRotation.LEFT if counterclockwise else ImageRotation.RIGHT):
         image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
     elif rotation == ImageRotation.UPSIDE_DOWN:
         image = cv2.rotate(image, cv2.ROTATE_180)
-    return cv2.imencode('.jpg', image)[1].tobytes()
+    return image
 
 
 def to_bytes(image: Any) -> bytes:
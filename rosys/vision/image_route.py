@@ -1,21 +1,28 @@
 from __future__ import annotations
 
 import logging
+from collections import OrderedDict
 from typing import TYPE_CHECKING, Optional
 
-import cv2
-import numpy as np
-from fastapi import Response
+from fastapi import Header, Response
 from nicegui import app
 
 from .. import run
 from .image import Image
+from .image_processing import shrink_jpeg_image
 
 if TYPE_CHECKING:
     from .camera import Camera
 
 log = logging.getLogger('rosys.image_route')
 
+SHRINK_CACHE_SIZE = 256
+CACHE_CONTROL = 'max-age=7776000'
+THUMBNAIL_CACHE_CONTROL = 'no-store'
+
+_shrink_cache: OrderedDict[tuple[str, str, int], bytes] = OrderedDict()
+"""shrunk images of all cameras by camera ID, timestamp and shrink factor (least recently used first)"""
+
 
 def create_image_route(camera: Camera) -> None:
     placeholder_url = '/' + camera.base_path + '/placeholder'
@@ -24,8 +31,9 @@ def create_image_route(camera: Camera) -> None:
     app.remove_route(placeholder_url)
     app.remove_route(timestamp_url)
 
-    async def get_camera_image(timestamp: str, shrink: int = 1) -> Response:
-        return await _get_image(camera, timestamp, shrink)
+    async def get_camera_image(timestamp: str, shrink: int = 1,
+                               if_none_match: Optional[str] = Header(default=None)) -> Response:
+        return await _get_image(camera, timestamp, shrink, if_none_match)
 
     app.add_api_route(placeholder_url, _get_placeholder)
     app.add_api_route(timestamp_url, get_camera_image)
@@ -35,34 +43,48 @@ async def _get_placeholder(shrink: int = 1) -> Response:
     return Response(content=Image.create_placeholder('no image', shrink=shrink).data, media_type='image/jpeg')
 
 
-async def _get_image(camera: Camera, timestamp: str, shrink: int = 1) -> Response:
+async def _get_image(camera: Camera, timestamp: str, shrink: int = 1, if_none_match: Optional[str] = None) -> Response:
     try:
         if not camera:
             return Response(content='Camera not found', status_code=404)
-        jpeg = await _try_get_jpeg(camera, timestamp, shrink)
+        # NOTE: images never change once they are captured, so the ETag only depends on the URL
+        etag = f'"{camera.id}/{timestamp}/{shrink}"'
+        headers = {'cache-control': CACHE_CONTROL, 'etag': etag}
+        if if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(',')):
+            return Response(status_code=304, headers=headers)
+        jpeg, is_thumbnail = await _try_get_jpeg(camera, timestamp, shrink)
         if not jpeg:
             return Response(content='Image not found', status_code=404)
-        return Response(content=jpeg, headers={'cache-control': 'max-age=7776000'}, media_type='image/jpeg')
+        if is_thumbnail:
+            # NOTE: the full resolution image may still be available from an archive later, so do not cache thumbnails
+            etag = f'"{camera.id}/{timestamp}/{shrink}/thumbnail"'
+            headers = {'cache-control': THUMBNAIL_CACHE_CONTROL, 'etag': etag}
+        return Response(content=jpeg, headers=headers, media_type='image/jpeg')
     except Exception:
         log.exception('could not get image')
         raise
 
 
-async def _try_get_jpeg(camera: Camera, timestamp: str, shrink: int) -> Optional[bytes]:
-    for image in reversed(camera.images):
-        if str(image.time) == timestamp and image.data is not None:
-            jpeg = image.data
-            if shrink != 1:
-                array = np.frombuffer(image.data, dtype=np.uint8)
-                if array is None:
-                    return None
-                jpeg = await run.cpu_bound(_shrink, shrink, array)
-            return jpeg
-    return None
-
-
-def _shrink(factor: int, array: np.ndarray) -> bytes:
-    decoded = cv2.imdecode(array, cv2.IMREAD_COLOR)
-    img = decoded[::factor, ::factor]
-    _, encoded_image = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
-    return encoded_image.tobytes()
+async def _try_get_jpeg(camera: Camera, timestamp: str, shrink: int) -> tuple[Optional[bytes], bool]:
+    """Get the JPEG data of an image and whether it is only the thumbnail of an evicted image."""
+    image = camera.images.get(timestamp)
+    if (image is None or image.data is None) and camera.images.archive is not None:
+        image = camera.images.archive.get(camera.id, timestamp) or image
+    if image is None:
+        return None, False
+    data = image.data
+    if data is None:
+        # NOTE: the full resolution image has been evicted to stay within the memory budget
+        return image.thumbnail, True
+    if shrink == 1:
+        return data, False
+    key = (camera.id, timestamp, shrink)
+    jpeg = _shrink_cache.get(key)
+    if jpeg is None:
+        jpeg = await run.cpu_bound(shrink_jpeg_image, data, shrink)
+        _shrink_cache[key] = jpeg
+        while len(_shrink_cache) > SHRINK_CACHE_SIZE:
+            _shrink_cache.popitem(last=False)
+    _shrink_cache.move_to_end(key)
+    return jpeg, False
+
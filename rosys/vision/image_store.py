@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import itertools
+import weakref
+from collections import deque
+from typing import TYPE_CHECKING, Iterator, Optional, overload
+
+from .. import rosys
+from .image import Image
+from .image_processing import shrink_jpeg_image
+
+if TYPE_CHECKING:
+    from .image_archive import ImageArchive
+
+
+class ImageMemoryBudget:
+    """Global limit for the image data held by all image stores.
+
+    When the limit is exceeded, the oldest image of the store holding the most bytes relative to its weight is evicted,
+    i.e. its data is dropped and optionally replaced by a downscaled thumbnail.
+    The newest image of each store is never evicted.
+    """
+
+    def __init__(self) -> None:
+        self.max_bytes: Optional[int] = None
+        """maximum number of bytes of all image stores (None for no limit)"""
+
+        self.thumbnail_shrink: Optional[int] = None
+        """shrink factor for the thumbnails of evicted images (None for no thumbnails)"""
+
+        self._stores: weakref.WeakSet[ImageStore] = weakref.WeakSet()
+
+    def register(self, store: ImageStore) -> None:
+        self._stores.add(store)
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes of image data held by all image stores."""
+        return sum(store.nbytes for store in self._stores)
+
+    @property
+    def bytes_per_camera(self) -> dict[str, int]:
+        """Number of bytes of image data held by the image store of each camera."""
+        return {store.camera_id: store.nbytes for store in self._stores}
+
+    def enforce(self) -> None:
+        """Evict images until all image stores fit into the budget."""
+        if self.max_bytes is None:
+            return
+        total = self.nbytes
+        candidates = list(self._stores)
+        while total > self.max_bytes and candidates:
+            store = max(candidates, key=lambda s: s.nbytes / s.weight)
+            freed = store.evict_oldest(self.thumbnail_shrink)
+            if freed is None:
+                candidates.remove(store)
+            else:
+                total -= freed
+
+
+image_memory_budget = ImageMemoryBudget()
+
+
+class ImageStore:
+    """Ring buffer of the latest images of a camera, ordered by time.
+
+    Images can be looked up by their timestamp key (``str(image.time)``) in constant time
+    and time windows are found via binary search.
+    The bytes held by all stores are limited by a global memory budget,
+    where a store with a higher weight is allowed to hold proportionally more bytes.
+    If an archive is given, images are spilled to it when they leave the ring buffer or are evicted.
+    """
+
+    def __init__(self,
+                 maxlen: int, *,
+                 camera_id: str = '',
+                 weight: float = 1.0,
+                 budget: ImageMemoryBudget = image_memory_budget,
+                 archive: Optional[ImageArchive] = None) -> None:
+        self.maxlen = maxlen
+        self.camera_id = camera_id
+        self.weight = weight
+        self.budget = budget
+        self.archive = archive
+        self.nbytes = 0
+        """number of bytes of image data and thumbnails held by this store"""
+
+        self._images: deque[Image] = deque()
+        self._times: deque[float] = deque()
+        self._sizes: deque[int] = deque()
+        self._index: dict[str, Image] = {}
+        self._latest_captured: Optional[Image] = None
+        self._latest_detected: Optional[Image] = None
+        self._evicted = 0  # NOTE: the images before this index have been evicted or never contained data
+        budget.register(self)
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def __bool__(self) -> bool:
+        return bool(self._images)
+
+    def __iter__(self) -> Iterator[Image]:
+        return iter(self._images)
+
+    def __reversed__(self) -> Iterator[Image]:
+        return reversed(self._images)
+
+    @overload
+    def __getitem__(self, index: int) -> Image: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Image]: ...
+
+    def __getitem__(self, index: int | slice) -> Image | list[Image]:
+        if isinstance(index, slice):
+            return list(self._images)[index]
+        return self._images[index]
+
+    def append(self, image: Image) -> None:
+        """Add an image, removing the oldest one if the store is full and evicting images to stay within budget."""
+        if len(self._images) >= self.maxlen:
+            oldest = self.popleft()
+            if self.archive is not None:
+                self.archive.append(oldest)
+        size = len(image.data or b'') + len(image.thumbnail or b'')
+        if not self._times or image.time >= self._times[-1]:
+            self._images.append(image)
+            self._times.append(image.time)
+            self._sizes.append(size)
+        else:
+            i = bisect.bisect_right(self._times, image.time)
+            self._images.insert(i, image)
+            self._times.insert(i, image.time)
+            self._sizes.insert(i, size)
+            self._evicted = min(self._evicted, i)
+        self.nbytes += size
+        self._index[str(image.time)] = image
+        if image.data and (self._latest_captured is None or image.time >= self._latest_captured.time):
+            self._latest_captured = image
+        self.budget.enforce()
+
+    def popleft(self) -> Image:
+        """Remove and return the oldest image."""
+        image = self._images.popleft()
+        self._times.popleft()
+        self.nbytes -= self._sizes.popleft()
+        self._evicted = max(self._evicted - 1, 0)
+        key = str(image.time)
+        if self._index.get(key) is image:
+            del self._index[key]
+        if self._latest_captured is image:
+            self._latest_captured = None
+        if self._latest_detected is image:
+            self._latest_detected = None
+        return image
+
+    def clear(self) -> None:
+        self._images.clear()
+        self._times.clear()
+        self._sizes.clear()
+        self._index.clear()
+        self._latest_captured = None
+        self._latest_detected = None
+        self._evicted = 0
+        self.nbytes = 0
+
+    def prune(self, min_time: float) -> None:
+        """Remove all images older than the given time."""
+        while self._times and self._times[0] < min_time:
+            self.popleft()
+
+    def evict_oldest(self, thumbnail_shrink: Optional[int] = None) -> Optional[int]:
+        """Drop the data of the oldest image still containing data, except for the newest image.
+
+        :param thumbnail_shrink: if given, a thumbnail downscaled by this factor is kept instead of the data
+            (created in a separate process if an event loop is running, so the data is freed right away)
+        :return: the number of freed bytes or None if there was no image to evict
+        """
+        i = self._evicted
+        while i < len(self._images) - 1 and not self._images[i].data:
+            i += 1
+        self._evicted = i
+        if i >= len(self._images) - 1:
+            return None
+        image = self._images[i]
+        assert image.data is not None
+        if self.archive is not None:
+            self.archive.append(image)
+        data, image.data = image.data, None
+        size = len(image.thumbnail or b'')
+        freed = self._sizes[i] - size
+        self._sizes[i] = size
+        self.nbytes -= freed
+        if self._latest_captured is image:
+            self._latest_captured = None
+        if self._latest_detected is image:
+            self._latest_detected = None
+        self._evicted = i + 1
+        if thumbnail_shrink is not None and image.thumbnail is None:
+            self._create_thumbnail(image, data, thumbnail_shrink)
+        return freed - len(image.thumbnail or b'') + size
+
+    def _create_thumbnail(self, image: Image, data: bytes, shrink: int) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._set_thumbnail(image, _shrink(data, shrink))
+            return
+
+        async def create() -> None:
+            self._set_thumbnail(image, await rosys.run.cpu_bound(_shrink, data, shrink))
+        rosys.background_tasks.create(create(), name='create thumbnail')
+
+    def _set_thumbnail(self, image: Image, thumbnail: Optional[bytes]) -> None:
+        if not thumbnail or self._index.get(str(image.time)) is not image or image.data is not None:
+            return
+        image.thumbnail = thumbnail
+        i = bisect.bisect_left(self._times, image.time)
+        while self._images[i] is not image:
+            i += 1
+        self._sizes[i] += len(thumbnail)
+        self.nbytes += len(thumbnail)
+
+    def get(self, key: str) -> Optional[Image]:
+        """Get the image with the given timestamp key (``str(image.time)``)."""
+        return self._index.get(key)
+
+    def since(self, min_time: float) -> list[Image]:
+        """Get all images newer than the given time."""
+        start = bisect.bisect_right(self._times, min_time)
+        return list(itertools.islice(self._images, start, None))
+
+    @property
+    def latest_captured(self) -> Optional[Image]:
+        """The latest image containing data.
+
+        It is kept up to date when images are added,
+        so the images only need to be searched after the latest one has been removed or evicted.
+        """
+        if self._latest_captured is None or not self._latest_captured.data:
+            self._latest_captured = next((image for image in reversed(self._images) if image.data), None)
+        return self._latest_captured
+
+    @property
+    def latest_detected(self) -> Optional[Image]:
+        """The latest image with detections.
+
+        Detections are usually added after an image has been stored.
+        So only images newer than the previous result need to be checked again.
+        """
+        for image in reversed(self._images):
+            if image is self._latest_detected:
+                break
+            if image.data and image.detections:
+                self._latest_detected = image
+                break
+        return self._latest_detected
+
+
+def _shrink(data: bytes, factor: int) -> Optional[bytes]:
+    try:
+        return shrink_jpeg_image(data, factor)
+    except OSError:
+        return None
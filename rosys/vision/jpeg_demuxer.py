@@ -0,0 +1,59 @@
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+
+class JpegDemuxer:
+    """Extract JPEG frames from a byte stream (e.g. MJPEG over HTTP or the output of a GStreamer pipeline).
+
+    Only the bytes of each new chunk are scanned for SOI and EOI markers (including markers spanning two chunks).
+    The chunks of an incomplete frame are kept as zero-copy memory views
+    and joined only once when the frame is complete, so every byte of a frame is copied exactly once.
+    """
+
+    def __init__(self) -> None:
+        self._parts: list[memoryview] = []
+        self._in_frame = False
+        self._last_byte = 0
+
+    @property
+    def buffered(self) -> int:
+        """Number of bytes of the incomplete frame that have been received so far."""
+        return sum(len(part) for part in self._parts)
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Process a chunk of data and return all frames it completes."""
+        if not data:
+            return []
+        view = memoryview(data)
+        frames: list[bytes] = []
+        pos = 0
+        start = 0
+        if self._last_byte == 0xFF and self._in_frame and data[0] == EOI[1]:
+            frames.append(b''.join([*self._parts, view[:1]]))
+            self._parts.clear()
+            self._in_frame = False
+            pos = 1
+        elif self._last_byte == 0xFF and not self._in_frame and data[0] == SOI[1]:
+            self._parts = [memoryview(SOI)[:1]]
+            self._in_frame = True
+            pos = 1
+        while True:
+            if not self._in_frame:
+                header = data.find(SOI, pos)
+                if header == -1:
+                    break
+                self._in_frame = True
+                start = header
+                pos = header + 2
+            else:
+                footer = data.find(EOI, pos)
+                if footer == -1:
+                    self._parts.append(view[start:])
+                    break
+                frames.append(b''.join([*self._parts, view[start:footer + 2]]))
+                self._parts.clear()
+                self._in_frame = False
+                pos = footer + 2
+        # NOTE: the last byte can only start a marker if it has not been part of the previous search
+        self._last_byte = data[-1] if pos < len(data) else 0
+        return frames
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Compare the JpegDemuxer with the former BytesIO-based frame extraction.
+
+Usage: python3 jpeg_demuxer_benchmark.py [recorded_stream.mjpeg ...]
+
+Without arguments a multipart MJPEG stream of 1080p frames is synthesized.
+Recorded streams can be captured e.g. with ``curl http://<camera>/mjpeg > stream.mjpeg``.
+"""
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from rosys.vision.jpeg_demuxer import JpegDemuxer
+
+CHUNK_SIZE = 4096
+
+
+def synthesize_stream(num_frames: int = 50) -> bytes:
+    rng = np.random.default_rng(0)
+    background = cv2.resize(rng.integers(0, 256, (108, 192, 3), dtype=np.uint8), (1920, 1080))
+    parts = []
+    for i in range(num_frames):
+        image = cv2.putText(background.copy(), str(i), (100, 500), cv2.FONT_HERSHEY_SIMPLEX, 10, (255, 255, 255), 20)
+        jpeg = cv2.imencode('.jpg', image)[1].tobytes()
+        parts.append(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n%s\r\n' % (len(jpeg), jpeg))
+    return b''.join(parts)
+
+
+def legacy_frames(chunks: list[bytes]) -> list[bytes]:
+    """Former implementation of MjpegDevice, which rebuilt the buffer after each frame.
+
+    NOTE: The rebuilt buffer is positioned at its start, so the next chunk overwrites the data following the frame.
+    """
+    frames = []
+    buffer = BytesIO()
+    header = None
+    pos = 0
+    for chunk in chunks:
+        buffer.write(chunk)
+        while True:
+            if header is None:
+                header_pos = buffer.getvalue().find(b'\xff\xd8', pos)
+                if header_pos == -1:
+                    pos = max(0, buffer.tell() - 1)
+                    break
+                pos = header_pos + 2
+                header = header_pos
+            else:
+                footer_pos = buffer.getvalue().find(b'\xff\xd9', pos)
+                if footer_pos == -1:
+                    pos = max(0, buffer.tell() - 1)
+                    break
+                frames.append(buffer.getvalue()[header:footer_pos + 2])
+                buffer = BytesIO(buffer.getvalue()[footer_pos + 2:])
+                pos = 0
+                header = None
+    return frames
+
+
+def count_valid(frames: list[bytes]) -> int:
+    return sum(cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_UNCHANGED) is not None for frame in frames)
+
+
+def demuxer_frames(chunks: list[bytes]) -> list[bytes]:
+    demuxer = JpegDemuxer()
+    return [bytes(frame) for chunk in chunks for frame in demuxer.feed(chunk)]
+
+
+streams = {Path(arg).name: Path(arg).read_bytes() for arg in sys.argv[1:]} or {'synthetic 1080p': synthesize_stream()}
+for name, stream in streams.items():
+    chunks = [stream[i:i + CHUNK_SIZE] for i in range(0, len(stream), CHUNK_SIZE)]
+    print(f'{name}: {len(stream) / 1e6:.1f} MB in {len(chunks)} chunks')
+    for method in [legacy_frames, demuxer_frames]:
+        t = time.perf_counter()
+        frames = method(chunks)
+        dt = time.perf_counter() - t
+        print(f'  {method.__name__:<15} {dt * 1000:7.1f} ms, {len(stream) / dt / 1e6:6.0f} MB/s, '
+              f'{count_valid(frames)} of {len(frames)} frames valid')
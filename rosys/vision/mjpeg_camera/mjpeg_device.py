@@ -1,13 +1,13 @@
 import logging
 from asyncio import Task
 from asyncio.subprocess import Process
-from io import BytesIO
 from typing import AsyncGenerator, Optional
 
 import httpx
 from nicegui import background_tasks
 
 from ..image_processing import remove_exif
+from ..jpeg_demuxer import JpegDemuxer
 from .vendors import mac_to_url
 
 
@@ -48,30 +48,11 @@ class MjpegDevice:
                                        f'(credentials: {self.authentication}): '
                                        f'{response.status_code} {response.reason_phrase}')
                         return
-                    buffer = BytesIO()
-                    header = None
-                    pos = 0
+                    demuxer = JpegDemuxer()
                     try:
                         async for chunk in response.aiter_bytes():
-                            buffer.write(chunk)
-                            while True:
-                                if header is None:
-                                    header_pos = buffer.getvalue().find(b'\xff\xd8', pos)
-                                    if header_pos == -1:
-                                        pos = max(0, buffer.tell() - 1)
-                                        break
-                                    pos = header_pos + 2
-                                    header = header_pos
-                                else:
-                                    footer_pos = buffer.getvalue().find(b'\xff\xd9', pos)
-                                    if footer_pos == -1:
-                                        pos = max(0, buffer.tell() - 1)
-                                        break
-                                    image_data = buffer.getvalue()[header:footer_pos + 2]
-                                    yield remove_exif(image_data)
-                                    buffer = BytesIO(buffer.getvalue()[footer_pos + 2:])
-                                    pos = 0
-                                    header = None
+                            for frame in demuxer.feed(chunk):
+                                yield remove_exif(bytes(frame))
                     except httpx.ReadTimeout:
                         self.log.warning(f'Connection to {self.url} timed out')
                         return
@@ -1,16 +1,28 @@
 import logging
 from typing import Any, Optional, Self
 
+import numpy as np
+
 from ... import rosys
+from ...geometry import Rectangle
 from ..camera.configurable_camera import ConfigurableCamera
 from ..camera.transformable_camera import TransformableCamera
-from ..image import Image
-from ..image_processing import get_image_size_from_bytes, process_jpeg_image
+from ..image import Image, ImageSize
+from ..image_processing import (get_image_size_from_bytes, process_jpeg_image, process_ndarray_image,
+                                transform_ndarray_image)
+from ..image_rotation import ImageRotation
 from .arp_scan import find_ip
 from .rtsp_device import RtspDevice
 
 
 class RtspCamera(ConfigurableCamera, TransformableCamera):
+    """A camera streaming H.264 via RTSP.
+
+    Rotations without cropping are applied by the GStreamer pipeline before the only JPEG encoding,
+    so images are only decoded and re-encoded in Python if a crop is set.
+    If a `raw_resolution` is given, the pipeline delivers BGR frames of that size instead of JPEG images.
+    They are available via `capture_frame()` without any encoding, e.g. for consumers which disable `streaming`.
+    """
 
     def __init__(self,
                  *,
@@ -20,6 +32,7 @@ class RtspCamera(ConfigurableCamera, TransformableCamera):
                  streaming: bool = True,
                  goal_fps: int = 5,
                  jovision_profile: int = 1,
+                 raw_resolution: Optional[ImageSize] = None,
                  **kwargs,
                  ) -> None:
         super().__init__(id=id,
@@ -30,6 +43,7 @@ class RtspCamera(ConfigurableCamera, TransformableCamera):
 
         self.device: Optional[RtspDevice] = None
         self.jovision_profile: int = jovision_profile
+        self.raw_resolution = raw_resolution
 
         self._register_parameter(name='fps', getter=self.get_fps, setter=self.set_fps,
                                  min_value=1, max_value=30, step=1, default_value=goal_fps)
@@ -65,7 +79,8 @@ class RtspCamera(ConfigurableCamera, TransformableCamera):
         if ip is None:
             raise RuntimeError(f'could not find IP address for {self.id}')
 
-        self.device = RtspDevice(mac=self.id, ip=ip, jovision_profile=self.jovision_profile)
+        self.device = RtspDevice(mac=self.id, ip=ip, jovision_profile=self.jovision_profile,
+                                 rotation=self._pipeline_rotation, raw_size=self.raw_resolution)
 
         self._apply_all_parameters()
 
@@ -78,25 +93,55 @@ class RtspCamera(ConfigurableCamera, TransformableCamera):
         self.device.shutdown()
         self.device = None
 
+    @property
+    def _pipeline_rotation(self) -> ImageRotation:
+        """The rotation to be applied by the GStreamer pipeline (only possible if there is nothing to crop before)."""
+        return self.rotation if self.crop is None and self.raw_resolution is None else ImageRotation.NONE
+
     async def capture_image(self) -> None:
         if not self.is_connected:
             return
         assert self.device is not None
 
+        if self.raw_resolution is not None:
+            frame = self.device.capture_frame('images')
+            if frame is None:
+                return
+            # NOTE: rotate like the JPEG path, i.e. the GStreamer pipeline and process_jpeg_image
+            image_bytes = await rosys.run.cpu_bound(_process_frame, frame, self.rotation, self.crop)
+            size = self._resolution_after_transform(self.raw_resolution)
+            self._add_image(Image(time=rosys.time(), camera_id=self.id, size=size, data=image_bytes))
+            return
+
+        if self.device.rotation != self._pipeline_rotation:
+            self.device.set_rotation(self._pipeline_rotation)
+            return
+
         image_bytes = self.device.capture()
 
         if not image_bytes:
             return
-        transformed_image_bytes = await rosys.run.cpu_bound(process_jpeg_image, image_bytes, self.rotation, self.crop)
+        if self.crop is not None:
+            image_bytes = await rosys.run.cpu_bound(process_jpeg_image, image_bytes, self.rotation, self.crop)
 
         try:
-            final_image_resolution = get_image_size_from_bytes(transformed_image_bytes)
+            final_image_resolution = get_image_size_from_bytes(image_bytes)
         except ValueError:
             return
 
-        image = Image(time=rosys.time(), camera_id=self.id, size=final_image_resolution, data=transformed_image_bytes)
+        image = Image(time=rosys.time(), camera_id=self.id, size=final_image_resolution, data=image_bytes)
         self._add_image(image)
 
+    def capture_frame(self) -> Optional[np.ndarray]:
+        """Return the latest raw frame after cropping and rotation (only available if a raw resolution is given)."""
+        if not self.is_connected:
+            return None
+        assert self.device is not None
+        frame = self.device.capture_frame('frames')
+        if frame is None:
+            return None
+        return transform_ndarray_image(frame, self.rotation, self.crop, counterclockwise=True)
+
     def set_fps(self, fps: int) -> None:
         if self.device is None or self.device.settings_interface is None:
             return
@@ -123,3 +168,7 @@ class RtspCamera(ConfigurableCamera, TransformableCamera):
         if not self.is_connected:
             assert self.device is not None
             self.device.restart_gstreamer()
+
+
+def _process_frame(frame: np.ndarray, rotation: ImageRotation, crop: Optional[Rectangle]) -> bytes:
+    return process_ndarray_image(frame, rotation, crop, counterclockwise=True)
@@ -3,23 +3,68 @@ import logging
 import shlex
 import subprocess
 from asyncio.subprocess import Process
-from io import BytesIO
 from typing import AsyncGenerator, Optional
 
+import numpy as np
 from nicegui import background_tasks
 
+from ..image import ImageSize
+from ..image_rotation import ImageRotation
+from ..jpeg_demuxer import JpegDemuxer
 from .jovision_rtsp_interface import JovisionInterface
 from .vendors import VendorType, mac_to_url, mac_to_vendor
 
 
+# NOTE: like process_jpeg_image, where PIL rotates counter-clockwise by the given angle
+FLIP_METHODS = {
+    ImageRotation.RIGHT: 'counterclockwise',
+    ImageRotation.UPSIDE_DOWN: 'rotate-180',
+    ImageRotation.LEFT: 'clockwise',
+}
+
+
+def gstreamer_command(url: str, fps: int, *,
+                      rotation: ImageRotation = ImageRotation.NONE,
+                      raw_size: Optional[ImageSize] = None) -> str:
+    """Create a GStreamer pipeline which writes either JPEG images or raw BGR frames of the given size to stdout.
+
+    The rotation is applied to the decoded frames before JPEG encoding, so rotated images are encoded only once.
+    """
+    # to try: replace avdec_h264 with nvh264dec ! nvvidconv (!videoconvert)
+    # NOTE: quiet mode, because status messages would be written to stdout between the frames
+    command = f'gst-launch-1.0 -q rtspsrc location="{url}" latency=0 protocols=tcp'
+    command += ' ! rtph264depay ! avdec_h264 ! videoconvert'
+    if raw_size is None and rotation != ImageRotation.NONE:
+        command += f' ! videoflip method={FLIP_METHODS[rotation]}'
+    command += f' ! videorate ! "video/x-raw,framerate={fps}/1"'
+    if raw_size is None:
+        command += ' ! jpegenc ! fdsink'
+    else:
+        command += ' ! videoscale ! videoconvert'
+        command += f' ! "video/x-raw,format=BGR,width={raw_size.width},height={raw_size.height}" ! fdsink'
+    return command
+
+
 class RtspDevice:
 
-    def __init__(self, mac: str, ip: str, jovision_profile: int) -> None:
+    def __init__(self, mac: str, ip: str, jovision_profile: int, *,
+                 rotation: ImageRotation = ImageRotation.NONE,
+                 raw_size: Optional[ImageSize] = None) -> None:
+        """Capture JPEG images or, if a raw size is given, BGR frames of that size from an RTSP stream.
+
+        :param rotation: rotation to apply within the GStreamer pipeline (only for JPEG images)
+        :param raw_size: size of raw frames to capture instead of JPEG images
+        """
         self.mac = mac
+        self.rotation = rotation
+        self.raw_size = raw_size
 
         self.capture_task: Optional[asyncio.Task] = None
         self.capture_process: Optional[Process] = None
         self._image_buffer: Optional[bytes] = None
+        self._frame_buffer: Optional[np.ndarray] = None
+        self._frame_count = 0
+        self._consumed_frames: dict[str, int] = {}
         self._authorized: bool = True
 
         vendor_type = mac_to_vendor(mac)
@@ -49,6 +94,16 @@ class RtspDevice:
         self._image_buffer = None
         return image
 
+    def capture_frame(self, consumer: str = '') -> Optional[np.ndarray]:
+        """Return the latest raw frame if it is new to the given consumer (only available if a raw size is given).
+
+        Each consumer gets every latest frame once, independent of other consumers.
+        """
+        if self._frame_buffer is None or self._consumed_frames.get(consumer) == self._frame_count:
+            return None
+        self._consumed_frames[consumer] = self._frame_count
+        return self._frame_buffer
+
     def shutdown(self) -> None:
         if self.capture_process is not None:
             self.capture_process.terminate()
@@ -59,60 +114,43 @@ class RtspDevice:
 
     def restart_gstreamer(self) -> None:
         self.shutdown()
+        self._image_buffer = None
+        self._frame_buffer = None
         self.start_gstreamer_task()
 
+    def set_rotation(self, rotation: ImageRotation) -> None:
+        """Change the rotation applied within the GStreamer pipeline (restarts the pipeline)."""
+        self.rotation = rotation
+        self.restart_gstreamer()
+
     async def run_gstreamer(self, url: str) -> None:
-        async def stream(url: str) -> AsyncGenerator[bytes, None]:
+        async def stream(url: str) -> AsyncGenerator[bytes | np.ndarray, None]:
             if 'subtype=0' in url:
                 url = url.replace('subtype=0', 'subtype=1')
 
-            # to try: replace avdec_h264 with nvh264dec ! nvvidconv (!videoconvert)
-            command = f'gst-launch-1.0 rtspsrc location="{url}" latency=0 protocols=tcp ! rtph264depay ! avdec_h264 ! videoconvert ! videorate ! "video/x-raw,framerate={self.fps}/1" ! jpegenc ! fdsink'
+            command = gstreamer_command(url, self.fps, rotation=self.rotation, raw_size=self.raw_size)
             process = await asyncio.create_subprocess_exec(*shlex.split(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             assert process.stdout is not None
             assert process.stderr is not None
             self.capture_process = process
 
-            buffer = BytesIO()
-            pos = 0
-            header = None
-
-            while process.returncode is None:
-                assert process.stdout is not None
-                new = await process.stdout.read(4096)
-                if not new:
-                    break
-                buffer.write(new)
-
-                img_range = None
-                while True:
-                    if header is None:
-                        h = buffer.getvalue().find(b'\xff\xd8', pos)
-                        if h == -1:
-                            pos = buffer.tell() - 1
-                            break
-                        pos = h + 2
-                        header = h
-                    else:
-                        f = buffer.getvalue().find(b'\xff\xd9', pos)
-                        if f == -1:
-                            pos = buffer.tell() - 1
-                            break
-                        img_range = (header, f + 2)
-                        pos = f + 2
-                        header = None
-
-                if img_range:
-                    yield buffer.getvalue()[img_range[0]:img_range[1]]
-
-                    rest = buffer.getvalue()[img_range[1]:]
-                    buffer.seek(0)
-                    buffer.truncate()
-                    buffer.write(rest)
-
-                    pos = 0
-                    if header is not None:
-                        header -= img_range[1]
+            if self.raw_size is None:
+                demuxer = JpegDemuxer()
+                while process.returncode is None:
+                    new = await process.stdout.read(4096)
+                    if not new:
+                        break
+                    frames = demuxer.feed(new)
+                    if frames:
+                        yield frames[-1]  # NOTE: only the latest frame is of interest
+            else:
+                shape = (self.raw_size.height, self.raw_size.width, 3)
+                while process.returncode is None:
+                    try:
+                        data = await process.stdout.readexactly(shape[0] * shape[1] * shape[2])
+                    except asyncio.IncompleteReadError:
+                        break
+                    yield np.frombuffer(data, dtype=np.uint8).reshape(shape)
 
             assert process.stderr is not None
             error = await process.stderr.read()
@@ -121,6 +159,10 @@ class RtspDevice:
                 self._authorized = False
 
         async for image in stream(url):
-            self._image_buffer = image
+            if isinstance(image, np.ndarray):
+                self._frame_buffer = image
+                self._frame_count += 1
+            else:
+                self._image_buffer = image
 
         self.capture_task = None
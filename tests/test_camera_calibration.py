@@ -59,3 +59,18 @@ def test_project_from_behind():
     cam.set_perfect_calibration(z=1, roll=np.deg2rad(180 + 10))
     assert cam.calibration.project_to_image(Point3d(x=0, y=1, z=1)) is not None
     assert cam.calibration.project_to_image(Point3d(x=0, y=-1, z=1)) is None
+
+
+def test_projection_cache_invalidation():
+    cam, _ = demo_data()
+    world_point = Point3d(x=0.5, y=0.5, z=0)
+    image_point = cam.calibration.project_to_image(world_point)
+    assert cam.calibration.projection is cam.calibration.projection
+
+    cam.calibration.extrinsics.translation[2] += 1.0
+    moved_image_point = cam.calibration.project_to_image(world_point)
+    assert image_point is not None and moved_image_point is not None
+    assert moved_image_point.distance(image_point) > 1
+
+    cam.calibration.extrinsics.translation[2] -= 1.0
+    approx(cam.calibration.project_to_image(world_point), image_point)
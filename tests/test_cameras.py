@@ -1,8 +1,20 @@
+import asyncio
+import io
 import platform
+from pathlib import Path
 
+import cv2
+import numpy as np
+import PIL.Image
 import pytest
 
-from rosys.vision import RtspCamera, RtspCameraProvider, SimulatedCamera, UsbCamera, UsbCameraProvider
+from rosys.vision import (Detections, Image, ImageArchive, ImageMemoryBudget, ImageSize, ImageStore, PointDetection,
+                          RtspCamera, RtspCameraProvider, SimulatedCamera, UsbCamera, UsbCameraProvider)
+from rosys.vision.image_rotation import ImageRotation
+from rosys.vision.image_processing import process_jpeg_image, shrink_jpeg_image, transform_ndarray_image
+from rosys.vision.image_route import _get_image
+from rosys.vision.jpeg_demuxer import JpegDemuxer
+from rosys.vision.rtsp_camera.rtsp_device import gstreamer_command
 
 
 async def test_simulated_camera():
@@ -42,3 +54,185 @@ async def test_rtsp_camera():
     assert camera.is_connected
     await camera.capture_image()
     assert len(camera.images) == 1
+
+
+def test_jpeg_demuxer():
+    stream = b'--frame\r\n\xff\xd8a\xff\xd9\r\n--frame\r\n\xff\xd8\xff\xd9--frame\r\n\xff\xd8bc\xff\xd9\r\n'
+    for chunk_size in range(1, len(stream) + 1):
+        demuxer = JpegDemuxer()
+        frames = [frame for i in range(0, len(stream), chunk_size) for frame in demuxer.feed(stream[i:i + chunk_size])]
+        assert frames == [b'\xff\xd8a\xff\xd9', b'\xff\xd8\xff\xd9', b'\xff\xd8bc\xff\xd9'], f'{chunk_size=}'
+        assert demuxer.buffered == 0
+
+
+def test_rtsp_gstreamer_command():
+    command = gstreamer_command('rtsp://camera', 10)
+    assert command.startswith('gst-launch-1.0 -q ')
+    assert 'videoflip' not in command
+    assert command.endswith('jpegenc ! fdsink')
+
+    command = gstreamer_command('rtsp://camera', 10, rotation=ImageRotation.UPSIDE_DOWN)
+    assert command.index('videoflip method=rotate-180') < command.index('jpegenc')
+
+    command = gstreamer_command('rtsp://camera', 10,
+                                rotation=ImageRotation.LEFT, raw_size=ImageSize(width=640, height=480))
+    assert 'videoflip' not in command and 'jpegenc' not in command
+    assert '"video/x-raw,format=BGR,width=640,height=480" ! fdsink' in command
+
+
+@pytest.mark.parametrize('rotation', list(ImageRotation))
+def test_rotation_conventions(rotation: ImageRotation):
+    array = np.zeros((40, 60, 3), dtype=np.uint8)
+    array[:10, :20] = 255  # NOTE: bright top-left corner
+    jpeg = cv2.imencode('.jpg', array)[1].tobytes()
+    from_jpeg = cv2.imdecode(np.frombuffer(process_jpeg_image(jpeg, rotation), np.uint8), cv2.IMREAD_COLOR)
+    from_array = transform_ndarray_image(array, rotation, counterclockwise=True)
+    assert from_jpeg.shape == from_array.shape
+    assert np.abs(from_jpeg.astype(int) - from_array).mean() < 10
+
+    from_usb_array = transform_ndarray_image(array, rotation)
+    if rotation in {ImageRotation.LEFT, ImageRotation.RIGHT}:
+        assert np.array_equal(from_usb_array, np.rot90(from_array, 2)), 'the default rotates clockwise'
+    else:
+        assert np.array_equal(from_usb_array, from_array)
+
+
+def test_image_store():
+    store = ImageStore(maxlen=3)
+    for t in [1.0, 2.0, 3.0, 4.0]:
+        store.append(Image(camera_id='cam', size=ImageSize(width=1, height=1), time=t, data=b'data'))
+    assert [image.time for image in store] == [2.0, 3.0, 4.0]
+    assert store.get('1.0') is None
+    assert store.get('3.0') is store[1]
+    assert [image.time for image in store.since(2.5)] == [3.0, 4.0]
+    assert store.latest_captured is store[-1]
+
+    assert store.latest_detected is None
+    store[0].set_detections('detector', Detections())
+    assert store.latest_detected is store[0]
+    store[1].set_detections('detector', Detections())
+    assert store.latest_detected is store[1]
+
+    store.prune(3.5)
+    assert [image.time for image in store] == [4.0]
+    assert store.get('3.0') is None
+    assert store.latest_detected is None
+
+    store.append(Image(camera_id='cam', size=ImageSize(width=1, height=1), time=3.8, data=b'data'))
+    assert store.latest_captured is store[-1] and store[-1].time == 4.0, 'an older image is not the latest one'
+    store.append(Image(camera_id='cam', size=ImageSize(width=1, height=1), time=5.0, data=None))
+    assert store.latest_captured is store[-2], 'images without data are not captured'
+    store.prune(4.5)
+    assert store.latest_captured is None
+
+
+async def test_shrunk_image_route():
+    camera = SimulatedCamera(id='test_cam', width=800, height=600)
+    await camera.connect()
+    await camera.capture_image()
+    image = camera.images[-1]
+    assert camera.device is not None
+    jpeg = camera.device.create_image_data()
+
+    assert PIL.Image.open(io.BytesIO(shrink_jpeg_image(jpeg, 4))).size == (200, 150)
+    assert PIL.Image.open(io.BytesIO(shrink_jpeg_image(jpeg, 3))).size == (267, 200)
+
+    response = await _get_image(camera, str(image.time), 1)
+    assert response.status_code == 200
+    etag = response.headers['etag']
+    response = await _get_image(camera, str(image.time), 1, if_none_match=etag)
+    assert response.status_code == 304
+    assert not response.body
+
+    image.thumbnail = shrink_jpeg_image(jpeg, 8)
+    image.data = None
+    response = await _get_image(camera, str(image.time), 1)
+    assert response.status_code == 200
+    assert response.body == image.thumbnail
+    assert response.headers['etag'] != etag
+    assert response.headers['cache-control'] == 'no-store'
+
+
+def test_image_memory_budget():
+    budget = ImageMemoryBudget()
+    budget.max_bytes = 100
+    store_a = ImageStore(maxlen=10, camera_id='a', budget=budget)
+    store_b = ImageStore(maxlen=10, camera_id='b', weight=3.0, budget=budget)
+    for t in range(5):
+        store_a.append(Image(camera_id='a', size=ImageSize(width=1, height=1), time=t, data=bytes(10)))
+        store_b.append(Image(camera_id='b', size=ImageSize(width=1, height=1), time=t, data=bytes(20)))
+    assert budget.nbytes == 100
+    assert budget.bytes_per_camera == {'a': 20, 'b': 80}
+    assert len(store_a) == len(store_b) == 5
+    assert [bool(image.data) for image in store_b] == sorted(bool(image.data) for image in store_b)
+    assert store_a.latest_captured is store_a[-1]
+    assert store_b.latest_captured is store_b[-1]
+
+    budget.max_bytes = 0
+    budget.enforce()
+    assert [image.data is not None for image in store_a] == [False] * 4 + [True]
+    assert store_a.nbytes == 10
+
+
+def test_image_memory_budget_thumbnails():
+    jpeg = PIL.Image.new('RGB', (800, 600))
+    buffer = io.BytesIO()
+    jpeg.save(buffer, format='JPEG')
+    budget = ImageMemoryBudget()
+    budget.max_bytes = 0
+    budget.thumbnail_shrink = 8
+    store = ImageStore(maxlen=10, budget=budget)
+    for t in range(2):
+        store.append(Image(camera_id='cam', size=ImageSize(width=800, height=600), time=t, data=buffer.getvalue()))
+    assert store[0].data is None
+    assert store[0].thumbnail is not None
+    assert PIL.Image.open(io.BytesIO(store[0].thumbnail)).size == (100, 75)
+    assert store.nbytes == len(store[0].thumbnail) + len(buffer.getvalue())
+
+
+async def test_image_memory_budget_thumbnails_off_the_loop(integration: None):
+    buffer = io.BytesIO()
+    PIL.Image.new('RGB', (800, 600)).save(buffer, format='JPEG')
+    budget = ImageMemoryBudget()
+    budget.max_bytes = 0
+    budget.thumbnail_shrink = 8
+    store = ImageStore(maxlen=10, budget=budget)
+    for t in range(2):
+        store.append(Image(camera_id='cam', size=ImageSize(width=800, height=600), time=t, data=buffer.getvalue()))
+    assert store[0].data is None
+    assert store[0].thumbnail is None, 'the thumbnail is created in the background'
+    assert store.nbytes == len(buffer.getvalue())
+    for _ in range(100):
+        if store[0].thumbnail is not None:
+            break
+        await asyncio.sleep(0.05)
+    assert store[0].thumbnail is not None
+    assert store.nbytes == len(store[0].thumbnail) + len(buffer.getvalue())
+
+
+def test_image_archive(tmp_path: Path):
+    archive = ImageArchive(tmp_path, segment_size=15, max_bytes=50)
+    store = ImageStore(maxlen=2, camera_id='cam', archive=archive)
+    for t in range(8):
+        image = Image(camera_id='cam', size=ImageSize(width=1, height=1), time=t, data=bytes([t]) * 10)
+        image.set_detections('detector', Detections(points=[
+            PointDetection(category_name='p', model_name='m', confidence=0.5, x=t, y=0),
+        ]))
+        store.append(image)
+    assert [image.time for image in store] == [6, 7]
+    assert [image.time for image in archive.get_images('cam', 2.5)] == [3, 4, 5], 'queued images are available'
+    archive.flush()
+    assert archive.get('cam', '0') is None, 'the oldest segment has been deleted'
+    archived = archive.get('cam', '3')
+    assert archived is not None
+    assert archived.data == bytes([3]) * 10
+    assert archived.get_detections('detector') == Detections(points=[
+        PointDetection(category_name='p', model_name='m', confidence=0.5, x=3, y=0),
+    ])
+    assert [image.time for image in archive.get_images('cam', 2.5)] == [3, 4, 5]
+    assert [image.time for image in archive.get_images('cam', 2.5, 4)] == [3, 4]
+    archive.close()
+
+    reopened = ImageArchive(tmp_path, segment_size=15, max_bytes=50)
+    assert [image.time for image in reopened.get_images('cam', 0)] == [2, 3, 4, 5]
+    reopened.close()
@@ -0,0 +1,45 @@
+import numpy as np
+
+from rosys.geometry import Point3d
+from rosys.test import approx
+from rosys.vision import BoxDetection, CalibratableCamera, Detections, PointDetection
+
+
+def box(category_name: str, confidence: float, x: float, y: float, width: float, height: float) -> BoxDetection:
+    return BoxDetection(category_name=category_name, model_name='m', confidence=confidence,
+                        x=x, y=y, width=width, height=height)
+
+
+def test_box_array():
+    detections = Detections(boxes=[
+        box('a', 0.9, 0, 0, 10, 10),
+        box('a', 0.8, 1, 1, 10, 10),
+        box('b', 0.7, 1, 1, 10, 10),
+        box('a', 0.3, 50, 50, 10, 10),
+    ])
+    array = detections.box_array
+    assert array.categories == ['a', 'b']
+    approx(array.centers.tolist(), [[5, 5], [6, 6], [6, 6], [55, 55]])
+
+    filtered = array.filter(min_confidence=0.5, categories=['a'])
+    assert filtered.detections == detections.boxes[:2]
+
+    iou = array.intersection_over_union()
+    for i, a in enumerate(detections.boxes):
+        for j, b in enumerate(detections.boxes):
+            assert iou[i, j] == a.intersection_over_union(b)
+
+    assert array.non_maximum_suppression(0.5).detections == [detections.boxes[i] for i in [0, 2, 3]]
+    assert array.non_maximum_suppression(0.5, per_category=False).detections == [detections.boxes[i] for i in [0, 3]]
+
+
+def test_point_array_projection():
+    cam = CalibratableCamera(id='1')
+    cam.set_perfect_calibration(z=3, roll=np.deg2rad(180))
+    world_points = [Point3d(x=0.5, y=-0.2, z=0), Point3d(x=-0.3, y=0.4, z=0)]
+    image_points = [cam.calibration.project_to_image(p) for p in world_points]
+    detections = Detections(points=[
+        PointDetection(category_name='p', model_name='m', confidence=0.5, x=p.x, y=p.y) for p in image_points if p
+    ])
+    approx(detections.point_array.project(cam.calibration).tolist(), [list(p.tuple) for p in world_points], abs=1e-6)
+    assert detections.box_array.project(cam.calibration).shape == (0, 3)
@@ -0,0 +1,87 @@
+import asyncio
+import io
+
+import PIL.Image
+
+from rosys import persistence
+from rosys.geometry import Rectangle
+from rosys.vision import BoxDetection, DetectorHardware, Image, ImageSize, PointDetection
+from rosys.vision.detections import SegmentationDetection
+from rosys.vision.detector_hardware import parse_detections
+
+
+class FakeSocketIoClient:
+    connected = True
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.max_active = 0
+        self.cameras: list[str] = []
+        self.sizes: list = []
+
+    async def call(self, event: str, data: dict, timeout: float) -> dict:
+        self.sizes.append(PIL.Image.open(io.BytesIO(data['image'])).size if data['image'] != b'data' else None)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.cameras.append(data['mac'])
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return {'point_detections': [{'category_name': 'p', 'model_name': 'm', 'confidence': 0.5, 'x': 1, 'y': 2}]}
+
+
+async def test_pipelined_detection(integration: None):
+    detector = DetectorHardware(max_in_flight=2)
+    detector.sio = FakeSocketIoClient()  # type: ignore[assignment]
+    images = [Image(camera_id=f'cam{c}', size=ImageSize(width=1, height=1), time=t, data=b'data')
+              for t in range(3) for c in range(3)]
+    await asyncio.gather(*(detector.detect(image) for image in images))
+
+    assert detector.sio.max_active == 2
+    assert detector.sio.cameras == ['cam0', 'cam1', 'cam2', 'cam0', 'cam1']
+    assert [image.camera_id for image in images if image.detections] == ['cam0', 'cam1', 'cam0', 'cam1', 'cam2']
+    assert [image.time for image in images if image.camera_id == 'cam2' and image.detections] == [2]
+    assert detector.detection_count == 5
+    assert detector.dropped_count == 4
+    assert detector.latency is not None
+    assert not detector.is_detecting
+
+
+async def test_evicted_images_are_skipped(integration: None):
+    detector = DetectorHardware()
+    detector.sio = FakeSocketIoClient()  # type: ignore[assignment]
+    image = Image(camera_id='cam', size=ImageSize(width=1, height=1), time=0, data=None)
+    await detector.detect(image)
+    assert detector.sio.cameras == []
+    assert not detector.is_detecting
+
+
+def test_parse_detections():
+    result = {
+        'box_detections': [{'category_name': 'b', 'model_name': 'm', 'confidence': 0.5, 'x': 1, 'y': 2, 'width': 3,
+                            'height': 4, 'category_id': 'ignored'}],
+        'point_detections': [{'category_name': 'p', 'model_name': 'm', 'confidence': 0.5, 'x': 1, 'y': 2}],
+        'segmentation_detections': [{'category_name': 's', 'model_name': 'm', 'confidence': 0.5,
+                                     'shape': {'points': [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}]}}],
+    }
+    detections = parse_detections(result)
+    assert detections.boxes == [persistence.from_dict(BoxDetection, d) for d in result['box_detections']]
+    assert detections.points == [persistence.from_dict(PointDetection, d) for d in result['point_detections']]
+    assert detections.segmentations == [persistence.from_dict(SegmentationDetection, d)
+                                        for d in result['segmentation_detections']]
+
+    columnar = {'point_detections': {'category_name': ['p', 'q'], 'model_name': ['m', 'm'], 'confidence': [0.5, 0.6],
+                                     'x': [1, 2], 'y': [3, 4]}}
+    detections = parse_detections(columnar, (2, 2, 100, 50))
+    assert [(p.category_name, p.x, p.y) for p in detections.points] == [('p', 102, 56), ('q', 104, 58)]
+
+
+async def test_roi_submission(integration: None):
+    detector = DetectorHardware()
+    detector.sio = FakeSocketIoClient()  # type: ignore[assignment]
+    buffer = io.BytesIO()
+    PIL.Image.new('RGB', (800, 600)).save(buffer, format='JPEG')
+    image = Image(camera_id='cam', size=ImageSize(width=800, height=600), time=0, data=buffer.getvalue())
+    await detector.detect(image, roi=Rectangle(x=100, y=200, width=400, height=300), shrink=2)
+    assert detector.sio.sizes == [(200, 150)]
+    assert image.detections is not None
+    assert (image.detections.points[0].x, image.detections.points[0].y) == (102, 204)
@@ -1,7 +1,9 @@
 import asyncio
 import time
 import uuid
+from pathlib import Path
 
+import cv2
 import numpy as np
 import pytest
 
@@ -9,8 +11,16 @@ from rosys.automation import Automator
 from rosys.driving import Driver
 from rosys.geometry import Point, Pose, Prism, Spline
 from rosys.hardware import Robot
-from rosys.pathplanning import Obstacle, PathPlanner
+from rosys.pathplanning import Area, Obstacle, PathPlanner
 from rosys.pathplanning.delaunay_planner import DelaunayPlanner
+from rosys.pathplanning.distance_map import DistanceMap
+from rosys.pathplanning.grid import Grid
+from rosys.pathplanning.obstacle_map import ObstacleMap
+from rosys.pathplanning.planner_cache import PlannerCache
+from rosys.pathplanning.path_planner import PlannerWorker
+from rosys.pathplanning.planner_process import PlannerResponse, PlannerWorldUpdateCommand
+from rosys.pathplanning.roadmap import Roadmap
+from rosys.pathplanning.robot_renderer import RobotRenderer
 from rosys.test import assert_point, forward
 
 
@@ -51,6 +61,7 @@ async def test_not_finding_a_path(path_planner: PathPlanner) -> None:
     await forward(1.0)
     obstacle = create_obstacle(x=2, y=0)
     path_planner.obstacles[obstacle.id] = obstacle
+    path_planner.OBSTACLES_CHANGED.emit(path_planner.obstacles)
     with pytest.raises(TimeoutError):
         await path_planner.search(start=Pose(), goal=Pose(x=1, y=0), timeout=0.1)
     with pytest.raises(RuntimeError):
@@ -65,6 +76,7 @@ async def test_test_spline(path_planner: PathPlanner) -> None:
 
     obstacle = create_obstacle(x=2, y=1)
     path_planner.obstacles[obstacle.id] = obstacle
+    path_planner.OBSTACLES_CHANGED.emit(path_planner.obstacles)
     assert await path_planner.test_spline(spline) == True
 
 
@@ -83,6 +95,147 @@ def test_grow_map(shape: Prism) -> None:
     assert planner.obstacle_map.grid.bbox == pytest.approx((-2.4, -2.4, 8.6, 5.8))
 
 
+def test_batch_queries(shape: Prism) -> None:
+    planner = DelaunayPlanner(shape.outline)
+    obstacle = create_obstacle(x=2.0, y=0.0)
+    planner.update_map([], [obstacle], [Point(x=0, y=-2), Point(x=4, y=2)], time.time() + 3.0)
+    obstacle_map = planner.obstacle_map
+    rng = np.random.default_rng(0)
+    poses = [Pose(x=x, y=y, yaw=yaw) for x, y, yaw in rng.uniform([0, -2, -np.pi], [4, 2, np.pi], (50, 3))]
+    splines = [Spline.from_poses(start, end) for start, end in zip(poses[:-1], poses[1:])] + \
+        [Spline.from_poses(Pose(), Pose())]
+
+    assert obstacle_map.test_splines(splines).tolist() == [obstacle_map.test_spline(s) for s in splines]
+    assert obstacle_map.test_splines(splines, backward=True).tolist() == \
+        [obstacle_map.test_spline(s, backward=True) for s in splines]
+    x, y, yaw = np.array([(pose.x, pose.y, pose.yaw) for pose in poses]).T
+    assert obstacle_map.get_distances(x, y, yaw).tolist() == \
+        [obstacle_map.get_distance(pose.x, pose.y, pose.yaw)[0] for pose in poses]
+
+
+def test_distance_map() -> None:
+    grid = Grid((60, 80, 36), (0, 0, 16.0, 12.0))
+    obstacle_map = ObstacleMap.from_list(grid, [[0.0, 6.0, 5.6, 0.4]], RobotRenderer.from_size(0.77, 1.21, 0.445))
+    distance_map = DistanceMap(obstacle_map, Point(x=4.0, y=2.0))
+    assert distance_map.interpolate(4.0, 2.0) == pytest.approx([0.0])
+    assert distance_map.interpolate(4.0, 4.0) == pytest.approx([2.0], abs=0.2)
+    assert distance_map.interpolate(4.0, 8.0)[0] > 6.0, 'path leads around the obstacle'
+    assert distance_map.interpolate(np.linspace(1, 15, 5), np.linspace(1, 11, 3)).shape == (3, 5)
+    gradient_x, gradient_y = distance_map.gradient(8.0, 2.0)
+    assert gradient_x[0] > 0 and gradient_y[0] == pytest.approx(0.0)
+
+
+def test_obstacle_map_layer_reuse() -> None:
+    grid = Grid((60, 80, 36), (0, 0, 16.0, 12.0))
+    robot_renderer = RobotRenderer.from_size(0.6, 1.0)
+    obstacle_map = ObstacleMap.from_list(grid, [[0.0, 6.0, 5.6, 0.4], [10.8, 2.0, 1.0, 7.0]], robot_renderer)
+    assert len(ObstacleMap._group_layers(obstacle_map.kernels)) < grid.size[2]  # pylint: disable=protected-access
+    for layer in range(grid.size[2]):
+        kernel = robot_renderer.render(grid.pixel_size, grid.from_3d_grid(0, 0, layer)[2]).astype(np.uint8)
+        expected = cv2.dilate(obstacle_map.map.astype(np.uint8), kernel).astype(bool)
+        assert np.array_equal(obstacle_map.stack[:, :, layer], expected)
+
+
+def test_incremental_map_update(shape: Prism) -> None:
+    planner = DelaunayPlanner(shape.outline)
+    obstacles = [create_obstacle(x=2, y=1), create_obstacle(x=4, y=-1)]
+    planner.update_map([], obstacles, [Point(x=0, y=0), Point(x=6, y=3)], time.time() + 3.0)
+
+    moved_obstacle = create_obstacle(x=3, y=2)
+    moved_obstacle.id = obstacles[1].id
+    obstacles = [obstacles[0], moved_obstacle, create_obstacle(x=5, y=0)]
+    planner.update_map([], obstacles, [Point(x=0, y=0)], time.time() + 3.0)
+
+    assert planner.obstacle_map is not None
+    obstacle_map = ObstacleMap.from_world(shape.outline, [], obstacles, planner.obstacle_map.grid)
+    assert np.array_equal(planner.obstacle_map.map, obstacle_map.map)
+    assert np.array_equal(planner.obstacle_map.stack, obstacle_map.stack)
+    assert np.allclose(planner.obstacle_map.dist_stack, obstacle_map.dist_stack)
+
+    reference = DelaunayPlanner(shape.outline)
+    reference.obstacle_map = obstacle_map
+    reference._create_graph()  # pylint: disable=protected-access
+    assert planner.roadmap is not None and reference.roadmap is not None
+    assert np.array_equal(planner.roadmap.indptr, reference.roadmap.indptr)
+    assert np.array_equal(planner.roadmap.indices, reference.roadmap.indices)
+    assert np.array_equal(planner.roadmap.backward, reference.roadmap.backward)
+
+
+def test_planner_cache(shape: Prism, tmp_path: Path) -> None:
+    obstacles = [create_obstacle(x=2, y=1)]
+    points = [Point(x=0, y=0), Point(x=4, y=2)]
+    planner = DelaunayPlanner(shape.outline, cache_path=tmp_path)
+    planner.update_map([], obstacles, points, time.time() + 3.0)
+    assert planner.cache is not None
+    planner.cache.join()
+    assert len(list(tmp_path.iterdir())) == 1
+
+    cached_planner = DelaunayPlanner(shape.outline, cache_path=tmp_path)
+    cached_planner.update_map([], obstacles, [Point(x=1, y=1)], time.time() + 3.0)
+    assert cached_planner.obstacle_map is not None and planner.obstacle_map is not None
+    assert isinstance(cached_planner.obstacle_map.stack, np.memmap)
+    assert np.array_equal(cached_planner.obstacle_map.dist_stack, planner.obstacle_map.dist_stack)
+    assert cached_planner.roadmap is not None and planner.roadmap is not None
+    assert np.array_equal(cached_planner.roadmap.indices, planner.roadmap.indices)
+    path = cached_planner.search(Pose(x=0, y=0), Pose(x=4, y=2))
+    assert_point(path[-1].spline.end, Point(x=4, y=2))
+
+    planner.update_map([], obstacles + [create_obstacle(x=3, y=1, radius=0.2)], points, time.time() + 3.0)
+    planner.cache.join()
+    assert len(list(tmp_path.iterdir())) == 1, 'incremental updates are not persisted'
+
+
+
+def test_shared_planner_cache(shape: Prism, tmp_path: Path) -> None:
+    planner = DelaunayPlanner(shape.outline, cache_path=tmp_path, shared_cache=True)
+    planner.update_map([], [create_obstacle(x=2, y=1)], [Point(x=0, y=0), Point(x=4, y=2)], time.time() + 3.0)
+    assert len(list(tmp_path.iterdir())) == 1, 'the entry can be loaded by other processes right away'
+
+def test_incomplete_planner_cache(shape: Prism, tmp_path: Path) -> None:
+    obstacles = [create_obstacle(x=2, y=1)]
+    points = [Point(x=0, y=0), Point(x=4, y=2)]
+    planner = DelaunayPlanner(shape.outline, cache_path=tmp_path)
+    planner.update_map([], obstacles, points, time.time() + 3.0)
+    assert planner.cache is not None
+    planner.cache.join()
+    planner.cache.save(planner._cache_key(), {'tri_points': np.zeros((3, 2))})  # pylint: disable=protected-access
+    planner.cache.save(planner._cache_key(), {'tri_points': np.zeros((3, 2))})  # pylint: disable=protected-access
+    planner.cache.join()
+    assert [d.name for d in tmp_path.iterdir() if d.name.startswith('.')] == [], 'temporary directories are removed'
+
+    cached_planner = DelaunayPlanner(shape.outline, cache_path=tmp_path)
+    cached_planner.update_map([], obstacles, points, time.time() + 3.0)
+    assert cached_planner.obstacle_map is not None
+    assert not isinstance(cached_planner.obstacle_map.stack, np.memmap), 'incomplete entries are rebuilt'
+
+
+def test_concurrent_planner_cache_writes(tmp_path: Path) -> None:
+    caches = [PlannerCache(tmp_path) for _ in range(4)]
+    for _ in range(5):
+        for cache in caches:
+            cache.save('key', {'a': np.ones(100_000), 'b': np.zeros(100_000)})
+        for cache in caches:
+            cache.join()
+        arrays = caches[0].load('key', ['a', 'b'])
+        assert arrays is not None and arrays['a'].sum() == 100_000
+    assert [d.name for d in tmp_path.iterdir()] == ['key']
+
+
+def test_roadmap_shortest_paths() -> None:
+    roadmap = Roadmap.from_edges(
+        x=np.array([0.0, 1.0, 1.0, 2.0, 5.0]),
+        y=np.array([0.0, 1.0, -1.0, 0.0, 5.0]),
+        sources=np.array([0, 0, 1, 2, 3]),
+        targets=np.array([1, 2, 3, 3, 2]),
+        weights=np.array([1.5, 1.5, 1.5, 2.0, 2.0]),
+        backward=np.array([False, False, False, True, False]),
+    )
+    paths = roadmap.shortest_paths([0, 2], [3, 4])
+    assert paths == {(0, 3): [0, 1, 3], (2, 3): [2, 3]}
+    assert roadmap.backward[roadmap.find_edge(2, 3)]
+    assert roadmap.find_edge(3, 0) == -1
+
+
 async def test_overlapping_commands(path_planner: PathPlanner) -> None:
     await forward(1.0)
 
@@ -96,3 +249,80 @@ async def test_overlapping_commands(path_planner: PathPlanner) -> None:
     path, test = await asyncio.gather(task1, task2)
     assert isinstance(path, list)
     assert isinstance(test, bool)
+
+
+async def test_coalescing_identical_commands(shape: Prism) -> None:
+    path_planner = PathPlanner(shape, num_workers=2)
+    spline = Spline.from_poses(Pose(), Pose(x=1.0))
+    task1 = asyncio.create_task(path_planner.test_spline(spline))
+    task2 = asyncio.create_task(path_planner.test_spline(spline))
+    await asyncio.sleep(0.01)
+    assert sum(len(worker.pending) for worker in path_planner.workers) == 1
+
+    worker = next(worker for worker in path_planner.workers if worker.pending)
+    command = worker.process.connection.recv()
+    worker.process.connection.send(PlannerResponse(id=command.id, deadline=command.deadline, content=True))
+    assert await asyncio.gather(task1, task2) == [True, True]
+    assert not path_planner.coalescable_calls
+
+
+
+async def test_building_maps_only_once(shape: Prism) -> None:
+    path_planner = PathPlanner(shape, num_workers=2)
+    builder, other = path_planner.workers
+
+    def respond(worker: PlannerWorker) -> None:
+        command = worker.process.connection.recv()
+        worker.process.connection.send(PlannerResponse(id=command.id, deadline=command.deadline, content=1.0))
+
+    tasks = [asyncio.create_task(path_planner.get_obstacle_distance(Pose(x=x))) for x in [0, 1]]
+    await asyncio.sleep(0.01)
+    assert len(builder.pending) == 2 and not other.pending, 'the first worker builds the maps for a new world'
+    respond(builder)
+    respond(builder)
+    await asyncio.gather(*tasks)
+
+    tasks = [asyncio.create_task(path_planner.get_obstacle_distance(Pose(x=x))) for x in [2, 3]]
+    await asyncio.sleep(0.01)
+    assert len(builder.pending) == 1 and len(other.pending) == 1, 'requests for a built world are distributed'
+    respond(builder)
+    respond(other)
+    await asyncio.gather(*tasks)
+
+async def test_world_sync(shape: Prism) -> None:
+    path_planner = PathPlanner(shape)
+    worker = path_planner.workers[0]
+    obstacle = create_obstacle(x=1.0, y=1.0)
+    path_planner.obstacles[obstacle.id] = obstacle
+    await path_planner.OBSTACLES_CHANGED.call(path_planner.obstacles)
+    task = asyncio.create_task(path_planner.get_obstacle_distance(Pose()))
+    await asyncio.sleep(0.01)
+
+    update = worker.process.connection.recv()
+    assert isinstance(update, PlannerWorldUpdateCommand)
+    assert update.version == 1 and update.obstacles == [obstacle]
+    worker.process.update_world(update)
+    command = worker.process.connection.recv()
+    assert command.world_version == 1 and command.obstacles == []
+    assert worker.process.resolve_world(command).obstacles == [obstacle]
+    worker.process.connection.send(PlannerResponse(id=command.id, deadline=command.deadline, content=1.0))
+    assert await task == 1.0
+
+    del path_planner.obstacles[obstacle.id]
+    await path_planner.OBSTACLES_CHANGED.call(path_planner.obstacles)
+    assert path_planner.world_version == 2
+    update = worker.process.connection.recv()
+    assert update.removed_obstacle_ids == [obstacle.id]
+    worker.process.update_world(update)
+    assert not worker.process.obstacles
+
+    area = Area(id='area', outline=[Point(x=0, y=0), Point(x=1, y=0), Point(x=1, y=1)])
+    path_planner.areas[area.id] = area
+    await path_planner.AREAS_CHANGED.call([area])
+    area.outline.append(Point(x=0, y=1))
+    await path_planner.AREAS_CHANGED.call(None)
+    await path_planner.OBSTACLES_CHANGED.call(path_planner.obstacles)
+    assert path_planner.world_version == 4, 'only actual changes increment the world version'
+    assert len(worker.process.connection.recv().areas[0].outline) == 3
+    assert len(worker.process.connection.recv().areas[0].outline) == 4
+    assert not worker.process.connection.poll(0.1)
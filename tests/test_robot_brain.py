@@ -0,0 +1,234 @@
+import asyncio
+import os
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import rosys
+from rosys.hardware import (BumperHardware, EStopHardware, ModuleHardware, RecordingCommunication,
+                            ReplayCommunication, RobotBrain, RobotHardware)
+from rosys.hardware.communication import Communication, SerialCommunication
+from rosys.hardware.robot_brain import augment, check, check_all
+
+
+class FakeCommunication(Communication):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.batch: list[tuple[float, str]] = []
+        self.writes: list[list[str]] = []
+
+    @classmethod
+    def is_possible(cls) -> bool:
+        return True
+
+    async def send(self, msg: str) -> None:
+        self.writes.append([msg])
+
+    async def send_batch(self, msgs: list[str]) -> None:
+        self.writes.append(msgs)
+
+    async def read(self) -> Optional[str]:
+        return None
+
+    async def read_batch(self) -> list[tuple[float, str]]:
+        batch, self.batch = self.batch, []
+        return batch
+
+
+def test_check_all():
+    lines = [augment('core 1000 0.1 0.2'), augment(''), augment('grüße'), 'no checksum', augment('broken')[:-1] + 'x',
+             'broken@zz', '']
+    assert check_all(lines) == ['core 1000 0.1 0.2', '', 'grüße', '', '', '', '']
+    assert check_all(lines[:4]) == [check(line) for line in lines[:4]]
+
+
+async def test_read_lines(integration: None):
+    communication = FakeCommunication()
+    robot_brain = RobotBrain(communication)
+    communication.batch = [(10.0, augment('core 1000 0.1')), (10.1, augment('p0 ok'))]
+    assert await robot_brain.read_lines() == []
+    assert robot_brain.clock_offset == 9.0
+
+    communication.batch = [(11.0, augment('core 2000 0.2')), (11.1, 'invalid line'), (11.2, augment('p0 ok'))]
+    assert await robot_brain.read_lines() == [(11.0, 'core 2000 0.2'), (11.0, 'p0 ok')]
+
+
+async def test_core_message_dispatch(integration: None):
+    class LegacyModule(ModuleHardware):
+        words: list[str] = []
+
+        def handle_core_output(self, time: float, words: list[str]) -> None:
+            self.words = [words.pop(0), words.pop(0)]
+
+    communication = FakeCommunication()
+    robot_brain = RobotBrain(communication)
+    estop = EStopHardware(robot_brain, pins={'front': 34, 'back': 35})
+    bumper = BumperHardware(robot_brain, pins={'left': 21, 'right': 22}, estop=estop)
+    legacy = LegacyModule(robot_brain, 'legacy = Input(1)', ['legacy.a:3', 'legacy.b'])
+    robot = RobotHardware([estop, bumper, legacy], robot_brain)
+    assert robot.core_message_layout.fields == \
+        ['estop_front.level', 'estop_back.level', 'bumper_left.level', 'bumper_right.level', 'legacy.a:3', 'legacy.b']
+    assert 'core.output("core.millis estop_front.level estop_back.level' in robot_brain.lizard_code
+
+    communication.batch = [(10.0, augment('core 1000 1 1 0 1 0.5 7'))]
+    await robot.update()
+    communication.batch = [(11.0, augment('core 2000 1 1 0 1 0.250 8'))]
+    await robot.update()
+    assert not estop.active
+    assert bumper.active_bumpers == ['right']
+    assert legacy.words == ['0.250', '8']
+
+    communication.batch = [(12.0, augment('core 3000 0 1 1 1 0.5 9'))]
+    await robot.update()
+    assert estop.active
+    assert bumper.active_bumpers == ['right'], 'bumpers are ignored while the e-stop is active'
+    assert legacy.words == ['0.5', '9']
+
+    communication.batch = [(13.0, augment('core 4000 1 1 0 0 true abc'))]
+    await robot.update()
+    assert not estop.active
+    assert legacy.words == ['true', 'abc'], 'words of legacy modules do not need to be numeric'
+
+    communication.batch = [(14.0, augment('core 5000 1 x 1 1 0.5 10'))]
+    await robot.update()
+    assert not estop.active, 'the e-stop misses a core message with invalid fields'
+    assert bumper.active_bumpers == ['left', 'right']
+    assert legacy.words == ['0.5', '10']
+
+    record = robot.core_message_layout.to_record(robot.core_message_layout.parse(['1', '0', '1', '1', 'a', 'b']))
+    assert record['estop_back.level'] == 0
+    assert record.dtype.names == ('estop_front.level', 'estop_back.level', 'bumper_left.level', 'bumper_right.level')
+
+
+async def test_message_hook_dispatch(integration: None):
+    class HookModule(ModuleHardware):
+        def __init__(self, robot_brain: RobotBrain, name: str) -> None:
+            super().__init__(robot_brain, '')
+            self.lines: list[str] = []
+            self.message_hooks[name] = self.lines.append
+
+    communication = FakeCommunication()
+    robot_brain = RobotBrain(communication)
+    modules = [HookModule(robot_brain, f'hook{i}') for i in range(20)] + [HookModule(robot_brain, 'hook3')]
+    robot = RobotHardware(modules, robot_brain)  # type: ignore[arg-type]
+    assert len(robot.message_hooks) == 20
+    assert len(robot.message_hooks['hook3']) == 2
+
+    communication.batch = [(10.0, augment('core 1000'))]
+    await robot.update()
+    communication.batch = [(11.0, augment('core 2000')), (11.0, augment('hook3 1 2')),
+                           (11.0, augment('hook7 3')), (11.0, augment('unknown 4'))]
+    await robot.update()
+    assert modules[3].lines == ['hook3 1 2']
+    assert modules[20].lines == ['hook3 1 2']
+    assert modules[7].lines == ['hook7 3']
+    assert sum(len(module.lines) for module in modules) == 3
+
+
+async def test_telemetry_replay(tmp_path: Path):
+    communication = FakeCommunication()
+    recording = RecordingCommunication(communication, tmp_path / 'telemetry.txt.gz')
+    robot_brain = RobotBrain(recording)
+    received: list[tuple[float, str]] = []
+    for i in range(10):
+        rosys.set_time(100.0 + i)
+        communication.batch = [(100.0 + i, augment(f'core {1000 * i} {i}')), (100.0 + i, augment(f'p0 {i}'))]
+        received += await robot_brain.read_lines()
+        await robot_brain.send(f'wheels.speed({i}, 0)')
+    recording.disconnect()
+
+    rosys.set_time(200.0)
+    replay = ReplayCommunication(tmp_path / 'telemetry.txt.gz', speed=2.0)
+    robot_brain = RobotBrain(replay)
+    replayed: list[tuple[float, str]] = []
+    assert await robot_brain.read_lines() == []
+    rosys.set_time(202.0)
+    replayed += await robot_brain.read_lines()
+    assert [line for _, line in replayed] == [line for _, line in received[:8]]
+    assert not replay.is_finished
+    rosys.set_time(205.0)
+    replayed += await robot_brain.read_lines()
+    assert replay.is_finished
+    assert [line for _, line in replayed] == [line for _, line in received]
+    assert [time - replayed[0][0] for time, _ in replayed[:8]] == [time - received[0][0] for time, _ in received[:8]], \
+        'hardware times follow the recorded core millis'
+
+    await robot_brain.send('core.restart()')
+    assert replay.sent == [(205.0, augment('core.restart()'))]
+
+
+async def test_send_batching():
+    communication = FakeCommunication()
+    robot_brain = RobotBrain(communication)
+
+    async def drive(linear: float) -> None:
+        await robot_brain.send(f'wheels.speed({linear}, 0)')
+
+    await asyncio.gather(drive(0.1), robot_brain.send('en3.level(true)'), drive(0.2), robot_brain.send('l.speed(1)'))
+    assert communication.writes == [
+        [augment('wheels.speed(0.2, 0)'), augment('en3.level(true)'), augment('l.speed(1)')],
+    ], 'the latest speed command replaces the first one at its position'
+    assert robot_brain.coalesced_count == 1
+    assert robot_brain.queue_depth == 0
+    assert robot_brain.write_latency == 0.0
+
+    communication.writes.clear()
+    await asyncio.gather(drive(0.1), robot_brain.send('wheels.off()'), drive(0.2), robot_brain.send('l.speed(1)'))
+    assert communication.writes == [
+        [augment('wheels.off()'), augment('wheels.speed(0.2, 0)'), augment('l.speed(1)')],
+    ], 'the latest speed command moves behind other commands to the same target'
+    assert robot_brain.coalesced_count == 2
+
+    communication.writes.clear()
+    task = asyncio.create_task(robot_brain.send('a.on()'))
+    await asyncio.sleep(0)
+    await robot_brain.send('b.on()')
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert communication.writes == [[augment('a.on()'), augment('b.on()')]], 'a cancelled caller still sends the batch'
+
+    communication.writes.clear()
+    robot_brain.lizard_code = 'a = Output(1)\nb = Output(2)'
+    await robot_brain.configure()
+    assert communication.writes == [
+        [augment('!-'), augment('!+a = Output(1)'), augment('!+b = Output(2)'), augment('!.')],
+        [augment('core.restart()')],
+    ]
+
+
+async def test_serial_hang_up():
+    class HungUpSerial:
+        in_waiting = 0
+
+        def __init__(self) -> None:
+            self.read_fd, write_fd = os.pipe()
+            os.close(write_fd)  # NOTE: the read end is now always readable without any data
+            self.is_open = True
+
+        def fileno(self) -> int:
+            return self.read_fd
+
+        def isOpen(self) -> bool:  # pylint: disable=invalid-name
+            return self.is_open
+
+        def read(self, size: int) -> bytes:
+            return os.read(self.read_fd, size)
+
+        def close(self) -> None:
+            self.is_open = False
+            os.close(self.read_fd)
+
+    communication = SerialCommunication.__new__(SerialCommunication)
+    Communication.__init__(communication)
+    communication.device_path = '/dev/test'
+    communication.serial = HungUpSerial()  # type: ignore[assignment]
+    communication.buffer = bytearray()
+    communication.lines = deque()
+    communication._reader_fd = None  # pylint: disable=protected-access
+    communication._reader_loop = None  # pylint: disable=protected-access
+    communication.log_io = False
+    assert await communication.read_batch() == []
+    await asyncio.sleep(0.01)
+    assert not communication.serial.isOpen(), 'the hung up device has been disconnected'
+    assert communication._reader_fd is None  # pylint: disable=protected-access